@@ -1,20 +1,373 @@
 from __future__ import annotations
 
+import io
 import os
 import json
-import random
-from datetime import datetime, timedelta
-from typing import List, Tuple, Dict
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple, Dict
 
 import streamlit as st
 from PIL import Image, ImageDraw, ImageFont
 import folium
+from folium.plugins import HeatMap
+import numpy as np
 from streamlit_folium import st_folium
 import pandas as pd
 
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-from src.inference import predict_on_images
+from src.inference import predict_on_images, resolve_backend_path
+from src.utils import load_config
+from src.boxes import refilter
+from src.detections import Detections
+from src.store import CELL_DEG, DetectionStore, get_detection_store
+from src.geobin import GeoBinner, geohash_strings, zoom_to_precision
+from src.sightings import store_sightings
+from src.geo import extract_gps_from_bytes
+from src.phash import PHashIndex, hash_bytes
+from src import tracing
+from src.tracing import span, traced
+
+
+UPLOAD_DIR = "runs/ui_uploads"
+# Individual report markers from this zoom level in; below it, geohash clusters and a heatmap
+MARKER_ZOOM = 14
+MAX_MAP_MARKERS = 500
+MAX_MAP_CLUSTERS = 2000
+# Thresholded views memoized per upload while the sliders move
+MAX_CACHED_VIEWS = 4
+
+tracing.configure(load_config("configs/config.yaml"))
+
+
+def _color_for_class(cls_id: int) -> Tuple[int, int, int]:
+    palette = [
+        (39, 76, 119),  # deep blue
+        (51, 92, 103),  # teal
+        (237, 125, 49), # orange
+        (120, 94, 240), # purple
+        (35, 166, 213), # sky
+        (23, 190, 187), # cyan
+    ]
+    return palette[cls_id % len(palette)]
+
+
+@traced("ui.draw_boxes")
+def draw_boxes(image_path: str, boxes: List[dict]) -> Image.Image:
+    img = Image.open(image_path).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype("arial.ttf", 16)
+    except Exception:
+        font = ImageFont.load_default()
+    for b in boxes:
+        x1, y1, x2, y2 = [int(v) for v in b["xyxy"]]
+        color = _color_for_class(int(b["cls"]))
+        draw.rectangle([(x1, y1), (x2, y2)], outline=color, width=3)
+        label = f"{b['label']} {b['conf']:.2f}"
+        tw, th = draw.textlength(label, font=font), 16
+        # label background
+        draw.rectangle([(x1, max(0, y1 - th - 4)), (x1 + int(tw) + 8, y1)], fill=(0, 0, 0, 160))
+        draw.text((x1 + 4, y1 - th - 2), label, fill=(255, 255, 255), font=font)
+    return img
+
+
+def _inference_settings() -> tuple:
+    """Everything that changes the cached candidates; part of the per-upload memo key."""
+    cfg = load_config("configs/config.yaml")
+    return (
+        resolve_backend_path(cfg),
+        float(cfg["ui"].get("candidate_conf", 0.05)),
+        float(cfg["ui"].get("candidate_iou", 0.90)),
+        int(cfg["training"]["imgsz"]),
+    )
+
+
+def _save_upload(f) -> str:
+    """Write an upload to disk once per file ID.
+
+    The original bytes are written as-is, which skips a decode/re-encode and
+    keeps the EXIF GPS block that a PIL round-trip would drop.
+    """
+    paths: Dict[str, str] = st.session_state.setdefault("upload_paths", {})
+    path = paths.get(f.file_id)
+    if path is None or not os.path.isfile(path):
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        path = os.path.join(UPLOAD_DIR, f"{f.file_id[:12]}_{os.path.basename(f.name)}")
+        with span("ui.save_upload", bytes=f.size), open(path, "wb") as out:
+            out.write(f.getbuffer())
+        paths[f.file_id] = path
+    return path
+
+
+class _UploadIndex:
+    """Perceptual hashes of the most recent uploads, shared by all sessions.
+
+    Entries persist in the detection store's `upload_hashes` table (one insert
+    per upload) and are queried through an in-memory BK-tree that is rebuilt
+    from the newest `max_entries` once it holds twice that many. Boxes are kept
+    normalized to the image size, and only an image of the same size matches.
+    """
+
+    def __init__(self, store: Optional[DetectionStore], max_entries: int) -> None:
+        self.store = store
+        self.max_entries = max(1, max_entries)
+        self.lock = threading.Lock()
+        self.index = PHashIndex("dhash")
+        rows = store.upload_hashes(self.max_entries) if store is not None else []
+        for row in rows:
+            self.index.add(row["phash"], row)
+
+    def find(self, h: Optional[int], settings_id: str, max_distance: int, size: Tuple[int, int]) -> Optional[dict]:
+        if h is None or max_distance < 0:
+            return None
+        with self.lock:
+            for i, _ in self.index.query(h, max_distance):
+                row = self.index.keys[i]
+                if row["settings"] == settings_id and tuple(row["boxes"].get("size", ())) == tuple(size):
+                    return row
+        return None
+
+    def add(self, h: int, settings_id: str, image_path: str, dets: Detections, size: Tuple[int, int]) -> None:
+        payload = dets.to_payload()
+        payload["xyxy"] = (dets.xyxy / np.array(size * 2, dtype=np.float32)).tolist()
+        payload["size"] = list(size)
+        row = {"phash": h, "settings": settings_id, "image_path": image_path, "boxes": payload}
+        with self.lock:
+            if self.store is not None:
+                self.store.add_upload_hash(h, settings_id, payload, image_path, self.max_entries)
+            if len(self.index) >= 2 * self.max_entries:
+                recent = self.index.keys[len(self.index) - self.max_entries + 1:]
+                self.index = PHashIndex("dhash")
+                for key in recent:
+                    self.index.add(key["phash"], key)
+            self.index.add(h, row)
+
+    @staticmethod
+    def detections(row: dict) -> Detections:
+        """A matched entry's boxes, scaled back to pixels."""
+        dets = Detections.from_payload(row["boxes"])
+        return Detections(dets.xyxy * np.array(row["boxes"]["size"] * 2, dtype=np.float32),
+                          dets.conf, dets.cls, dets.names)
+
+
+@st.cache_resource
+def _upload_index() -> _UploadIndex:
+    cfg = load_config("configs/config.yaml")
+    return _UploadIndex(get_detection_store(cfg), int(cfg["ui"].get("near_duplicate_max_entries", 5000)))
+
+
+def process_uploads(uploaded_files) -> List[dict]:
+    """Detections for the current uploads, memoized per (file ID, settings) in session state.
+
+    Reruns caused by unrelated widgets (other tabs, map interaction) hit the
+    memo and never reach the model; only new files or changed settings do.
+    """
+    settings = _inference_settings()
+    memo: Dict[tuple, dict] = st.session_state.setdefault("upload_results", {})
+    live_ids = {f.file_id for f in uploaded_files}
+    for key in [k for k in memo if k[0] not in live_ids or k[1] != settings]:
+        del memo[key]
+
+    pending = [f for f in uploaded_files if (f.file_id, settings) not in memo]
+    if pending:
+        settings_id = "|".join(str(v) for v in settings)
+        cfg = load_config("configs/config.yaml")
+        max_distance = int(cfg["ui"].get("near_duplicate_distance", -1))
+        index = _upload_index()
+        store = get_detection_store(cfg)
+        to_predict = []
+        for f in pending:
+            path = _save_upload(f)
+            data = f.getvalue()
+            h = size = None
+            if max_distance >= 0:
+                h = hash_bytes(data)
+                size = Image.open(io.BytesIO(data)).size
+            match = index.find(h, settings_id, max_distance, size)
+            if match is not None:
+                # Effectively the same photo as an earlier upload: reuse its candidates, skip the model.
+                # Not added to the detection store, which already holds the original.
+                memo[(f.file_id, settings)] = {
+                    "image_path": path,
+                    "gps": extract_gps_from_bytes(data),
+                    "boxes": _UploadIndex.detections(match),
+                    "duplicate_of": os.path.basename(match["image_path"]),
+                }
+            else:
+                to_predict.append((f, path, h, size))
+
+        if to_predict:
+            _, candidate_conf, candidate_iou, _ = settings
+            with st.spinner("Detecting debris..."):
+                results = predict_on_images(
+                    [p for _, p, _, _ in to_predict], conf=candidate_conf, iou=candidate_iou, columnar=True
+                )
+            for (f, path, h, size), item in zip(to_predict, results):
+                memo[(f.file_id, settings)] = item
+                if h is not None:
+                    index.add(h, settings_id, path, item["boxes"], size)
+        if store is not None:
+            store.flush()
+        _store_summary.clear()  # these results are now in the detection store
+
+        for f in pending:
+            item = memo[(f.file_id, settings)]
+            boxes = item["boxes"]
+            dets = boxes if isinstance(boxes, Detections) else Detections.from_dicts(boxes)
+            item["raw"] = (dets.xyxy, dets.conf, dets.cls, dets.names)
+            item["views"] = OrderedDict()
+    return [memo[(f.file_id, settings)] for f in uploaded_files]
+
+
+def apply_thresholds(item: dict, conf: float, iou: float) -> dict:
+    """Result view at the slider thresholds, computed from the cached raw candidates.
+
+    Only the last `MAX_CACHED_VIEWS` threshold pairs are kept per upload.
+    """
+    key = (round(conf, 4), round(iou, 4))
+    views = item["views"]
+    view = views.get(key)
+    if view is None:
+        xyxy, scores, classes, names = item["raw"]
+        keep = refilter(xyxy, scores, classes, conf, iou)
+        view = {
+            "image_path": item["image_path"],
+            "gps": item["gps"],
+            "boxes": Detections(xyxy[keep], scores[keep], classes[keep], names),
+            "duplicate_of": item.get("duplicate_of"),
+            "thresholds": key,
+        }
+        views[key] = view
+        while len(views) > MAX_CACHED_VIEWS:
+            views.popitem(last=False)
+    else:
+        views.move_to_end(key)
+    return view
+
+
+def _detection_store() -> Optional[DetectionStore]:
+    return get_detection_store(load_config("configs/config.yaml"))
+
+
+@st.cache_data(ttl=30)
+def _store_summary() -> dict:
+    """Headline totals; refreshed at most every 30 s so reruns do not hit SQLite."""
+    store = _detection_store()
+    if store is None:
+        return {"images": 0, "detections": 0, "located": 0, "locations": 0}
+    return store.summary()
+
+
+@st.cache_resource(max_entries=2)
+def _duplicate_sightings(version: tuple) -> int:
+    """Georeferenced detections that repeat an object already counted (see `sightings`)."""
+    store = _detection_store()
+    if store is None:
+        return 0
+    dets, objects = store_sightings(store, load_config("configs/config.yaml"))
+    return int(len(dets["key"]) - len(objects["object_id"]))
+
+
+@st.cache_resource(max_entries=2)
+def _map_binner(version: tuple) -> GeoBinner:
+    """Every located report with debris, binned per zoom on demand; rebuilt when the store totals change."""
+    store = _detection_store()
+    if store is None:
+        return GeoBinner(np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0))
+    pts = store.points(min_boxes=1)
+    return GeoBinner(pts["lat"], pts["lon"], pts["n_boxes"], pts["conf_sum"])
+
+
+def _map_bucket(zoom: int) -> int:
+    """Zoom levels that render the same content: one bucket per geohash length, one for markers."""
+    return MARKER_ZOOM if zoom >= MARKER_ZOOM else zoom_to_precision(zoom)
+
+
+def render_reports_map(uploads: List[dict]) -> None:
+    """Map of all stored reports plus the current uploads.
+
+    Aggregation happens here rather than in the browser: below `MARKER_ZOOM`
+    the largest geohash clusters (counts, detections, mean confidence) and a
+    heatmap are sent; individual markers only from `MARKER_ZOOM` in, limited
+    to the `MAX_MAP_MARKERS` nearest the view centre.
+    """
+    stats = _store_summary()
+    binner = _map_binner((stats["images"], stats["detections"], stats.get("last_ts")))
+    upload_points = [it for it in uploads if it["gps"] is not None]
+    if not upload_points and len(binner) == 0:
+        st.info("No GPS found in uploaded photos. Enable camera location services to appear on the map.")
+        return
+
+    view = st.session_state.get("map_view")
+    if view is None:
+        if upload_points:
+            view = {"zoom": 11, "center": tuple(upload_points[0]["gps"])}
+        else:
+            view = {"zoom": 3, "center": (float(binner.lat.mean()), float(binner.lon.mean()))}
+    tiles = load_config("configs/config.yaml")["ui"].get("map_tiles", "OpenStreetMap")
+    m = folium.Map(location=list(view["center"]), tiles=tiles, zoom_start=view["zoom"])
+
+    if view["zoom"] >= MARKER_ZOOM:
+        # Panning does not rerun the script, so send the reports nearest the view rather than the viewport
+        lat0, lon0 = view["center"]
+        dist = (binner.lat - lat0) ** 2 + ((binner.lon - lon0) * np.cos(np.radians(lat0))) ** 2
+        idx = np.argsort(dist, kind="stable")[:MAX_MAP_MARKERS]
+        for i in idx:
+            folium.CircleMarker(
+                location=[float(binner.lat[i]), float(binner.lon[i])],
+                radius=6,
+                color="#E76F51",
+                fill=True,
+                fill_opacity=0.8,
+                popup=f"{int(binner.detections[i])} debris items",
+            ).add_to(m)
+    elif len(binner) > 0:
+        bins = binner.bins(view["zoom"])
+        idx = np.argsort(-bins["detections"], kind="stable")[:MAX_MAP_CLUSTERS]
+        lat, lon, det = bins["lat"][idx], bins["lon"][idx], bins["detections"][idx]
+        HeatMap(np.column_stack([lat, lon, det / max(int(det.max(initial=1)), 1)]).tolist(),
+                radius=18, blur=15, min_opacity=0.3).add_to(m)
+        cells = geohash_strings(bins["code"][idx], zoom_to_precision(view["zoom"]))
+        for j, i in enumerate(idx):
+            reports, detections = int(bins["reports"][i]), int(bins["detections"][i])
+            folium.CircleMarker(
+                location=[float(lat[j]), float(lon[j])],
+                radius=float(4 + 3 * np.log2(1 + reports)),
+                color="#0F4C75",
+                fill=True,
+                fill_opacity=0.6,
+                tooltip=str(reports),
+                popup=(f"{reports} reports · {detections} debris items · "
+                       f"mean conf {bins['conf_sum'][i] / max(detections, 1):.2f} · cell {cells[j]}"),
+            ).add_to(m)
+
+    for it in upload_points:
+        lat, lon = it["gps"]
+        folium.Marker(
+            location=[lat, lon],
+            popup=os.path.basename(it["image_path"]) or "Photo",
+            icon=folium.Icon(color="blue", icon="info-sign"),
+        ).add_to(m)
+
+    # Only zoom is returned, so panning never reruns the script; re-render only when
+    # the zoom crosses into a different geohash precision (or into marker range)
+    out = st_folium(m, width=None, height=400, key="reports_map", returned_objects=["zoom"])
+    zoom = out.get("zoom") if out else None
+    if zoom is not None and _map_bucket(int(zoom)) != _map_bucket(view["zoom"]):
+        st.session_state["map_view"] = {"zoom": int(zoom), "center": view["center"]}
+        st.rerun()
+
+
+def render_detections(item: dict, view: dict) -> Image.Image:
+    """Annotated image for a thresholded view; only the latest one is kept per upload."""
+    cached = item.get("_vis")
+    if cached is None or cached[0] != view["thresholds"]:
+        cached = (view["thresholds"], draw_boxes(view["image_path"], view["boxes"]))
+        item["_vis"] = cached
+    return cached[1]
 
 
 st.set_page_config(
@@ -273,24 +626,27 @@ with col2:
 
 
 # Stats Section
+stats = _store_summary()
+# Overlapping frames report the same item several times; count each georeferenced object once
+unique_debris = stats["detections"] - _duplicate_sightings((stats["images"], stats["detections"], stats.get("last_ts")))
 st.markdown(
-    """
+    f"""
     <div class="stats-grid">
         <div class="stat-card">
-            <div class="stat-number">2,847</div>
-            <div class="stat-label">Debris Reports</div>
+            <div class="stat-number">{unique_debris:,}</div>
+            <div class="stat-label">Debris Detected</div>
         </div>
         <div class="stat-card">
-            <div class="stat-number">156</div>
-            <div class="stat-label">Cleanup Events</div>
+            <div class="stat-number">{stats["images"]:,}</div>
+            <div class="stat-label">Photos Analysed</div>
         </div>
         <div class="stat-card">
             <div class="stat-number">89%</div>
             <div class="stat-label">Detection Accuracy</div>
         </div>
         <div class="stat-card">
-            <div class="stat-number">47</div>
-            <div class="stat-label">Countries</div>
+            <div class="stat-number">{stats["locations"]:,}</div>
+            <div class="stat-label">Mapped Locations</div>
         </div>
     </div>
     """,
@@ -315,7 +671,17 @@ with tab1:
     st.markdown("Help us identify and locate marine debris by uploading photos from drones, boats, or shorelines.")
     
     col1, col2 = st.columns([2, 1])
-    
+
+    # Settings render in the right column but are read first so results can use them
+    with col2:
+        st.markdown("### Detection Settings")
+        conf = st.slider("Detection confidence", 0.05, 0.90, 0.25, 0.01)
+        iou = st.slider("NMS IoU threshold", 0.10, 0.90, 0.45, 0.01)
+        st.markdown("""
+        - Lower confidence → more detections
+        - Higher confidence → fewer, stronger detections
+        """)
+
     with col1:
         uploaded_files = st.file_uploader(
             "Upload images (JPG/PNG)", 
@@ -325,26 +691,18 @@ with tab1:
         )
         
         if uploaded_files:
-            # Save uploads temporarily
-            tmp_dir = "runs/ui_uploads"
-            os.makedirs(tmp_dir, exist_ok=True)
-            image_paths: List[str] = []
-            for f in uploaded_files:
-                img = Image.open(f).convert("RGB")
-                out_path = os.path.join(tmp_dir, f.name)
-                img.save(out_path)
-                image_paths.append(out_path)
+            uploads = process_uploads(uploaded_files)
+            results = [apply_thresholds(it, conf, iou) for it in uploads]
 
-            with st.spinner("Detecting debris..."):
-                results = predict_on_images(image_paths)
-
-            for item in results:
+            for upload, item in zip(uploads, results):
                 st.markdown(f"**{os.path.basename(item['image_path'])}**")
+                if item.get("duplicate_of"):
+                    st.caption(f"Near-duplicate of earlier upload {item['duplicate_of']}; detections reused.")
                 if len(item["boxes"]) == 0:
                     st.info("No debris detected.")
                     st.image(item["image_path"], use_column_width=True)
                 else:
-                    vis = draw_boxes(item["image_path"], item["boxes"])
+                    vis = render_detections(upload, item)
                     st.image(vis, use_column_width=True)
                     # Metrics row
                     st.markdown(
@@ -360,31 +718,8 @@ with tab1:
                 st.divider()
     
     with col2:
-        st.markdown("### Detection Settings")
-        conf = st.slider("Detection confidence", 0.05, 0.90, 0.25, 0.01)
-        iou = st.slider("NMS IoU threshold", 0.10, 0.90, 0.45, 0.01)
-        st.markdown("""
-        - Lower confidence → more detections
-        - Higher confidence → fewer, stronger detections
-        """)
-        
-        if uploaded_files:
-            gps_points = [it["gps"] for it in results if it["gps"] is not None]
-            st.markdown("### Map – Reported Locations")
-            if len(gps_points) > 0:
-                first_lat, first_lon = gps_points[0]  # type: ignore[index]
-                m = folium.Map(location=[first_lat, first_lon], tiles="OpenStreetMap", zoom_start=11)
-                for it in results:
-                    if it["gps"] is not None:
-                        lat, lon = it["gps"]
-                        folium.Marker(
-                            location=[lat, lon],
-                            popup=os.path.basename(it["image_path"]) or "Photo",
-                            icon=folium.Icon(color="blue", icon="info-sign"),
-                        ).add_to(m)
-                st_folium(m, width=None, height=400)
-            else:
-                st.info("No GPS found in uploaded photos. Enable camera location services to appear on the map.")
+        st.markdown("### Map – Reported Locations")
+        render_reports_map(results if uploaded_files else [])
 
 with tab2:
     st.markdown("### 💙 Support Our Mission")
@@ -494,99 +829,75 @@ with tab2:
             st.info("📧 A receipt has been sent to your email address.")
 
 with tab3:
-    st.markdown("### Latest Cleanup Updates")
-    
-    # Generate sample updates
-    updates_data = [
-        {
-            "date": "2024-01-15",
-            "location": "Pacific Garbage Patch",
-            "description": "Removed 2.3 tons of plastic debris from the Great Pacific Garbage Patch",
-            "participants": 45,
-            "impact": "High"
-        },
-        {
-            "date": "2024-01-12",
-            "location": "Mediterranean Sea",
-            "description": "Community cleanup along the French Riviera collected 1.8 tons of waste",
-            "participants": 120,
-            "impact": "Medium"
-        },
-        {
-            "date": "2024-01-10",
-            "location": "Caribbean Sea",
-            "description": "Underwater cleanup removed 500kg of fishing gear and plastic",
-            "participants": 25,
-            "impact": "High"
-        },
-        {
-            "date": "2024-01-08",
-            "location": "North Sea",
-            "description": "Beach cleanup in Netherlands collected 800kg of microplastics",
-            "participants": 80,
-            "impact": "Medium"
-        }
-    ]
-    
-    for update in updates_data:
-        with st.expander(f"🗓️ {update['date']} - {update['location']}"):
-            st.markdown(f"**Description:** {update['description']}")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Participants", update['participants'])
-            with col2:
-                st.metric("Impact Level", update['impact'])
-            with col3:
-                st.metric("Status", "✅ Completed")
-
-with tab3:
-    st.markdown("### Top 1000 Polluted Waterbodies")
-    st.markdown("Data sourced from global monitoring programs and citizen reports.")
-    
-    # Generate sample polluted waterbodies data
-    waterbodies_data = {
-        "Rank": list(range(1, 21)),
-        "Waterbody": [
-            "Great Pacific Garbage Patch", "Mediterranean Sea", "Caribbean Sea",
-            "North Sea", "Baltic Sea", "Gulf of Mexico", "South China Sea",
-            "Indian Ocean", "Atlantic Ocean (North)", "Pacific Ocean (North)",
-            "Yangtze River", "Ganges River", "Nile River", "Amazon River",
-            "Mississippi River", "Thames River", "Seine River", "Rhine River",
-            "Danube River", "Volga River"
-        ],
-        "Pollution Level": ["Critical"] * 5 + ["High"] * 8 + ["Medium"] * 7,
-        "Debris Count": [random.randint(50000, 200000) for _ in range(20)],
-        "Last Updated": [datetime.now() - timedelta(days=random.randint(1, 30)) for _ in range(20)]
-    }
-    
-    df = pd.DataFrame(waterbodies_data)
-    df['Last Updated'] = df['Last Updated'].dt.strftime('%Y-%m-%d')
-    
-    # Add filters
-    col1, col2 = st.columns(2)
-    with col1:
-        pollution_filter = st.selectbox("Filter by Pollution Level", ["All", "Critical", "High", "Medium"])
-    with col2:
-        search_term = st.text_input("Search waterbodies", placeholder="Enter name...")
-    
-    # Apply filters
-    if pollution_filter != "All":
-        df = df[df['Pollution Level'] == pollution_filter]
-    
-    if search_term:
-        df = df[df['Waterbody'].str.contains(search_term, case=False)]
-    
-    st.dataframe(
-        df,
-        use_container_width=True,
-        column_config={
-            "Rank": st.column_config.NumberColumn("Rank", width="small"),
-            "Waterbody": st.column_config.TextColumn("Waterbody", width="large"),
-            "Pollution Level": st.column_config.TextColumn("Pollution Level", width="medium"),
-            "Debris Count": st.column_config.NumberColumn("Debris Count", format="%d"),
-            "Last Updated": st.column_config.TextColumn("Last Updated", width="medium")
-        }
-    )
+    st.markdown("### Latest Detection Reports")
+    store = _detection_store()
+    summary = _store_summary()
+    if store is None or summary["images"] == 0:
+        st.info("No detections recorded yet. Upload photos in the Help Cleanup tab to add reports.")
+    else:
+        daily = pd.DataFrame(store.daily(t0=datetime.now().timestamp() - 30 * 86400))
+        if len(daily) > 0:
+            st.markdown("#### Debris detected per day (last 30 days)")
+            st.bar_chart(daily.set_index("day")[["detections"]])
+
+        for rec in store.records(limit=20):
+            when = datetime.fromtimestamp(rec["ts"]).strftime("%Y-%m-%d %H:%M")
+            where = f"{rec['lat']:.4f}, {rec['lon']:.4f}" if rec["lat"] is not None else "No GPS"
+            with st.expander(f"🗓️ {when} - {where}"):
+                st.markdown(f"**Photo:** {os.path.basename(rec['image_path'] or '')}")
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Debris Items", rec["n_boxes"])
+                with col2:
+                    st.metric("Max Confidence", f"{rec['max_conf']:.2f}" if rec["max_conf"] is not None else "–")
+                with col3:
+                    st.metric("Model", rec["model_version"].split(":")[0])
+
+with tab4:
+    st.markdown("### Top 1000 Polluted Locations")
+    st.markdown(f"Debris reports aggregated on a {CELL_DEG}° grid from every analysed photo with GPS.")
+
+    store = _detection_store()
+    hotspots = store.hotspots(limit=1000) if store is not None else []
+    if len(hotspots) == 0:
+        st.info("No located detections yet. Photos with EXIF GPS appear here once analysed.")
+    else:
+        df = pd.DataFrame(hotspots)
+        df.insert(0, "Rank", range(1, len(df) + 1))
+        df["Location"] = df["lat"].map("{:.2f}".format) + ", " + df["lon"].map("{:.2f}".format)
+        # Top 10% of cells are critical, the next 30% high
+        pct = df["Rank"] / len(df)
+        df["Pollution Level"] = ["Critical" if p <= 0.1 else "High" if p <= 0.4 else "Medium" for p in pct]
+        df["Last Updated"] = pd.to_datetime(df["last_ts"], unit="s").dt.strftime("%Y-%m-%d")
+        df = df.rename(columns={"images": "Reports", "detections": "Debris Count"})
+        df = df[["Rank", "Location", "Pollution Level", "Reports", "Debris Count", "Last Updated"]]
+
+        # Add filters
+        col1, col2 = st.columns(2)
+        with col1:
+            pollution_filter = st.selectbox("Filter by Pollution Level", ["All", "Critical", "High", "Medium"])
+        with col2:
+            search_term = st.text_input("Search locations", placeholder="e.g. 12.3")
+
+        # Apply filters
+        if pollution_filter != "All":
+            df = df[df['Pollution Level'] == pollution_filter]
+
+        if search_term:
+            df = df[df['Location'].str.contains(search_term, regex=False)]
+
+        st.dataframe(
+            df,
+            use_container_width=True,
+            column_config={
+                "Rank": st.column_config.NumberColumn("Rank", width="small"),
+                "Location": st.column_config.TextColumn("Location (lat, lon)", width="large"),
+                "Pollution Level": st.column_config.TextColumn("Pollution Level", width="medium"),
+                "Reports": st.column_config.NumberColumn("Reports", format="%d"),
+                "Debris Count": st.column_config.NumberColumn("Debris Count", format="%d"),
+                "Last Updated": st.column_config.TextColumn("Last Updated", width="medium")
+            }
+        )
 
 with tab5:
     st.markdown("### Join Our Cleanup Team")
@@ -635,37 +946,6 @@ with tab5:
     """)
 
 
-def _color_for_class(cls_id: int) -> Tuple[int, int, int]:
-    palette = [
-        (39, 76, 119),  # deep blue
-        (51, 92, 103),  # teal
-        (237, 125, 49), # orange
-        (120, 94, 240), # purple
-        (35, 166, 213), # sky
-        (23, 190, 187), # cyan
-    ]
-    return palette[cls_id % len(palette)]
-
-
-def draw_boxes(image_path: str, boxes: List[dict]) -> Image.Image:
-    img = Image.open(image_path).convert("RGB")
-    draw = ImageDraw.Draw(img)
-    try:
-        font = ImageFont.truetype("arial.ttf", 16)
-    except Exception:
-        font = ImageFont.load_default()
-    for b in boxes:
-        x1, y1, x2, y2 = [int(v) for v in b["xyxy"]]
-        color = _color_for_class(int(b["cls"]))
-        draw.rectangle([(x1, y1), (x2, y2)], outline=color, width=3)
-        label = f"{b['label']} {b['conf']:.2f}"
-        tw, th = draw.textlength(label, font=font), 16
-        # label background
-        draw.rectangle([(x1, max(0, y1 - th - 4)), (x1 + int(tw) + 8, y1)], fill=(0, 0, 0, 160))
-        draw.text((x1 + 4, y1 - th - 2), label, fill=(255, 255, 255), font=font)
-    return img
-
-
 # Footer
 st.markdown(
     """
@@ -686,5 +966,7 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-
-
+# Spans from this rerun go to runs/traces/spans.jsonl; `python src/tracing.py` turns them into a Chrome trace
+if tracing.is_enabled():
+    trace_dir = load_config("configs/config.yaml").get("tracing", {}).get("out_dir", "runs/traces")
+    tracing.flush_jsonl(os.path.join(trace_dir, "spans.jsonl"))
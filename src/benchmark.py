@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import copy
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+try:
+    from .utils import load_config, list_images
+    from .export import backend_weights_path
+    from .geo import extract_gps_from_bytes
+    from .ingest import decode_image
+    from .inference import inference_device, predict_on_images, resolve_best_model_path, result_boxes
+    from .registry import get_registry, predict_device
+except Exception:
+    from utils import load_config, list_images
+    from export import backend_weights_path
+    from geo import extract_gps_from_bytes
+    from ingest import decode_image
+    from inference import inference_device, predict_on_images, resolve_best_model_path, result_boxes
+    from registry import get_registry, predict_device
+
+
+STAGES = ("read", "decode", "exif", "preprocess", "forward", "postprocess", "convert")
+GPS_IFD_TAG = 0x8825
+
+
+def synthetic_images(out_dir: str, n: int, width: int, height: int, seed: int = 0) -> List[str]:
+    """Deterministic JPEGs with GPS EXIF: a noisy water-like background with bright floating blobs."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths: List[str] = []
+    for i in range(n):
+        path = os.path.join(out_dir, f"synthetic_{width}x{height}_{seed}_{i:04d}.jpg")
+        paths.append(path)
+        if os.path.isfile(path):
+            continue
+        base = np.linspace(60, 140, height, dtype=np.float32)[:, None, None] * np.array([1.0, 0.8, 0.4], dtype=np.float32)
+        img = np.clip(base + rng.normal(0, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+        for _ in range(int(rng.integers(3, 15))):
+            cx, cy = int(rng.integers(0, width)), int(rng.integers(0, height))
+            axes = (int(rng.integers(4, 40)), int(rng.integers(4, 40)))
+            color = tuple(int(c) for c in rng.integers(150, 255, 3))
+            cv2.ellipse(img, (cx, cy), axes, float(rng.uniform(0, 180)), 0, 360, color, -1)
+        exif = Image.Exif()
+        lat, lon = float(rng.uniform(-60, 60)), float(rng.uniform(-180, 180))
+        exif.get_ifd(GPS_IFD_TAG).update({
+            1: "N" if lat >= 0 else "S", 2: _dms(abs(lat)),
+            3: "E" if lon >= 0 else "W", 4: _dms(abs(lon)),
+        })
+        Image.fromarray(img[:, :, ::-1]).save(path, quality=90, exif=exif)
+    return paths
+
+
+def _dms(value: float):
+    deg = int(value)
+    minutes = int((value - deg) * 60)
+    return (float(deg), float(minutes), round((value - deg - minutes / 60.0) * 3600.0, 4))
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if len(values) == 0:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    arr = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"mean": round(float(arr.mean()), 3), "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return _windows_peak_rss_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024.0 ** 2 if sys.platform == "darwin" else peak / 1024.0, 1)  # bytes on macOS, KiB on Linux
+
+
+def _windows_peak_rss_mb() -> float:
+    import ctypes
+    from ctypes import wintypes
+
+    class _Counters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+            )
+        ]
+
+    counters = _Counters()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    ctypes.windll.psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+    return round(counters.PeakWorkingSetSize / 1024.0 ** 2, 1)
+
+
+def run_point(cfg: dict, point: dict, image_paths: Sequence[str], repeats: int = 1) -> dict:
+    """Benchmark one (backend, imgsz, batch_size, threads) combination.
+
+    Two passes over the images:
+    - staged: sequential read -> EXIF -> decode -> model.predict -> result conversion
+      per batch, with per-image timings for every stage (preprocess, forward and
+      postprocess come from ultralytics' own `res.speed`) and per-batch latency;
+    - end_to_end: `predict_on_images` as the app calls it (pipelined ingest,
+      detection cache disabled), for overall throughput.
+    `threads` sets the torch intra-op pool, OpenCV's pool and the ingest workers.
+    """
+    backend, imgsz, batch_size, threads = point["backend"], point["imgsz"], point["batch_size"], point["threads"]
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    device = inference_device(cfg)
+    conf = float(cfg["inference"]["conf"])
+    iou = float(cfg["inference"]["iou"])
+    entry = get_registry().get(
+        backend_weights_path(resolve_best_model_path(cfg), backend), device=device, imgsz=imgsz, warmup=True
+    )
+
+    stages: Dict[str, List[float]] = {s: [] for s in STAGES}
+    latencies: List[float] = []
+    n_images = 0
+    t_start = time.perf_counter()
+    for _ in range(repeats):
+        for i in range(0, len(image_paths), batch_size):
+            t_batch = time.perf_counter()
+            images = []
+            for path in image_paths[i:i + batch_size]:
+                t0 = time.perf_counter()
+                with open(path, "rb") as f:
+                    data = f.read()
+                t1 = time.perf_counter()
+                extract_gps_from_bytes(data)
+                t2 = time.perf_counter()
+                images.append(decode_image(data))
+                t3 = time.perf_counter()
+                stages["read"].append((t1 - t0) * 1000.0)
+                stages["exif"].append((t2 - t1) * 1000.0)
+                stages["decode"].append((t3 - t2) * 1000.0)
+            results = entry.predict(
+                images, imgsz=imgsz, conf=conf, iou=iou, device=predict_device(device), verbose=False
+            )
+            for res in results:
+                stages["preprocess"].append(float(res.speed["preprocess"]))
+                stages["forward"].append(float(res.speed["inference"]))
+                stages["postprocess"].append(float(res.speed["postprocess"]))
+                t0 = time.perf_counter()
+                result_boxes(res)
+                stages["convert"].append((time.perf_counter() - t0) * 1000.0)
+            latencies.append((time.perf_counter() - t_batch) * 1000.0)
+            n_images += len(images)
+    staged_s = time.perf_counter() - t_start
+
+    run_cfg = copy.deepcopy(cfg)
+    run_cfg["training"]["imgsz"] = imgsz
+    run_cfg["inference"]["backend"] = backend
+    run_cfg["inference"]["cache"] = {"enabled": False}
+    run_cfg["store"] = {"enabled": False}
+    run_cfg["inference"].setdefault("tiling", {})["enabled"] = False
+    run_cfg["inference"]["ingest"] = {"workers": threads, "batch_size": batch_size}
+    t_start = time.perf_counter()
+    for _ in range(repeats):
+        predict_on_images(list(image_paths), cfg=run_cfg)
+    e2e_s = time.perf_counter() - t_start
+
+    return {
+        **point,
+        "images": n_images,
+        "load_s": round(entry.load_s, 4),
+        "warmup_s": round(entry.warmup_s, 4),
+        "staged": {
+            "throughput_ips": round(n_images / max(staged_s, 1e-9), 3),
+            "batch_latency_ms": percentiles(latencies),
+            "stages_ms": {s: percentiles(v) for s, v in stages.items()},
+        },
+        "end_to_end": {
+            "throughput_ips": round(n_images / max(e2e_s, 1e-9), 3),
+            "wall_s": round(e2e_s, 4),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _run_isolated(cfg: dict, point: dict, image_paths: Sequence[str], repeats: int) -> dict:
+    # A fresh process per point, so peak RSS and model/thread state do not leak between points
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(run_point, cfg, point, list(image_paths), repeats).result()
+
+
+def _result_key(r: dict) -> tuple:
+    return r["dataset"], r["backend"], r["imgsz"], r["batch_size"], r["threads"]
+
+
+def compare(baseline: dict, current: dict) -> List[str]:
+    """One line per sweep point present in both reports: throughput and p95 latency change."""
+    old = {_result_key(r): r for r in baseline.get("results", [])}
+    lines = []
+    for r in current.get("results", []):
+        b = old.get(_result_key(r))
+        if b is None:
+            continue
+        tput_old, tput_new = b["end_to_end"]["throughput_ips"], r["end_to_end"]["throughput_ips"]
+        p95_old, p95_new = b["staged"]["batch_latency_ms"]["p95"], r["staged"]["batch_latency_ms"]["p95"]
+        lines.append(
+            f"{'/'.join(str(k) for k in _result_key(r))}: "
+            f"{tput_old:.1f} -> {tput_new:.1f} img/s ({(tput_new / max(tput_old, 1e-9) - 1) * 100:+.1f}%), "
+            f"p95 {p95_old:.1f} -> {p95_new:.1f} ms ({(p95_new / max(p95_old, 1e-9) - 1) * 100:+.1f}%)"
+        )
+    return lines
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    cfg = load_config("configs/config.yaml")
+    bench = cfg.get("benchmark", {})
+    out_dir = str(bench.get("out_dir", os.path.join(cfg["paths"]["runs_dir"], "benchmarks")))
+    repeats = int(bench.get("repeats", 1))
+
+    width, height = (int(v) for v in bench.get("synthetic_size", [1920, 1080]))
+    datasets = {
+        "synthetic": synthetic_images(
+            os.path.join(out_dir, "synthetic"), int(bench.get("synthetic_images", 64)), width, height,
+            seed=int(bench.get("seed", 0)),
+        )
+    }
+    test_dir = os.path.join(cfg["paths"]["splits_dir"], "test", "images")
+    n_real = int(bench.get("test_images", 32))
+    if n_real > 0 and os.path.isdir(test_dir):
+        sample = sorted(list_images(test_dir))[:n_real]
+        if sample:
+            datasets["test"] = sample
+
+    weights = resolve_best_model_path(cfg)
+    backends = []
+    for backend in bench.get("backends", ["torch"]):
+        if backend == "torch" or os.path.exists(backend_weights_path(weights, backend)):
+            backends.append(backend)
+        else:
+            print(f"Skipping backend '{backend}': {backend_weights_path(weights, backend)} not found (run src/export.py)")
+
+    grid = itertools.product(
+        backends,
+        [int(v) for v in bench.get("imgsz", [cfg["training"]["imgsz"]])],
+        [int(v) for v in bench.get("batch_sizes", [1, 8, 16])],
+        [int(v) for v in bench.get("threads", [os.cpu_count() or 1])],
+    )
+    results = []
+    for backend, imgsz, batch_size, threads in grid:
+        for dataset, paths in datasets.items():
+            point = {"dataset": dataset, "backend": backend, "imgsz": imgsz, "batch_size": batch_size, "threads": threads}
+            if bench.get("isolate", True):
+                result = _run_isolated(cfg, point, paths, repeats)
+            else:
+                result = run_point(cfg, point, paths, repeats)
+            results.append(result)
+            print(
+                f"{dataset} {backend} imgsz={imgsz} batch={batch_size} threads={threads}: "
+                f"{result['end_to_end']['throughput_ips']:.1f} img/s end-to-end, "
+                f"batch p50/p95/p99 {result['staged']['batch_latency_ms']['p50']:.1f}/"
+                f"{result['staged']['batch_latency_ms']['p95']:.1f}/{result['staged']['batch_latency_ms']['p99']:.1f} ms, "
+                f"peak RSS {result['peak_rss_mb']:.0f} MB"
+            )
+
+    commit = _git_commit()
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "weights": weights,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "device": inference_device(cfg),
+        },
+        "settings": bench,
+        "results": results,
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, f"benchmark_{commit or 'nogit'}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out_path}")
+
+    baseline_path = bench.get("baseline")
+    if baseline_path and os.path.isfile(baseline_path):
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline_path} ({baseline.get('git_commit')}):")
+        for line in compare(baseline, report):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def box_area(xyxy: np.ndarray) -> np.ndarray:
+    return np.clip(xyxy[:, 2] - xyxy[:, 0], 0, None) * np.clip(xyxy[:, 3] - xyxy[:, 1], 0, None)
+
+
+def box_overlap(a: np.ndarray, b: np.ndarray, metric: str = "iou") -> np.ndarray:
+    """Pairwise overlap matrix of shape (len(a), len(b)).
+
+    metric="iou" is intersection over union; metric="ios" is intersection over
+    the smaller box, which also matches a box cut in half by a tile seam with
+    its full-size counterpart.
+    """
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    area_a = box_area(a)[:, None]
+    area_b = box_area(b)[None, :]
+    if metric == "ios":
+        denom = np.minimum(area_a, area_b)
+    else:
+        denom = area_a + area_b - inter
+    return inter / np.maximum(denom, 1e-9)
+
+
+def _class_offset(xyxy: np.ndarray, classes: Optional[np.ndarray]) -> np.ndarray:
+    # Shift each class into its own coordinate range so one pass never merges across classes
+    if classes is None or len(xyxy) == 0:
+        return xyxy
+    span = float(xyxy.max()) + 1.0
+    return xyxy + (classes.astype(xyxy.dtype) * span)[:, None]
+
+
+def nms(xyxy: np.ndarray, scores: np.ndarray, iou_thr: float,
+        classes: Optional[np.ndarray] = None, metric: str = "iou") -> np.ndarray:
+    """Greedy class-aware NMS. Returns kept indices sorted by descending score."""
+    if len(xyxy) == 0:
+        return np.zeros((0,), dtype=np.int64)
+    boxes = _class_offset(xyxy.astype(np.float64), classes)
+    order = np.argsort(-scores, kind="stable")
+    keep: List[int] = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(int(i))
+        if order.size == 1:
+            break
+        ov = box_overlap(boxes[i:i + 1], boxes[order[1:]], metric)[0]
+        order = order[1:][ov <= iou_thr]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def weighted_box_fusion(xyxy: np.ndarray, scores: np.ndarray, iou_thr: float,
+                        classes: Optional[np.ndarray] = None,
+                        metric: str = "iou") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fuse overlapping boxes into score-weighted averages.
+
+    Boxes are visited in descending score order and joined to the first
+    existing cluster (same class) whose fused box overlaps by more than
+    `iou_thr`. Each fused box takes the max score of its members.
+    Returns (xyxy, scores, classes).
+    """
+    if classes is None:
+        classes = np.zeros((len(xyxy),), dtype=np.int64)
+    if len(xyxy) == 0:
+        return xyxy.reshape(0, 4), scores, classes
+    order = np.argsort(-scores, kind="stable")
+    fused = np.zeros((len(xyxy), 4), dtype=np.float64)
+    weight_sum = np.zeros((len(xyxy),), dtype=np.float64)
+    coord_sum = np.zeros((len(xyxy), 4), dtype=np.float64)
+    best = np.zeros((len(xyxy),), dtype=np.float64)
+    fused_cls = np.zeros((len(xyxy),), dtype=classes.dtype)
+    n = 0
+    for i in order:
+        box = xyxy[i:i + 1].astype(np.float64)
+        j = -1
+        if n > 0:
+            same = fused_cls[:n] == classes[i]
+            ov = np.where(same, box_overlap(box, fused[:n], metric)[0], -1.0)
+            k = int(np.argmax(ov))
+            if ov[k] > iou_thr:
+                j = k
+        if j < 0:
+            j = n
+            n += 1
+            fused_cls[j] = classes[i]
+        w = float(scores[i])
+        coord_sum[j] += box[0] * w
+        weight_sum[j] += w
+        best[j] = max(best[j], w)
+        fused[j] = coord_sum[j] / max(weight_sum[j], 1e-9)
+    return fused[:n].astype(np.float32), best[:n].astype(np.float32), fused_cls[:n]
+
+
+def refilter(xyxy: np.ndarray, scores: np.ndarray, classes: np.ndarray,
+             conf_thr: float, iou_thr: float) -> np.ndarray:
+    """Indices of candidates that survive a stricter confidence threshold and class-aware NMS.
+
+    Meant for candidates produced at a low floor confidence and a loose NMS
+    IoU, so threshold changes can be applied without re-running the model.
+    """
+    idx = np.flatnonzero(scores >= conf_thr)
+    keep = nms(xyxy[idx], scores[idx], iou_thr, classes[idx])
+    return idx[keep]
+
+
+def boxes_to_arrays(boxes: List[dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[int, str]]:
+    """Inverse of `to_box_dicts`: (xyxy, conf, cls, names) arrays from the list-of-dicts format."""
+    xyxy = np.asarray([b["xyxy"] for b in boxes], dtype=np.float32).reshape(-1, 4)
+    conf = np.asarray([b["conf"] for b in boxes], dtype=np.float32)
+    cls = np.asarray([b["cls"] for b in boxes], dtype=np.int64)
+    names = {int(b["cls"]): b["label"] for b in boxes}
+    return xyxy, conf, cls, names
+
+
+def to_box_dicts(xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, names: Dict[int, str]) -> List[dict]:
+    """Build the list-of-dicts box format used by `predict_on_images`."""
+    boxes = []
+    for b, c, k in zip(xyxy.tolist(), conf.tolist(), cls.tolist()):
+        cls_id = int(k)
+        boxes.append({
+            "xyxy": b,  # [x1,y1,x2,y2]
+            "conf": float(c),
+            "cls": cls_id,
+            "label": names.get(cls_id, str(cls_id)),
+        })
+    return boxes
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+_CHUNK = 1 << 20
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_WEIGHTS_HASHES: Dict[Tuple[str, tuple], str] = {}
+
+
+def _weights_files(path: str) -> list:
+    """(relative path, file path) of every file in an exported model directory, in a stable order."""
+    files = []
+    for dirpath, _, filenames in sorted(os.walk(path)):
+        for fn in sorted(filenames):
+            full = os.path.join(dirpath, fn)
+            files.append((os.path.relpath(full, path), full))
+    return files
+
+
+def weights_hash(path: str) -> str:
+    """Hash of a weights file (or exported model directory), memoized on the mtime and size of each file.
+
+    A directory's own mtime does not change when a file inside it is
+    rewritten, so directories are keyed on their contents' stats.
+    """
+    if not os.path.exists(path):
+        # Hub names resolved by ultralytics at load time; the name identifies the weights
+        return content_hash(path.encode("utf-8"))
+    files = _weights_files(path) if os.path.isdir(path) else [("", path)]
+    stats = []
+    for rel, full in files:
+        st = os.stat(full)
+        stats.append((rel, st.st_mtime, st.st_size))
+    key = (os.path.abspath(path), tuple(stats))
+    cached = _WEIGHTS_HASHES.get(key)
+    if cached is not None:
+        return cached
+    if os.path.isdir(path):
+        h = hashlib.blake2b(digest_size=16)
+        for rel, full in files:
+            h.update(os.path.basename(rel).encode("utf-8"))
+            h.update(file_hash(full).encode("ascii"))
+        digest = h.hexdigest()
+    else:
+        digest = file_hash(path)
+    _WEIGHTS_HASHES[key] = digest
+    return digest
+
+
+def cache_key(image_hash: str, model_hash: str, imgsz: int, conf: float, iou: float, mode: str = "full") -> str:
+    return content_hash(f"{image_hash}|{model_hash}|{imgsz}|{conf:.4f}|{iou:.4f}|{mode}".encode("utf-8"))
+
+
+class DetectionCache:
+    """Persistent, size-bounded LRU cache of detection results in SQLite.
+
+    Values are JSON-serializable dicts. When the stored payload exceeds
+    `max_bytes`, the least recently read entries are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access)")
+        self._db.commit()
+        self._bytes = int(self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0])
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict) -> None:
+        payload = json.dumps(value, separators=(",", ":"))
+        size = len(payload)
+        with self._lock:
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, size, time.time()),
+            )
+            self._bytes += size - (old[0] if old else 0)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes:
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 256").fetchall()
+            if not rows:
+                self._bytes = 0
+                return
+            for key, size in rows:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._bytes -= size
+                if self._bytes <= self.max_bytes:
+                    return
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = int(self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0])
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": entries,
+            "bytes": self._bytes,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+            self._bytes = 0
+
+
+_CACHES: Dict[str, DetectionCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_detection_cache(cfg: dict) -> Optional[DetectionCache]:
+    """Process-wide cache configured by `inference.cache`, or None when disabled."""
+    cache_cfg = cfg["inference"].get("cache", {})
+    if not cache_cfg.get("enabled", False):
+        return None
+    path = str(cache_cfg.get("path", os.path.join(cfg["paths"]["runs_dir"], "cache", "detections.sqlite")))
+    with _CACHES_LOCK:
+        cache = _CACHES.get(path)
+        if cache is None:
+            cache = DetectionCache(path, int(float(cache_cfg.get("max_mb", 256)) * 1024 * 1024))
+            _CACHES[path] = cache
+        return cache
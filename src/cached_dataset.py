@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import re
+from typing import Optional, Tuple
+
+import ultralytics
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer, DetectionValidator
+
+try:
+    from .image_cache import ImageCache, open_image_cache  # when imported as part of package `src`
+except Exception:
+    from image_cache import ImageCache, open_image_cache  # fallback for direct script execution
+
+# `CachedYOLODataset.load_image` mirrors private YOLODataset state (ims, buffer,
+# max_buffer_length, cache); it was checked against releases in [min, max)
+_SUPPORTED_VERSIONS = ((8, 3, 30), (8, 4, 0))
+_PRIVATE_ATTRS = ("ims", "im_hw0", "im_hw", "im_files", "buffer", "max_buffer_length", "cache", "augment")
+
+
+def _version(text: str) -> Tuple[int, ...]:
+    return tuple(int(p) for p in re.findall(r"\d+", text)[:3])
+
+
+class CachedYOLODataset(YOLODataset):
+    """YOLODataset whose `load_image` reads from the pre-resized cache.
+
+    Defined at module level (not patched onto instances) so datasets still
+    pickle into spawned dataloader workers.
+    """
+
+    _image_cache: Optional[ImageCache] = None
+
+    def load_image(self, i: int, rect_mode: bool = True):
+        """Mirrors the parent's mosaic buffer bookkeeping; falls back to the parent
+        for images missing from the cache and for square-stretch (non-rect) loads.
+        """
+        if self.ims[i] is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+        hit = self._image_cache.get(self.im_files[i]) if rect_mode and self._image_cache is not None else None
+        if hit is None:
+            return super().load_image(i, rect_mode)
+        im, hw0, hw = hit
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw0, hw
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                if self.cache != "ram":
+                    self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, hw0, hw
+
+
+def attach_image_cache(dataset, img_path: str, imgsz: int) -> Optional[ImageCache]:
+    """Route `dataset.load_image` through the split's image cache if a valid one exists."""
+    if type(dataset) is not YOLODataset:
+        print(f"Image cache supports YOLODataset only, got {type(dataset).__name__}; decoding source images")
+        return None
+    low, high = _SUPPORTED_VERSIONS
+    version = getattr(ultralytics, "__version__", "0")
+    missing = [a for a in _PRIVATE_ATTRS if not hasattr(dataset, a)]
+    if not low <= _version(version) < high or missing:
+        print(f"Image cache not supported with ultralytics {version}"
+              f"{' (missing ' + ', '.join(missing) + ')' if missing else ''}; decoding source images")
+        return None
+    cache = open_image_cache(img_path, imgsz)
+    if cache is None:
+        print(f"No up-to-date image cache for {img_path} at imgsz={imgsz}; decoding source images")
+        return None
+    dataset.__class__ = CachedYOLODataset
+    dataset._image_cache = cache
+    return cache
+
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """DetectionTrainer whose train/val datasets read pre-resized images (see src/image_cache.py)."""
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        dataset = super().build_dataset(img_path, mode=mode, batch=batch)
+        attach_image_cache(dataset, img_path, int(self.args.imgsz))
+        return dataset
+
+
+class CachedDetectionValidator(DetectionValidator):
+    """DetectionValidator for standalone `model.val`; reads pre-resized images when cached."""
+
+    def build_dataset(self, img_path, mode="val", batch=None):
+        dataset = super().build_dataset(img_path, mode=mode, batch=batch)
+        attach_image_cache(dataset, img_path, int(self.args.imgsz))
+        return dataset
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+try:
+    from .boxes import boxes_to_arrays, to_box_dicts
+except Exception:
+    from boxes import boxes_to_arrays, to_box_dicts
+
+
+def _copy_box(box: dict) -> dict:
+    return {**box, "xyxy": list(box["xyxy"])}
+
+
+class Detections(Sequence):
+    """Columnar boxes for one image: xyxy (N, 4) float32, conf (N,) float32, cls (N,) int64.
+
+    Behaves like the list-of-dicts `boxes` format (len, indexing, iteration),
+    but the dicts are only built on first access, so callers that work on the
+    arrays never pay for per-box Python objects.
+    """
+
+    __slots__ = ("xyxy", "conf", "cls", "names", "_dicts")
+
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, names: Optional[Dict[int, str]] = None):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls, dtype=np.int64).reshape(-1)
+        self.names = dict(names or {})
+        self._dicts: Optional[List[dict]] = None
+
+    @classmethod
+    def empty(cls, names: Optional[Dict[int, str]] = None) -> "Detections":
+        return cls(np.zeros((0, 4)), np.zeros((0,)), np.zeros((0,)), names)
+
+    @classmethod
+    def from_result(cls, res) -> "Detections":
+        """From one ultralytics result with a single device->host transfer of `res.boxes.data`."""
+        names = {int(k): str(v) for k, v in (getattr(res, "names", None) or {}).items()}
+        if getattr(res, "boxes", None) is None:
+            return cls.empty(names)
+        # Columns: x1, y1, x2, y2, [track id,] conf, cls
+        data = res.boxes.data.cpu().numpy()  # type: ignore[attr-defined]
+        return cls(data[:, :4], data[:, -2], data[:, -1], names)
+
+    @classmethod
+    def from_dicts(cls, boxes: List[dict]) -> "Detections":
+        xyxy, conf, cls_ids, names = boxes_to_arrays(boxes)
+        return cls(xyxy, conf, cls_ids, names)
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "Detections":
+        """Inverse of `to_payload`; also accepts the older `{"boxes": [...]}` cache entries."""
+        if "boxes" in payload:
+            return cls.from_dicts(payload["boxes"])
+        return cls(payload["xyxy"], payload["conf"], payload["cls"],
+                   {int(k): v for k, v in payload.get("names", {}).items()})
+
+    def to_payload(self) -> dict:
+        """JSON-serializable columnar form (used by the detection cache)."""
+        used = set(self.cls.tolist())
+        return {
+            "xyxy": self.xyxy.tolist(),
+            "conf": self.conf.tolist(),
+            "cls": self.cls.tolist(),
+            "names": {str(k): v for k, v in self.names.items() if k in used},
+        }
+
+    def _cached_dicts(self) -> List[dict]:
+        if self._dicts is None:
+            self._dicts = to_box_dicts(self.xyxy, self.conf, self.cls, self.names)
+        return self._dicts
+
+    def to_dicts(self) -> List[dict]:
+        """Fresh per-box dicts; callers may modify them without touching the cached copies."""
+        return [_copy_box(b) for b in self._cached_dicts()]
+
+    def take(self, idx: Union[np.ndarray, slice]) -> "Detections":
+        return Detections(self.xyxy[idx], self.conf[idx], self.cls[idx], self.names)
+
+    def __len__(self) -> int:
+        return len(self.conf)
+
+    def __getitem__(self, i):
+        """One box dict for an integer index; any other index (slice, mask, index array or list) -> `take`."""
+        if isinstance(i, (int, np.integer)) and not isinstance(i, bool):
+            return _copy_box(self._cached_dicts()[i])
+        return self.take(np.asarray(i) if isinstance(i, list) else i)
+
+    def __iter__(self):
+        return (_copy_box(b) for b in self._cached_dicts())
+
+    def __repr__(self) -> str:
+        return f"Detections(n={len(self)})"
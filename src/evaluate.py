@@ -4,6 +4,7 @@ import os
 from ultralytics import YOLO
 
 from utils import load_config
+from cached_dataset import CachedDetectionValidator
 
 
 def main():
@@ -19,7 +20,8 @@ def main():
         raise SystemExit("best_model.path not found. Train the model first.")
 
     model = YOLO(best_model_path)
-    metrics = model.val(data=data_yaml)
+    validator = CachedDetectionValidator if cfg["training"].get("image_cache", False) else None
+    metrics = model.val(data=data_yaml, imgsz=int(cfg["training"]["imgsz"]), validator=validator)
 
     # Print key metrics
     # For detection: metrics.box.map, metrics.box.map50, metrics.box.map75, metrics.box.recall, etc.
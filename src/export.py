@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import os
+from typing import Iterator, List, Optional
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+try:
+    from .utils import load_config, list_images
+except Exception:
+    from utils import load_config, list_images
+
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino", "openvino-int8")
+
+
+def backend_weights_path(weights_path: str, backend: str) -> str:
+    """Where `src/export.py` writes the artifact for `backend`, next to the .pt weights."""
+    stem = os.path.splitext(weights_path)[0]
+    if backend == "torch":
+        return weights_path
+    if backend == "onnx":
+        return stem + ".onnx"
+    if backend == "onnx-int8":
+        return stem + ".int8.onnx"
+    if backend == "openvino":
+        return stem + "_openvino_model"  # directory names used by ultralytics
+    if backend == "openvino-int8":
+        return stem + "_int8_openvino_model"
+    raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+
+
+def letterbox_for_onnx(img: np.ndarray, imgsz: int) -> np.ndarray:
+    """Resize/pad a BGR image the way ultralytics does and return a 1x3xHxW float32 RGB tensor."""
+    h, w = img.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    resized = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = resized
+    x = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(x[None])
+
+
+def export_onnx(weights_path: str, imgsz: int, dynamic: bool = True) -> str:
+    out = YOLO(weights_path).export(format="onnx", imgsz=imgsz, dynamic=dynamic, simplify=True)
+    return str(out)
+
+
+def export_openvino(weights_path: str, imgsz: int, int8: bool = False, data_yaml: Optional[str] = None) -> str:
+    kwargs = {"data": data_yaml} if int8 and data_yaml else {}
+    out = YOLO(weights_path).export(format="openvino", imgsz=imgsz, int8=int8, **kwargs)
+    return str(out)
+
+
+def quantize_onnx_int8(onnx_path: str, calib_dir: str, imgsz: int, num_images: int = 200, seed: int = 0) -> str:
+    """Static INT8 quantization calibrated on images from `calib_dir` (e.g. data/splits/val/images).
+
+    Raises FileNotFoundError when `calib_dir` does not exist and ValueError when it holds no images.
+    """
+    import onnx
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    if not os.path.isdir(calib_dir):
+        raise FileNotFoundError(f"Calibration directory {calib_dir} not found")
+    images = sorted(list_images(calib_dir))
+    if len(images) == 0:
+        raise ValueError(f"No calibration images found in {calib_dir}")
+    rng = np.random.default_rng(seed)
+    if len(images) > num_images:
+        images = [images[i] for i in sorted(rng.choice(len(images), num_images, replace=False))]
+    input_name = InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self, paths: List[str]) -> None:
+            self._it: Iterator[str] = iter(paths)
+
+        def get_next(self):
+            for path in self._it:
+                img = cv2.imread(path, cv2.IMREAD_COLOR)
+                if img is not None:
+                    return {input_name: letterbox_for_onnx(img, imgsz)}
+            return None
+
+    out_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+    quantize_static(
+        onnx_path,
+        out_path,
+        _Reader(images),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    # ultralytics reads class names, stride and imgsz from the ONNX metadata
+    src_model, q_model = onnx.load(onnx_path), onnx.load(out_path)
+    if not q_model.metadata_props:
+        q_model.metadata_props.extend(src_model.metadata_props)
+        onnx.save(q_model, out_path)
+    return out_path
+
+
+def export_best(cfg: dict, weights_path: str) -> List[str]:
+    """Export trained weights according to the `export` config section."""
+    export_cfg = cfg.get("export", {})
+    imgsz = int(cfg["training"]["imgsz"])
+    written: List[str] = []
+    if export_cfg.get("onnx", True):
+        onnx_path = export_onnx(weights_path, imgsz, dynamic=bool(export_cfg.get("dynamic", True)))
+        written.append(onnx_path)
+        if export_cfg.get("int8", False):
+            calib_dir = os.path.join(cfg["paths"]["splits_dir"], "val", "images")
+            written.append(quantize_onnx_int8(onnx_path, calib_dir, imgsz, int(export_cfg.get("calib_images", 200))))
+    if export_cfg.get("openvino", False):
+        data_yaml = os.path.join("configs", "dataset.yolov8.yaml")
+        written.append(export_openvino(weights_path, imgsz, bool(export_cfg.get("int8", False)), data_yaml))
+    return written
+
+
+def main():
+    cfg = load_config("configs/config.yaml")
+    best_model_path_file = os.path.join(cfg["paths"]["models_dir"], "best_model.path")
+    if not os.path.isfile(best_model_path_file):
+        raise SystemExit("best_model.path not found. Train the model first.")
+    with open(best_model_path_file, "r", encoding="utf-8") as f:
+        best_model_path = f.read().strip()
+    try:
+        written = export_best(cfg, best_model_path)
+    except (FileNotFoundError, ValueError) as e:
+        raise SystemExit(str(e))
+    for path in written:
+        print(f"Exported: {path}")
+
+
+if __name__ == "__main__":
+    main()
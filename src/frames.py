@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import cv2
+import numpy as np
+
+try:
+    from .utils import SUPPORTED_IMG_EXTS, VIDEO_EXTS
+except Exception:
+    from utils import SUPPORTED_IMG_EXTS, VIDEO_EXTS
+
+
+@dataclass
+class Frame:
+    index: int
+    timestamp: Optional[float]  # seconds from video start, or file mtime for image folders
+    source: str  # image path, or "<video>#<index>" for video frames
+    image: np.ndarray  # BGR, as expected by ultralytics for array inputs
+    path: Optional[str] = None  # set for frames read from image files
+
+
+def is_video(path: str) -> bool:
+    return os.path.isfile(path) and os.path.splitext(path)[1].lower() in VIDEO_EXTS
+
+
+def iter_image_paths(root: str) -> Iterator[str]:
+    """Yield image paths under `root` in sorted order without materializing the full listing."""
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_image_paths(entry.path)
+        elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_IMG_EXTS:
+            yield entry.path
+
+
+def iter_video_frames(path: str, stride: int = 1) -> Iterator[Frame]:
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open video: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    index = 0
+    try:
+        while True:
+            if index % stride != 0:
+                # grab() advances without decoding the skipped frame
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ok, img = cap.read()
+            if not ok:
+                break
+            ts = index / fps if fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            yield Frame(index=index, timestamp=ts, source=f"{path}#{index}", image=img)
+            index += 1
+    finally:
+        cap.release()
+
+
+def iter_directory_frames(root: str, stride: int = 1) -> Iterator[Frame]:
+    for index, path in enumerate(iter_image_paths(root)):
+        if index % stride != 0:
+            continue
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        yield Frame(index=index, timestamp=os.path.getmtime(path), source=path, image=img, path=path)
+
+
+def iter_frames(source: str, stride: int = 1) -> Iterator[Frame]:
+    """Frames from a video file or an image directory."""
+    stride = max(1, int(stride))
+    if is_video(source):
+        return iter_video_frames(source, stride)
+    if os.path.isdir(source):
+        return iter_directory_frames(source, stride)
+    raise ValueError(f"Expected a video file or a directory of images: {source}")
+
+
+def count_frames(source: str) -> Optional[int]:
+    """Frame count of a video (container metadata, may be approximate) or image directory; None if unknown."""
+    if is_video(source):
+        cap = cv2.VideoCapture(source)
+        try:
+            n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+        finally:
+            cap.release()
+        return n if n > 0 else None
+    if os.path.isdir(source):
+        return sum(1 for _ in iter_image_paths(source))
+    return None
+
+
+_DONE = object()
+
+
+def prefetch(frames: Iterator[Frame], depth: int) -> Iterator[Frame]:
+    """Decode `frames` on a background thread, holding at most `depth` frames in memory.
+
+    Closing the returned generator stops the producer thread at its next frame.
+    """
+    buf: "queue.Queue[object]" = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def _put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                buf.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for frame in frames:
+                if not _put(frame):
+                    return
+            _put(_DONE)
+        except BaseException as e:  # re-raised in the consumer
+            _put(e)
+
+    worker = threading.Thread(target=_produce, name="frame-decoder", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buf.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item  # type: ignore[misc]
+    finally:
+        stop.set()
@@ -1,9 +1,41 @@
 from __future__ import annotations
 
-from typing import Optional, Tuple
+import calendar
+import io
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
 from PIL import Image
 import exifread
 
+try:
+    from .tracing import traced
+except Exception:
+    from tracing import traced
+
+
+GPS_IFD_TAG = 0x8825
+EXIF_IFD_TAG = 0x8769
+XMP_SIGNATURE = b"http://ns.adobe.com/xap/1.0/\x00"
+# DateTime (IFD0); DateTimeOriginal, OffsetTimeOriginal, SubSecTimeOriginal (Exif IFD)
+_DATETIME, _DATETIME_ORIGINAL, _OFFSET_ORIGINAL, _SUBSEC_ORIGINAL = 0x0132, 0x9003, 0x9011, 0x9291
+# EXIF metadata sits in the first APP1 segment, which is at most 64 KiB
+EXIF_HEAD_BYTES = 1 << 17
+
+# TIFF field type -> (struct code, byte size)
+_TIFF_TYPES = {
+    1: ("B", 1),   # BYTE
+    2: ("c", 1),   # ASCII
+    3: ("H", 2),   # SHORT
+    4: ("I", 4),   # LONG
+    5: ("II", 8),  # RATIONAL
+    7: ("B", 1),   # UNDEFINED
+    9: ("i", 4),   # SLONG
+    10: ("ii", 8), # SRATIONAL
+    11: ("f", 4),  # FLOAT
+    12: ("d", 8),  # DOUBLE
+}
+
 
 def _to_degrees(value):
     d = float(value.values[0].num) / float(value.values[0].den)
@@ -12,6 +44,7 @@ def _to_degrees(value):
     return d + (m / 60.0) + (s / 3600.0)
 
 
+@traced("geo.extract_gps_from_image")
 def extract_gps_from_image(image_path: str) -> Optional[Tuple[float, float]]:
     """Extract latitude and longitude from an image EXIF if present.
 
@@ -39,4 +72,176 @@ def extract_gps_from_image(image_path: str) -> Optional[Tuple[float, float]]:
     return None
 
 
+def _read_ifd(tiff: bytes, offset: int, endian: str) -> Dict[int, Any]:
+    """Decode one TIFF IFD into {tag: value}. Rationals become floats, ASCII becomes str."""
+    (count,) = struct.unpack_from(endian + "H", tiff, offset)
+    tags: Dict[int, Any] = {}
+    for i in range(count):
+        entry = offset + 2 + 12 * i
+        tag, typ, n = struct.unpack_from(endian + "HHI", tiff, entry)
+        if typ not in _TIFF_TYPES:
+            continue
+        code, size = _TIFF_TYPES[typ]
+        nbytes = size * n
+        if nbytes <= 4:
+            raw = tiff[entry + 8:entry + 8 + nbytes]
+        else:
+            (ptr,) = struct.unpack_from(endian + "I", tiff, entry + 8)
+            raw = tiff[ptr:ptr + nbytes]
+        if len(raw) < nbytes:
+            continue
+        if typ == 2:
+            tags[tag] = raw.split(b"\x00", 1)[0].decode("ascii", "ignore").strip()
+        elif typ in (5, 10):
+            vals = struct.unpack(endian + code[0] * (2 * n), raw)
+            tags[tag] = [num / den if den else 0.0 for num, den in zip(vals[0::2], vals[1::2])]
+        else:
+            tags[tag] = list(struct.unpack(endian + code * n, raw))
+    return tags
+
+
+def _tiff_ifds(tiff: bytes) -> Tuple[Dict[int, Any], Dict[int, Any]]:
+    """(IFD0, GPS IFD) tags of a TIFF/EXIF block."""
+    endian = "<" if tiff[:2] == b"II" else ">"
+    (ifd0_offset,) = struct.unpack_from(endian + "I", tiff, 4)
+    ifd0 = _read_ifd(tiff, ifd0_offset, endian)
+    gps: Dict[int, Any] = {}
+    if GPS_IFD_TAG in ifd0:
+        gps = _read_ifd(tiff, int(ifd0[GPS_IFD_TAG][0]), endian)
+    return ifd0, gps
+
+
+def read_exif_ifds(tiff: bytes) -> Tuple[Dict[int, Any], Dict[int, Any], Dict[int, Any]]:
+    """(IFD0, Exif IFD, GPS IFD) tags of a TIFF/EXIF block; missing IFDs are empty."""
+    ifd0, gps = _tiff_ifds(tiff)
+    exif: Dict[int, Any] = {}
+    if EXIF_IFD_TAG in ifd0:
+        endian = "<" if tiff[:2] == b"II" else ">"
+        exif = _read_ifd(tiff, int(ifd0[EXIF_IFD_TAG][0]), endian)
+    return ifd0, exif, gps
+
+
+def _find_app1(data: bytes, signature: bytes) -> Optional[bytes]:
+    """Payload (after `signature`) of the first JPEG APP1 segment starting with `signature`."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xDA:  # start of scan: no metadata segments follow
+            return None
+        (length,) = struct.unpack_from(">H", data, pos + 2)
+        if marker == 0xE1 and data[pos + 4:pos + 4 + len(signature)] == signature:
+            return data[pos + 4 + len(signature):pos + 2 + length]
+        pos += 2 + length
+    return None
+
+
+def find_exif_block(data: bytes) -> Optional[bytes]:
+    """Locate the TIFF-structured EXIF block in a JPEG (APP1 segment) or TIFF buffer.
+
+    Only segment headers are walked; the compressed image data is never touched.
+    """
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return data
+    return _find_app1(data, b"Exif\x00\x00")
+
+
+def find_xmp_packet(data: bytes) -> Optional[bytes]:
+    """The XMP packet of a JPEG (drone makers put gimbal angles and relative altitude there)."""
+    return _find_app1(data, XMP_SIGNATURE)
+
+
+def _gps_from_ifd(gps: Dict[int, Any]) -> Optional[Tuple[float, float]]:
+    # GPS tags: 1 LatitudeRef, 2 Latitude, 3 LongitudeRef, 4 Longitude
+    if not all(k in gps for k in (1, 2, 3, 4)) or len(gps[2]) < 3 or len(gps[4]) < 3:
+        return None
+    lat = gps[2][0] + gps[2][1] / 60.0 + gps[2][2] / 3600.0
+    lon = gps[4][0] + gps[4][1] / 60.0 + gps[4][2] / 3600.0
+    if gps[1] != "N":
+        lat = -lat
+    if gps[3] != "E":
+        lon = -lon
+    return lat, lon
+
+
+@traced("geo.extract_gps_from_bytes")
+def extract_gps_from_bytes(data: bytes) -> Optional[Tuple[float, float]]:
+    """Like `extract_gps_from_image`, but from an in-memory file buffer.
+
+    JPEG and TIFF are handled by a minimal APP1/IFD parser; other formats fall
+    back to exifread over the same buffer, so the file is never re-read.
+    """
+    try:
+        block = find_exif_block(data)
+        if block is not None:
+            return _gps_from_ifd(_tiff_ifds(block)[1])
+    except (struct.error, IndexError, ValueError):
+        pass
+    try:
+        tags = exifread.process_file(io.BytesIO(data), details=False)
+    except Exception:
+        return None
+    gps_lat = tags.get("GPS GPSLatitude")
+    gps_lat_ref = tags.get("GPS GPSLatitudeRef")
+    gps_lon = tags.get("GPS GPSLongitude")
+    gps_lon_ref = tags.get("GPS GPSLongitudeRef")
+    if gps_lat and gps_lat_ref and gps_lon and gps_lon_ref:
+        lat = _to_degrees(gps_lat)
+        if gps_lat_ref.values != "N":
+            lat = -lat
+        lon = _to_degrees(gps_lon)
+        if gps_lon_ref.values != "E":
+            lon = -lon
+        return lat, lon
+    return None
+
+
+def _parse_offset(text: str) -> Optional[float]:
+    # "+02:00" / "-05:30"
+    if len(text) < 6 or text[0] not in "+-" or text[3] != ":":
+        return None
+    try:
+        hours = int(text[1:3]) + int(text[4:6]) / 60.0
+    except ValueError:
+        return None
+    return hours if text[0] == "+" else -hours
+
+
+def capture_time_from_bytes(data: bytes, utc_offset_h: float = 0.0) -> Optional[float]:
+    """Capture time (Unix seconds, UTC) from EXIF DateTimeOriginal, falling back to DateTime.
+
+    OffsetTimeOriginal is honoured when present; otherwise the camera clock is
+    taken to be `utc_offset_h` hours ahead of UTC.
+    """
+    try:
+        block = find_exif_block(data)
+        if block is None:
+            return None
+        ifd0, exif, _ = read_exif_ifds(block)
+    except (struct.error, IndexError, ValueError):
+        return None
+    text = exif.get(_DATETIME_ORIGINAL) or ifd0.get(_DATETIME)
+    if not isinstance(text, str):
+        return None
+    try:
+        ts = float(calendar.timegm(time.strptime(text[:19], "%Y:%m:%d %H:%M:%S")))
+    except ValueError:
+        return None
+    subsec = exif.get(_SUBSEC_ORIGINAL)
+    if isinstance(subsec, str) and subsec.isdigit():
+        ts += float("0." + subsec)
+    offset = _parse_offset(exif.get(_OFFSET_ORIGINAL) or "")
+    return ts - 3600.0 * (offset if offset is not None else utc_offset_h)
+
 
+def capture_time_from_image(image_path: str, utc_offset_h: float = 0.0) -> Optional[float]:
+    """Like `capture_time_from_bytes`, reading only the head of the file."""
+    try:
+        with open(image_path, "rb") as f:
+            head = f.read(EXIF_HEAD_BYTES)
+    except OSError:
+        return None
+    return capture_time_from_bytes(head, utc_offset_h)
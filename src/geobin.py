@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Geohash length per web-map zoom level (0..20): cells a few dozen pixels across on screen
+_ZOOM_PRECISION = [1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5, 5, 6, 6, 6, 7, 7, 7, 8, 8]
+
+
+def zoom_to_precision(zoom: int) -> int:
+    return _ZOOM_PRECISION[int(np.clip(zoom, 0, len(_ZOOM_PRECISION) - 1))]
+
+
+def geohash_codes(lat: np.ndarray, lon: np.ndarray, precision: int) -> np.ndarray:
+    """Integer geohash of every point (the 5 * precision interleaved bits, longitude first)."""
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    lat_i = np.clip(((np.asarray(lat, dtype=np.float64) + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64),
+                    0, (1 << lat_bits) - 1)
+    lon_i = np.clip(((np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64),
+                    0, (1 << lon_bits) - 1)
+    codes = np.zeros(lat_i.shape, dtype=np.int64)
+    lat_pos, lon_pos = lat_bits, lon_bits
+    for k in range(bits):
+        if k % 2 == 0:
+            lon_pos -= 1
+            codes = (codes << 1) | ((lon_i >> lon_pos) & 1)
+        else:
+            lat_pos -= 1
+            codes = (codes << 1) | ((lat_i >> lat_pos) & 1)
+    return codes
+
+
+def geohash_strings(codes: Sequence[int], precision: int) -> List[str]:
+    out = []
+    for code in codes:
+        code = int(code)
+        out.append("".join(_BASE32[(code >> (5 * (precision - 1 - i))) & 31] for i in range(precision)))
+    return out
+
+
+def bin_points(lat: np.ndarray, lon: np.ndarray, detections: np.ndarray, conf_sum: np.ndarray,
+               precision: int) -> Dict[str, np.ndarray]:
+    """Aggregate points into geohash cells.
+
+    Returns per-cell arrays: code, reports (points), detections, conf_sum and
+    the detection-weighted centroid (lat, lon), which sits on the data rather
+    than on the cell centre.
+    """
+    codes = geohash_codes(lat, lon, precision)
+    cells, inverse = np.unique(codes, return_inverse=True)
+    n = len(cells)
+    w = np.maximum(np.asarray(detections, dtype=np.float64), 1.0)
+    w_sum = np.bincount(inverse, weights=w, minlength=n)
+    return {
+        "code": cells,
+        "reports": np.bincount(inverse, minlength=n),
+        "detections": np.bincount(inverse, weights=detections, minlength=n).astype(np.int64),
+        "conf_sum": np.bincount(inverse, weights=conf_sum, minlength=n),
+        "lat": np.bincount(inverse, weights=w * lat, minlength=n) / w_sum,
+        "lon": np.bincount(inverse, weights=w * lon, minlength=n) / w_sum,
+    }
+
+
+def in_bounds(lat: np.ndarray, lon: np.ndarray, bounds: Sequence[float]) -> np.ndarray:
+    """Mask of points inside (south, west, north, east); handles views crossing the antimeridian."""
+    south, west, north, east = bounds
+    lat_ok = (lat >= south) & (lat <= north)
+    if west <= east:
+        return lat_ok & (lon >= west) & (lon <= east)
+    return lat_ok & ((lon >= west) | (lon <= east))
+
+
+class GeoBinner:
+    """Geohash aggregates of one point set, computed on first use per precision and then reused.
+
+    Zoom levels that map to the same geohash length share one aggregation.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, detections: np.ndarray, conf_sum: np.ndarray) -> None:
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.detections = np.asarray(detections, dtype=np.int64)
+        self.conf_sum = np.asarray(conf_sum, dtype=np.float64)
+        self._bins: Dict[int, Dict[str, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def bins(self, zoom: int) -> Dict[str, np.ndarray]:
+        precision = zoom_to_precision(zoom)
+        out = self._bins.get(precision)
+        if out is None:
+            out = bin_points(self.lat, self.lon, self.detections, self.conf_sum, precision)
+            self._bins[precision] = out
+        return out
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import io
+import os
+import re
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import yaml
+from PIL import Image
+
+try:
+    from .geo import find_exif_block, find_xmp_packet, read_exif_ifds
+    from .boxes import boxes_to_arrays
+    from .detections import Detections
+except Exception:
+    from geo import find_exif_block, find_xmp_packet, read_exif_ifds
+    from boxes import boxes_to_arrays
+    from detections import Detections
+
+
+EARTH_RADIUS_M = 6378137.0
+# Diagonal of a 36 x 24 mm frame, the reference for FocalLengthIn35mmFilm
+_FILM_DIAGONAL_MM = 43.27
+
+# EXIF tags (IFD0 / Exif IFD / GPS IFD)
+_ORIENTATION = 0x0112
+_FOCAL_LENGTH = 0x920A
+_FOCAL_LENGTH_35MM = 0xA405
+_FOCAL_PLANE_X_RES = 0xA20E
+_FOCAL_PLANE_UNIT = 0xA210
+_PIXEL_X = 0xA002
+_GPS_ALT_REF, _GPS_ALT = 5, 6
+_GPS_DIR_REF, _GPS_DIR = 16, 17
+# FocalPlaneResolutionUnit -> millimetres per unit
+_UNIT_MM = {2: 25.4, 3: 10.0, 4: 1.0, 5: 0.001}
+
+# DJI-style XMP attributes (drone-dji:RelativeAltitude="+40.10")
+_XMP_FIELDS = {
+    b"RelativeAltitude": "altitude_m",
+    b"GimbalYawDegree": "heading_deg",
+    b"GimbalPitchDegree": "pitch_deg",
+}
+_XMP_RE = re.compile(rb"drone-dji:(\w+)\s*=\s*\"([-+0-9.eE]+)\"|<drone-dji:(\w+)>([-+0-9.eE]+)<")
+
+# Sidecar keys that may override or complete the EXIF values
+_SIDECAR_KEYS = ("lat", "lon", "altitude_m", "ground_elevation_m", "heading_deg", "pitch_deg",
+                 "focal_px", "focal_length_mm", "sensor_width_mm")
+
+
+@dataclass
+class CameraPose:
+    """Where the camera was and how it was pointed when a frame was taken.
+
+    `altitude_m` is the height above the ground (or water) plane, headings are
+    clockwise from true north and `pitch_deg` is -90 for a nadir shot.
+    `width`/`height` are the stored pixel dimensions and `orientation` the EXIF
+    orientation that turns them into the displayed (detected-on) image.
+    """
+
+    lat: float
+    lon: float
+    altitude_m: float
+    heading_deg: float
+    pitch_deg: float
+    focal_px: float
+    width: int
+    height: int
+    orientation: int = 1
+
+
+def _first(values: Any) -> Optional[float]:
+    if isinstance(values, list):
+        return float(values[0]) if values else None
+    return None
+
+
+def read_camera_tags(data: bytes) -> Dict[str, Any]:
+    """Camera metadata from an in-memory file: EXIF altitude, direction and focal length, DJI XMP, pixel size.
+
+    Only the metadata segments and the image header are parsed. Keys are
+    present only when the file provides them.
+    """
+    tags: Dict[str, Any] = {}
+    try:
+        block = find_exif_block(data)
+        if block is not None:
+            ifd0, exif, gps = read_exif_ifds(block)
+            if _first(ifd0.get(_ORIENTATION)):
+                tags["orientation"] = int(ifd0[_ORIENTATION][0])
+            if _first(gps.get(_GPS_ALT)) is not None:
+                below = _first(gps.get(_GPS_ALT_REF)) == 1
+                tags["gps_altitude_m"] = -gps[_GPS_ALT][0] if below else gps[_GPS_ALT][0]
+            if _first(gps.get(_GPS_DIR)) is not None:
+                tags["heading_deg"] = gps[_GPS_DIR][0]
+                tags["heading_ref"] = gps.get(_GPS_DIR_REF, "T") or "T"
+            if _first(exif.get(_FOCAL_LENGTH)):
+                tags["focal_length_mm"] = exif[_FOCAL_LENGTH][0]
+            if _first(exif.get(_FOCAL_LENGTH_35MM)):
+                tags["focal_35mm"] = float(exif[_FOCAL_LENGTH_35MM][0])
+            unit_mm = _UNIT_MM.get(int(_first(exif.get(_FOCAL_PLANE_UNIT)) or 2))
+            if _first(exif.get(_FOCAL_PLANE_X_RES)) and unit_mm:
+                tags["focal_plane_px_per_mm"] = exif[_FOCAL_PLANE_X_RES][0] / unit_mm
+                if _first(exif.get(_PIXEL_X)):
+                    tags["focal_plane_width"] = int(exif[_PIXEL_X][0])
+    except (struct.error, IndexError, ValueError):
+        pass
+    xmp = find_xmp_packet(data)
+    if xmp:
+        for m in _XMP_RE.finditer(xmp):
+            name, value = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+            key = _XMP_FIELDS.get(name)
+            if key is not None:
+                # Gimbal yaw is true heading, so it wins over a magnetic GPSImgDirection
+                tags[key] = float(value)
+                if key == "heading_deg":
+                    tags["heading_ref"] = "T"
+    try:
+        tags["width"], tags["height"] = Image.open(io.BytesIO(data)).size  # header only
+    except Exception:
+        pass
+    return tags
+
+
+_sidecars: Dict[str, Tuple[float, dict]] = {}
+_sidecar_lock = threading.Lock()
+
+
+def load_sidecar(directory: str, name: str) -> dict:
+    """Per-flight camera file (YAML) next to the images, re-read when it changes; {} if absent.
+
+    Top-level keys apply to every image of the flight, `images: {file name: {...}}`
+    to single frames. Keys: lat, lon, altitude_m (above ground), ground_elevation_m,
+    heading_deg, pitch_deg, focal_px, or focal_length_mm with sensor_width_mm.
+    """
+    path = os.path.join(directory, name)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _sidecar_lock:
+        hit = _sidecars.get(path)
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+    with open(path, "r", encoding="utf-8") as f:
+        sidecar = yaml.safe_load(f) or {}
+    with _sidecar_lock:
+        _sidecars[path] = (mtime, sidecar)
+    return sidecar
+
+
+def _focal_px(values: Dict[str, Any], width: int, height: int) -> Optional[float]:
+    if values.get("focal_px"):
+        return float(values["focal_px"])
+    focal_mm = values.get("focal_length_mm")
+    if focal_mm and values.get("sensor_width_mm"):
+        return float(focal_mm) / float(values["sensor_width_mm"]) * width
+    if focal_mm and values.get("focal_plane_px_per_mm"):
+        # Focal plane resolution refers to the full sensor readout; scale to this file's width
+        scale = width / float(values.get("focal_plane_width") or width)
+        return float(focal_mm) * float(values["focal_plane_px_per_mm"]) * scale
+    if values.get("focal_35mm"):
+        return float(values["focal_35mm"]) * float(np.hypot(width, height)) / _FILM_DIAGONAL_MM
+    return None
+
+
+def camera_pose(tags: Dict[str, Any], gps: Optional[Tuple[float, float]], image_path: str,
+                georef_cfg: dict) -> Optional[CameraPose]:
+    """Combine EXIF/XMP tags, the flight sidecar and config defaults into a pose.
+
+    Precedence: per-image sidecar entry, then the file's own metadata, then
+    the flight-level sidecar values, then `georef` config defaults. Returns
+    None when position, height above ground, heading or focal length cannot
+    be determined.
+    """
+    sidecar = load_sidecar(os.path.dirname(image_path) or ".", str(georef_cfg.get("sidecar", "flight.yaml")))
+    flight = {k: sidecar[k] for k in _SIDECAR_KEYS if sidecar.get(k) is not None}
+    frame = (sidecar.get("images") or {}).get(os.path.basename(image_path)) or {}
+    values: Dict[str, Any] = {"pitch_deg": georef_cfg.get("default_pitch_deg", -90.0),
+                              "ground_elevation_m": georef_cfg.get("ground_elevation_m")}
+    values.update(flight)
+    values.update({k: v for k, v in tags.items() if v is not None})
+    values.update({k: frame[k] for k in _SIDECAR_KEYS if frame.get(k) is not None})
+    if frame.get("heading_deg") is not None:
+        values["heading_ref"] = "T"
+
+    if values.get("lat") is None or values.get("lon") is None:
+        if gps is None:
+            return None
+        values["lat"], values["lon"] = gps
+    if values.get("altitude_m") is None:
+        # GPSAltitude is above sea level; it needs the ground elevation to become a height above ground
+        if values.get("gps_altitude_m") is None or values.get("ground_elevation_m") is None:
+            return None
+        values["altitude_m"] = float(values["gps_altitude_m"]) - float(values["ground_elevation_m"])
+    if values.get("heading_deg") is None or float(values["altitude_m"]) <= 0:
+        return None
+    heading = float(values["heading_deg"])
+    if values.get("heading_ref") == "M":
+        heading += float(georef_cfg.get("magnetic_declination_deg", 0.0))
+    width, height = int(values.get("width") or 0), int(values.get("height") or 0)
+    if width <= 0 or height <= 0:
+        return None
+    focal = _focal_px(values, width, height)
+    if not focal:
+        return None
+    return CameraPose(
+        lat=float(values["lat"]),
+        lon=float(values["lon"]),
+        altitude_m=float(values["altitude_m"]),
+        heading_deg=heading,
+        pitch_deg=float(values["pitch_deg"]),
+        focal_px=focal,
+        width=width,
+        height=height,
+        orientation=int(values.get("orientation") or 1),
+    )
+
+
+def project_pixels(u: np.ndarray, v: np.ndarray, lat: np.ndarray, lon: np.ndarray, altitude_m: np.ndarray,
+                   heading_deg: np.ndarray, pitch_deg: np.ndarray, focal_px: np.ndarray, width: np.ndarray,
+                   height: np.ndarray, orientation: np.ndarray, max_range_m: float = 2000.0) -> np.ndarray:
+    """Intersect the viewing rays of pixels (u, v) with a flat ground plane.
+
+    All arguments are broadcast per pixel, so pixels from many frames are
+    projected in one pass. Pinhole camera at the principal point, no roll.
+    Returns (N, 2) lat/lon; NaN where the ray misses the ground (at or above
+    the horizon) or lands beyond `max_range_m`.
+    """
+    u, v = np.asarray(u, dtype=np.float64), np.asarray(v, dtype=np.float64)
+    w, h = np.asarray(width, dtype=np.float64), np.asarray(height, dtype=np.float64)
+    # Detections are in the displayed (EXIF-rotated) image; undo the rotation to get sensor pixels
+    x = np.select([orientation == 3, orientation == 6, orientation == 8], [w - u, v, w - v], u)
+    y = np.select([orientation == 3, orientation == 6, orientation == 8], [h - v, h - u, u], v)
+    xc = (x - w / 2.0) / focal_px
+    yc = (y - h / 2.0) / focal_px
+
+    psi, theta = np.radians(heading_deg), np.radians(pitch_deg)
+    sin_p, cos_p, sin_t, cos_t = np.sin(psi), np.cos(psi), np.sin(theta), np.cos(theta)
+    # Ray = forward + xc * right + yc * down, in east/north/up
+    ray_e = cos_t * sin_p + xc * cos_p + yc * sin_p * sin_t
+    ray_n = cos_t * cos_p - xc * sin_p + yc * cos_p * sin_t
+    ray_u = sin_t - yc * cos_t
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(ray_u < -1e-6, altitude_m / -ray_u, np.nan)
+        east, north = t * ray_e, t * ray_n
+        east[np.hypot(east, north) > max_range_m] = np.nan
+        out = np.empty((len(u), 2), dtype=np.float64)
+        out[:, 0] = lat + np.degrees(north / EARTH_RADIUS_M)
+        out[:, 1] = lon + np.degrees(east / (EARTH_RADIUS_M * np.cos(np.radians(lat))))
+    out[np.isnan(east)] = np.nan
+    return out
+
+
+def georeference(poses: Sequence[Optional[CameraPose]], boxes: Sequence[Union[Detections, List[dict]]],
+                 max_range_m: float = 2000.0) -> List[np.ndarray]:
+    """Ground lat/lon of every box center, per image: (N_i, 2) arrays, NaN rows where unknown.
+
+    Centers of all images are concatenated and projected in a single
+    vectorized call, with each image's pose repeated over its boxes.
+    """
+    xyxy = [b.xyxy if isinstance(b, Detections) else boxes_to_arrays(b)[0] for b in boxes]
+    counts = np.array([len(a) if p is not None else 0 for a, p in zip(xyxy, poses)], dtype=np.int64)
+    out = [np.full((len(a), 2), np.nan) for a in xyxy]
+    if counts.sum() == 0:
+        return out
+    used = [i for i, n in enumerate(counts) if n]
+    centers = np.concatenate([xyxy[i] for i in used]).astype(np.float64)
+    per_box = np.repeat(np.array([[p.lat, p.lon, p.altitude_m, p.heading_deg, p.pitch_deg, p.focal_px,
+                                   p.width, p.height, p.orientation]
+                                  for p in (poses[i] for i in used)], dtype=np.float64), counts[used], axis=0)
+    ground = project_pixels(
+        (centers[:, 0] + centers[:, 2]) / 2.0,
+        (centers[:, 1] + centers[:, 3]) / 2.0,
+        *per_box[:, :8].T,
+        orientation=per_box[:, 8].astype(np.int64),
+        max_range_m=max_range_m,
+    )
+    for i, part in zip(used, np.split(ground, np.cumsum(counts[used])[:-1])):
+        out[i] = part
+    return out
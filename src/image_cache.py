@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    from .utils import SUPPORTED_IMG_EXTS
+except Exception:
+    from utils import SUPPORTED_IMG_EXTS
+
+
+IMAGES_FILE = "images.npy"
+META_FILE = "meta.json"
+PAD_VALUE = 114  # ultralytics letterbox grey
+# Bump when the stored pixels change, so older caches are rebuilt
+CACHE_VERSION = 2
+
+
+def cache_dir_for(images_dir: str, imgsz: int) -> str:
+    """Cache location for a split's images/ folder, e.g. data/splits/train/cache_640."""
+    return os.path.join(os.path.dirname(os.path.abspath(images_dir)), f"cache_{imgsz}")
+
+
+def source_manifest(images_dir: str) -> Tuple[List[str], str]:
+    """Sorted image paths in `images_dir` and a digest of their names, sizes and mtimes."""
+    h = hashlib.blake2b(digest_size=16)
+    files: List[str] = []
+    with os.scandir(images_dir) as it:
+        entries = sorted((e for e in it if os.path.splitext(e.name)[1].lower() in SUPPORTED_IMG_EXTS),
+                         key=lambda e: e.name)
+    for entry in entries:
+        st = entry.stat()  # follows hard/symlinks to the source file
+        h.update(f"{entry.name}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+        files.append(os.path.abspath(entry.path))
+    return files, h.hexdigest()
+
+
+def resize_long_side(img: np.ndarray, imgsz: int) -> np.ndarray:
+    """Resize so the long side equals `imgsz`, exactly as ultralytics' `load_image` does in rect mode."""
+    h0, w0 = img.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r == 1:
+        return img
+    w, h = min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz)
+    return cv2.resize(img, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def build_image_cache(images_dir: str, imgsz: int, workers: int = 8, force: bool = False) -> str:
+    """Write every image of a split, resized to `imgsz`, into one memory-mapped uint8 array.
+
+    Each image occupies an (imgsz, imgsz, 3) slot, top-left aligned and padded
+    with letterbox grey; its original and resized shapes are kept in the meta
+    file. The cache is rebuilt only when `imgsz` or the source manifest
+    (file names, sizes, mtimes) changes.
+    """
+    cache_dir = cache_dir_for(images_dir, imgsz)
+    files, digest = source_manifest(images_dir)
+    if not force and open_image_cache(images_dir, imgsz, digest=digest) is not None:
+        return cache_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, META_FILE)
+    if os.path.isfile(meta_path):
+        os.remove(meta_path)  # marks the cache invalid until the rebuild completes
+    arr = np.lib.format.open_memmap(
+        os.path.join(cache_dir, IMAGES_FILE), mode="w+", dtype=np.uint8, shape=(len(files), imgsz, imgsz, 3)
+    )
+    shapes = np.zeros((len(files), 4), dtype=np.int64)  # h0, w0, h, w
+
+    def _fill(i: int) -> None:
+        img = cv2.imread(files[i], cv2.IMREAD_COLOR)
+        if img is None:
+            return
+        small = resize_long_side(img, imgsz)
+        h, w = small.shape[:2]
+        arr[i].fill(PAD_VALUE)
+        arr[i, :h, :w] = small
+        shapes[i] = (img.shape[0], img.shape[1], h, w)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(_fill, range(len(files))))
+    arr.flush()
+    del arr
+
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "imgsz": imgsz, "source_digest": digest, "files": files, "shapes": shapes.tolist()}, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    return cache_dir
+
+
+class ImageCache:
+    """Read side of a split cache. The memmap is opened lazily so instances pickle cheaply into dataloader workers."""
+
+    def __init__(self, cache_dir: str, meta: dict) -> None:
+        self.cache_dir = cache_dir
+        self.imgsz = int(meta["imgsz"])
+        self.rows: Dict[str, int] = {os.path.normcase(p): i for i, p in enumerate(meta["files"])}
+        self.shapes = np.asarray(meta["shapes"], dtype=np.int64).reshape(-1, 4)
+        self._arr: Optional[np.ndarray] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_arr"] = None
+        return state
+
+    def get(self, path: str) -> Optional[Tuple[np.ndarray, Tuple[int, int], Tuple[int, int]]]:
+        """(resized BGR image, (h0, w0), (h, w)) for `path`, or None if it is not cached."""
+        i = self.rows.get(os.path.normcase(os.path.abspath(path)))
+        if i is None or self.shapes[i, 0] == 0:
+            return None
+        if self._arr is None:
+            self._arr = np.load(os.path.join(self.cache_dir, IMAGES_FILE), mmap_mode="r")
+        h0, w0, h, w = (int(v) for v in self.shapes[i])
+        # Copy out of the memmap: augmentations modify images in place
+        return np.array(self._arr[i, :h, :w]), (h0, w0), (h, w)
+
+
+def open_image_cache(images_dir: str, imgsz: int, digest: Optional[str] = None) -> Optional[ImageCache]:
+    """The cache for `images_dir` if it exists and matches `imgsz` and the current source files."""
+    cache_dir = cache_dir_for(images_dir, imgsz)
+    meta_path = os.path.join(cache_dir, META_FILE)
+    if not os.path.isfile(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if digest is None:
+        _, digest = source_manifest(images_dir)
+    if meta.get("version") != CACHE_VERSION or int(meta.get("imgsz", -1)) != imgsz \
+            or meta.get("source_digest") != digest:
+        return None
+    return ImageCache(cache_dir, meta)
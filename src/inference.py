@@ -1,64 +1,405 @@
 from __future__ import annotations
 
 import os
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
 from PIL import Image
 from ultralytics import YOLO
 
 try:
     from .utils import load_config  # when imported as part of package `src`
-    from .geo import extract_gps_from_image
+    from .geo import capture_time_from_bytes, extract_gps_from_image
+    from .registry import LoadedModel, get_registry, predict_device
+    from .detections import Detections
+    from .tiling import predict_tiled
+    from .frames import Frame, is_video, iter_frames, prefetch
+    from .export import backend_weights_path
+    from .cache import cache_key, content_hash, get_detection_cache, weights_hash
+    from .store import get_detection_store
+    from .ingest import Ingested, decode_image, pipelined_map, read_image_file
+    from .georef import camera_pose, georeference, read_camera_tags
+    from .tracklog import TrackIndex, get_track_index, track_positions, video_start_time
+    from .prefilter import plausible_frames
+    from .tracing import span, traced
 except Exception:
     from utils import load_config  # fallback for direct script execution
-    from geo import extract_gps_from_image
+    from geo import capture_time_from_bytes, extract_gps_from_image
+    from registry import LoadedModel, get_registry, predict_device
+    from detections import Detections
+    from tiling import predict_tiled
+    from frames import Frame, is_video, iter_frames, prefetch
+    from export import backend_weights_path
+    from cache import cache_key, content_hash, get_detection_cache, weights_hash
+    from store import get_detection_store
+    from ingest import Ingested, decode_image, pipelined_map, read_image_file
+    from georef import camera_pose, georeference, read_camera_tags
+    from tracklog import TrackIndex, get_track_index, track_positions, video_start_time
+    from prefilter import plausible_frames
+    from tracing import span, traced
 
 
-def load_best_model(cfg: dict) -> YOLO:
+def resolve_best_model_path(cfg: dict) -> str:
     best_model_path_file = os.path.join(cfg["paths"]["models_dir"], "best_model.path")
     if os.path.isfile(best_model_path_file):
         with open(best_model_path_file, "r", encoding="utf-8") as f:
-            best_model_path = f.read().strip()
-    else:
-        # Fallback to configured model (for zero-shot usage)
-        best_model_path = cfg["training"]["model"]
-    return YOLO(best_model_path)
+            return f.read().strip()
+    # Fallback to configured model (for zero-shot usage)
+    return cfg["training"]["model"]
 
 
-def predict_on_images(image_paths: List[str], conf: Optional[float] = None):
-    cfg = load_config("configs/config.yaml")
-    model = load_best_model(cfg)
-    conf_thr = conf if conf is not None else float(cfg["inference"]["conf"])  # type: ignore
-    iou_thr = float(cfg["inference"]["iou"])  # type: ignore
-    results = model.predict(
-        image_paths,
+def inference_device(cfg: dict) -> str:
+    return str(cfg["inference"].get("device", cfg["training"].get("device", "auto")))
+
+
+def resolve_backend_path(cfg: dict) -> str:
+    """Weights for the runtime selected by `inference.backend` (torch, onnx, onnx-int8, openvino, openvino-int8)."""
+    weights = resolve_best_model_path(cfg)
+    backend = str(cfg["inference"].get("backend", "torch"))
+    path = backend_weights_path(weights, backend)
+    if backend != "torch" and not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found for backend '{backend}'. Run src/export.py first.")
+    return path
+
+
+def load_model_entry(cfg: dict) -> LoadedModel:
+    """Fetch the current best model from the process-wide registry.
+
+    `best_model.path` is re-read on every call, so a retrain is picked up
+    without restarting the process; the weights themselves are only
+    deserialized once per (path, mtime, device).
+    """
+    return get_registry().get(
+        resolve_backend_path(cfg),
+        device=inference_device(cfg),
         imgsz=int(cfg["training"]["imgsz"]),
-        conf=conf_thr,
-        iou=iou_thr,
-        verbose=False,
+        warmup=bool(cfg["inference"].get("warmup", True)),
     )
 
-    outputs = []
-    for img_path, res in zip(image_paths, results):
-        # Extract GPS if present
-        gps = extract_gps_from_image(img_path)
-        boxes = []
-        names = res.names if hasattr(res, "names") else {}
-        for b in res.boxes:  # type: ignore[attr-defined]
-            cls_id = int(b.cls[0].item())
-            boxes.append({
-                "xyxy": b.xyxy[0].tolist(),  # [x1,y1,x2,y2]
-                "conf": float(b.conf[0].item()),
-                "cls": cls_id,
-                "label": names.get(cls_id, str(cls_id)),
-            })
-        outputs.append({
-            "image_path": img_path,
-            "gps": gps,  # (lat, lon) or None
-            "boxes": boxes,
-        })
+
+@traced("inference.load_best_model")
+def load_best_model(cfg: dict) -> YOLO:
+    """The shared YOLO instance; concurrent callers should predict through `load_model_entry` instead."""
+    return load_model_entry(cfg).model
+
+
+def model_identity(cfg: dict) -> Tuple[str, str]:
+    """(weights hash, model version) of the configured backend, as keyed in the cache and store."""
+    backend_path = resolve_backend_path(cfg)
+    model_hash = weights_hash(backend_path)
+    return model_hash, f"{os.path.basename(backend_path)}:{model_hash[:12]}"
+
+
+def predict_on_images(image_paths: List[str], conf: Optional[float] = None, tiled: Optional[bool] = None,
+                      iou: Optional[float] = None, cfg: Optional[dict] = None, columnar: bool = False):
+    """Detect debris in image files; one `{"image_path", "gps", "boxes"}` dict per path, in order.
+
+    With `columnar=True`, "boxes" is a `Detections` holding NumPy arrays that
+    only builds the per-box dicts if it is indexed or iterated.
+
+    When `georef.enabled`, items also carry "box_gps": the ground position of
+    each box center, projected from the camera altitude, heading and focal
+    length (see `georef.py`). Columnar: an (N, 2) lat/lon array with NaN rows
+    where the pose is unknown; otherwise a list of (lat, lon) or None.
+
+    Images without EXIF GPS are placed from the `tracklog` flight logs /
+    tracks at their EXIF capture time, when one covers it. "timestamp" is
+    that capture time (file mtime when the EXIF has none).
+
+    With `inference.prefilter.enabled`, files whose thumbnail looks like
+    open water skip the detector, get empty boxes and are left out of the
+    detection store (not with tiling, where debris is too small to survive
+    the thumbnail).
+    """
+    if cfg is None:
+        cfg = load_config("configs/config.yaml")
+    conf_thr = conf if conf is not None else float(cfg["inference"]["conf"])  # type: ignore
+    iou_thr = iou if iou is not None else float(cfg["inference"]["iou"])  # type: ignore
+    imgsz = int(cfg["training"]["imgsz"])
+    if tiled is None:
+        tiled = bool(cfg["inference"].get("tiling", {}).get("enabled", False))
+    ingest_cfg = cfg["inference"].get("ingest", {})
+    prefilter_cfg = cfg["inference"].get("prefilter", {})
+    prefilter_on = bool(prefilter_cfg.get("enabled", False)) and not tiled
+    georef_cfg = cfg.get("georef", {})
+    georef_on = bool(georef_cfg.get("enabled", False))
+    track_cfg = cfg.get("tracklog", {})
+    tracks = get_track_index(cfg)
+    utc_offset = float(track_cfg.get("camera_utc_offset_h", 0.0))
+
+    cache = get_detection_cache(cfg)
+    store = get_detection_store(cfg)
+    model_hash, model_version = "", ""
+    if cache is not None or store is not None:
+        model_hash, model_version = model_identity(cfg)
+    # Tiled results depend on every tiling setting, so they are all part of the cache key
+    mode = "tiled|" + "|".join(f"{k}={v}" for k, v in sorted(tiling_settings(cfg).items())) if tiled else "full"
+
+    def _ingest(path: str) -> Tuple[Ingested, str, Optional[dict], str]:
+        # Each file is read once: the same buffer feeds the content hash, EXIF GPS and the decoder
+        rec = read_image_file(path)
+        image_hash = content_hash(rec.data) if model_hash else ""
+        key, hit = "", None
+        if cache is not None:
+            key = cache_key(image_hash, model_hash, imgsz, conf_thr, iou_thr, mode)
+            hit = cache.get(key)
+        if hit is None:
+            rec.image = decode_image(rec.data)
+            if prefilter_on and not plausible_frames([rec.image], prefilter_cfg)[0]:
+                rec.prefiltered = True
+                rec.image = None
+        if georef_on:
+            rec.camera = read_camera_tags(rec.data)
+        rec.captured = capture_time_from_bytes(rec.data, utc_offset)
+        rec.data = b""  # release the encoded bytes before the batch reaches the model
+        return rec, key, hit, image_hash
+
+    outputs: List[dict] = []
+    model = None
+    batches = pipelined_map(
+        _ingest,
+        image_paths,
+        workers=int(ingest_cfg.get("workers", 4)),
+        batch_size=int(ingest_cfg.get("batch_size", 16)),
+    )
+    for batch in batches:
+        if tracks is not None:
+            unplaced = [rec for rec, _, _, _ in batch if rec.gps is None]
+            for rec, gps in zip(unplaced, track_positions(tracks, [rec.captured for rec in unplaced], track_cfg)):
+                rec.gps = gps
+        items: List[Optional[dict]] = []
+        for rec, _, hit, _ in batch:
+            if rec.prefiltered:
+                items.append({"image_path": rec.path, "gps": rec.gps, "boxes": Detections.empty()})
+            elif hit is None:
+                items.append(None)
+            else:
+                # Cached results carry the boxes only; GPS comes from this read
+                items.append({"image_path": rec.path, "gps": rec.gps, "boxes": Detections.from_payload(hit)})
+        misses = [i for i, item in enumerate(items) if item is None]
+        if misses:
+            if model is None:
+                model = load_model_entry(cfg)
+            recs = [batch[i][0] for i in misses]
+            if tiled:
+                with span("inference.predict_tiled", batch=len(recs)):
+                    fresh = [predict_tiled_item(model, rec, cfg, conf_thr, iou_thr) for rec in recs]
+            else:
+                with span("inference.predict", batch=len(recs)):
+                    results = model.predict(
+                        [rec.image for rec in recs],
+                        imgsz=imgsz,
+                        conf=conf_thr,
+                        iou=iou_thr,
+                        device=predict_device(inference_device(cfg)),
+                        verbose=False,
+                    )
+                fresh = [{"image_path": rec.path, "gps": rec.gps, "boxes": Detections.from_result(res)}
+                         for rec, res in zip(recs, results)]
+            for i, item in zip(misses, fresh):
+                items[i] = item
+                batch[i][0].image = None
+                if cache is not None:
+                    cache.put(batch[i][1], item["boxes"].to_payload())
+        for (rec, _, _, _), item in zip(batch, items):
+            item["timestamp"] = rec.captured if rec.captured is not None else os.path.getmtime(rec.path)  # type: ignore[index]
+        if georef_on:
+            with span("georef.project", batch=len(batch)):
+                poses = [camera_pose(rec.camera or {}, rec.gps, rec.path, georef_cfg) for rec, _, _, _ in batch]
+                ground = georeference(poses, [item["boxes"] for item in items],  # type: ignore[index]
+                                      max_range_m=float(georef_cfg.get("max_range_m", 2000.0)))
+            for item, box_gps in zip(items, ground):
+                item["box_gps"] = box_gps  # type: ignore[index]
+        if store is not None:
+            for (rec, _, _, image_hash), item in zip(batch, items):
+                if rec.prefiltered:
+                    continue  # the model never saw it, so it is not a clean result for this model_version
+                payload = item["boxes"].to_payload()  # type: ignore[index]
+                if "box_gps" in item:  # type: ignore[operator]
+                    payload["ground"] = [None if np.isnan(p[0]) else p for p in item["box_gps"].tolist()]  # type: ignore[index]
+                store.add(image_hash, model_version, payload, image_path=rec.path, gps=rec.gps,
+                          ts=item["timestamp"])  # type: ignore[index]
+        if not columnar:
+            for item in items:
+                item["boxes"] = item["boxes"].to_dicts()  # type: ignore[index]
+                if "box_gps" in item:  # type: ignore[operator]
+                    item["box_gps"] = [None if np.isnan(p[0]) else (p[0], p[1])  # type: ignore[index]
+                                       for p in item["box_gps"].tolist()]  # type: ignore[index]
+        outputs.extend(items)  # type: ignore[arg-type]
+    if store is not None:
+        store.flush()
     return outputs
 
 
+def tiling_settings(cfg: dict) -> dict:
+    """`predict_tiled` keyword arguments that affect its boxes, from `inference.tiling`."""
+    tiling_cfg = cfg["inference"].get("tiling", {})
+    return {
+        "tile_size": int(tiling_cfg.get("tile_size", 640)),
+        "overlap": float(tiling_cfg.get("overlap", 0.2)),
+        "merge": str(tiling_cfg.get("merge", "nms")),
+        "merge_iou": float(tiling_cfg.get("merge_iou", 0.5)),
+        "match_metric": str(tiling_cfg.get("match_metric", "ios")),
+        "include_full_frame": bool(tiling_cfg.get("include_full_frame", True)),
+        "full_frame_imgsz": int(cfg["training"]["imgsz"]),
+    }
+
+
+def predict_tiled_item(model, rec: Ingested, cfg: dict, conf: float, iou: float) -> dict:
+    """Tiled inference for one large image, returned in the `predict_on_images` item format."""
+    xyxy, scores, classes, names = predict_tiled(
+        model,
+        rec.image if rec.image is not None else rec.path,
+        conf=conf,
+        iou=iou,
+        device=inference_device(cfg),
+        batch_size=int(cfg["inference"].get("tiling", {}).get("batch_size", 16)),
+        **tiling_settings(cfg),
+    )
+    return {
+        "image_path": rec.path,
+        "gps": rec.gps,
+        "boxes": Detections(xyxy, scores, classes, names),
+    }
+
+
+def stream_predictions(
+    source: str,
+    conf: Optional[float] = None,
+    batch_size: Optional[int] = None,
+    frame_stride: int = 1,
+    with_frames: bool = False,
+    columnar: bool = False,
+    start_time: Optional[float] = None,
+    cfg: Optional[dict] = None,
+) -> Iterator[dict]:
+    """Lazily run detection over a video file or a directory of frames.
+
+    Frames are decoded on a background thread into a bounded buffer and sent
+    to the model in fixed-size batches, so memory stays flat regardless of
+    input length. Yields one dict per frame with the `predict_on_images` keys
+    plus `frame_index` and `offset_s`; `with_frames` adds the BGR `frame` and
+    `columnar` yields `Detections` boxes as in `predict_on_images`.
+
+    "timestamp" is absolute capture time (Unix seconds) as in
+    `predict_on_images`: EXIF capture time (else file mtime) for image
+    frames, `start_time` (default: the MP4 creation time) plus the frame's
+    offset for video frames, None when a video has no start time. "offset_s"
+    is the position in the video (None for image frames). Frames without
+    EXIF GPS are placed from the `tracklog` logs at that timestamp, and with
+    `georef.enabled` items carry "box_gps" as in `predict_on_images` (video
+    frames take their pose from the flight sidecar and `georef` defaults).
+    """
+    if cfg is None:
+        cfg = load_config("configs/config.yaml")
+    stream_cfg = cfg["inference"].get("streaming", {})
+    batch_size = int(batch_size or stream_cfg.get("batch_size", 16))
+    if start_time is None and is_video(source):
+        start_time = video_start_time(source)
+    frames = prefetch(iter_frames(source, stride=frame_stride), depth=int(stream_cfg.get("prefetch", 2 * batch_size)))
+    tracks = get_track_index(cfg)  # once per stream, not per batch
+    batch: List[Frame] = []
+    try:
+        for frame in frames:
+            batch.append(frame)
+            if len(batch) == batch_size:
+                yield from _predict_frames(cfg, batch, conf, with_frames, columnar, start_time, tracks)
+                batch = []
+        if batch:
+            yield from _predict_frames(cfg, batch, conf, with_frames, columnar, start_time, tracks)
+    finally:
+        frames.close()  # stop the decoder thread if the caller stops early
+
+
+def _frame_meta(frame: Frame, start_time: Optional[float], utc_offset: float,
+                georef_on: bool) -> Tuple[Optional[Tuple[float, float]], Optional[float], dict]:
+    """(EXIF GPS, absolute timestamp, camera tags) of one streamed frame.
+
+    Image files are read once and parsed from the buffer; video frames have
+    no EXIF, so their camera tags are just the frame size (the rest of the
+    pose comes from the flight sidecar and `georef` defaults).
+    """
+    if frame.path:
+        rec = read_image_file(frame.path)
+        captured = capture_time_from_bytes(rec.data, utc_offset)
+        camera = read_camera_tags(rec.data) if georef_on else {}
+        return rec.gps, captured if captured is not None else frame.timestamp, camera
+    height, width = frame.image.shape[:2]
+    ts = None if start_time is None or frame.timestamp is None else start_time + frame.timestamp
+    return None, ts, {"width": width, "height": height}
+
+
+def _predict_frames(cfg: dict, batch: List[Frame], conf: Optional[float], with_frames: bool,
+                    columnar: bool = False, start_time: Optional[float] = None,
+                    tracks: Optional[TrackIndex] = None) -> Iterator[dict]:
+    # Resolved per batch so a retrain mid-stream is picked up by the registry
+    model = load_model_entry(cfg)
+    prefilter_cfg = cfg["inference"].get("prefilter", {})
+    run = list(batch)
+    if prefilter_cfg.get("enabled", False):
+        run = [f for f, ok in zip(batch, plausible_frames([f.image for f in batch], prefilter_cfg)) if ok]
+    predicted = []
+    if run:
+        with span("inference.predict", batch=len(run)):
+            predicted = model.predict(
+                [f.image for f in run],
+                imgsz=int(cfg["training"]["imgsz"]),
+                conf=conf if conf is not None else float(cfg["inference"]["conf"]),
+                iou=float(cfg["inference"]["iou"]),
+                device=predict_device(inference_device(cfg)),
+                verbose=False,
+            )
+    # Frames the prefilter skipped get no result and therefore empty boxes
+    by_frame = {id(f): res for f, res in zip(run, predicted)}
+    results = [by_frame.get(id(f)) for f in batch]
+    track_cfg = cfg.get("tracklog", {})
+    georef_cfg = cfg.get("georef", {})
+    georef_on = bool(georef_cfg.get("enabled", False))
+    meta = [_frame_meta(f, start_time, float(track_cfg.get("camera_utc_offset_h", 0.0)), georef_on) for f in batch]
+    gps = [m[0] for m in meta]
+    times = [m[1] for m in meta]
+    if tracks is not None and any(g is None for g in gps):
+        unplaced = [i for i, g in enumerate(gps) if g is None]
+        for i, g in zip(unplaced, track_positions(tracks, [times[i] for i in unplaced], track_cfg)):
+            gps[i] = g
+    dets = [Detections.from_result(res) if res is not None else Detections.empty() for res in results]
+    ground: List[Optional[np.ndarray]] = [None] * len(batch)
+    if georef_on:
+        with span("georef.project", batch=len(batch)):
+            poses = [camera_pose(m[2], g, f.path or f.source, georef_cfg) for f, m, g in zip(batch, meta, gps)]
+            ground = georeference(poses, dets, max_range_m=float(georef_cfg.get("max_range_m", 2000.0)))  # type: ignore[assignment]
+    for frame, frame_dets, frame_gps, frame_time, box_gps in zip(batch, dets, gps, times, ground):
+        item = {
+            "image_path": frame.source,
+            "frame_index": frame.index,
+            "timestamp": frame_time,
+            "offset_s": None if frame.path else frame.timestamp,
+            "gps": frame_gps,
+            "boxes": frame_dets if columnar else frame_dets.to_dicts(),
+        }
+        if box_gps is not None:
+            item["box_gps"] = box_gps if columnar else [None if np.isnan(p[0]) else (p[0], p[1])
+                                                        for p in box_gps.tolist()]
+        if with_frames:
+            item["frame"] = frame.image
+        yield item
+
+
+def result_to_item(img_path: str, res) -> dict:
+    """Convert one ultralytics result into the `{"image_path", "gps", "boxes"}` dict."""
+    # Extract GPS if present
+    gps = extract_gps_from_image(img_path)
+    return {
+        "image_path": img_path,
+        "gps": gps,  # (lat, lon) or None
+        "boxes": result_boxes(res),
+    }
+
+
+def result_boxes(res) -> List[dict]:
+    # One device->host transfer for all boxes instead of per-box .item()/.tolist() calls
+    return Detections.from_result(res).to_dicts()
+
+
 if __name__ == "__main__":
     # Example
     test_images = [
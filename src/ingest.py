@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import cv2
+import numpy as np
+
+try:
+    from .geo import extract_gps_from_bytes
+except Exception:
+    from geo import extract_gps_from_bytes
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class Ingested:
+    path: str
+    data: bytes  # raw file contents, read exactly once
+    gps: Optional[Tuple[float, float]]
+    image: Optional[np.ndarray] = None  # BGR pixels, decoded only when the model needs them
+    camera: Optional[dict] = None  # georef.read_camera_tags, parsed from `data` when georeferencing
+    captured: Optional[float] = None  # EXIF capture time (Unix seconds, UTC)
+    prefiltered: bool = False  # the thumbnail prefilter found nothing worth a detector pass
+
+
+def read_image_file(path: str) -> Ingested:
+    """Read a file once and parse its EXIF GPS from the in-memory buffer."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return Ingested(path=path, data=data, gps=extract_gps_from_bytes(data))
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """Decode an encoded image buffer to BGR, matching what ultralytics does for file paths."""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image buffer")
+    return img
+
+
+def pipelined_map(fn: Callable[[T], R], items: Sequence[T], workers: int, batch_size: int) -> Iterator[List[R]]:
+    """Apply `fn` on a thread pool and yield results in input-ordered batches.
+
+    The next batch is submitted before the current one is yielded, so I/O and
+    decoding (both release the GIL) overlap with whatever the caller does with
+    the current batch, typically `model.predict`. At most two batches are in
+    memory at once.
+    """
+    batch_size = max(1, int(batch_size))
+    chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    if not chunks:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="ingest") as pool:
+        pending: List[Future] = [pool.submit(fn, x) for x in chunks[0]]
+        for i in range(len(chunks)):
+            current = pending
+            pending = [pool.submit(fn, x) for x in chunks[i + 1]] if i + 1 < len(chunks) else []
+            yield [f.result() for f in current]
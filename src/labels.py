@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+LABELS_FILE = "labels.npy"
+OFFSETS_FILE = "offsets.npy"
+FILES_FILE = "files.json"
+
+
+def parse_label_file(path: str, num_classes: int) -> Tuple[np.ndarray, List[str]]:
+    """Parse one YOLO label file into an (N, 5) float32 array of [cls, cx, cy, w, h].
+
+    Returns the array and a list of human-readable problems; rows with
+    problems are dropped from the array.
+    """
+    errors: List[str] = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except (OSError, UnicodeDecodeError) as e:
+        return np.zeros((0, 5), dtype=np.float32), [f"unreadable: {e}"]
+
+    rows: List[List[float]] = []
+    for lineno, line in enumerate(lines, start=1):
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) != 5:
+            errors.append(f"line {lineno}: expected 5 values, got {len(parts)}")
+            continue
+        try:
+            values = [float(v) for v in parts]
+        except ValueError:
+            errors.append(f"line {lineno}: non-numeric value")
+            continue
+        cls, cx, cy, w, h = values
+        if not cls.is_integer() or not 0 <= cls < num_classes:
+            errors.append(f"line {lineno}: class id {parts[0]} outside [0, {num_classes})")
+            continue
+        if not all(0.0 <= v <= 1.0 for v in (cx, cy, w, h)):
+            errors.append(f"line {lineno}: coordinates outside [0, 1]")
+            continue
+        if w <= 0.0 or h <= 0.0:
+            errors.append(f"line {lineno}: zero-size box")
+            continue
+        if cx - w / 2 < -1e-6 or cx + w / 2 > 1 + 1e-6 or cy - h / 2 < -1e-6 or cy + h / 2 > 1 + 1e-6:
+            errors.append(f"line {lineno}: box extends outside the image")
+            continue
+        rows.append(values)
+    return np.asarray(rows, dtype=np.float32).reshape(-1, 5), errors
+
+
+def _parse_chunk(args: Tuple[Sequence[str], int]) -> List[Tuple[np.ndarray, List[str]]]:
+    paths, num_classes = args
+    return [parse_label_file(p, num_classes) for p in paths]
+
+
+def validate_labels(label_paths: Sequence[str], num_classes: int, workers: int = 4,
+                    chunk_size: int = 512) -> Tuple[List[np.ndarray], Dict[str, List[str]]]:
+    """Parse all label files in a process pool.
+
+    Returns the per-file arrays (in input order) and {path: problems} for
+    every file that had at least one problem.
+    """
+    chunks = [(label_paths[i:i + chunk_size], num_classes) for i in range(0, len(label_paths), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = [r for chunk in pool.map(_parse_chunk, chunks) for r in chunk]
+    else:
+        parsed = [r for chunk in map(_parse_chunk, chunks) for r in chunk]
+    arrays = [arr for arr, _ in parsed]
+    errors = {path: errs for path, (_, errs) in zip(label_paths, parsed) if errs}
+    return arrays, errors
+
+
+@dataclass
+class LabelCache:
+    boxes: np.ndarray  # (M, 5) [cls, cx, cy, w, h] for all files, memory-mapped
+    offsets: np.ndarray  # (K + 1,) row offsets; file i owns boxes[offsets[i]:offsets[i + 1]]
+    files: List[str]
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def get(self, i: int) -> np.ndarray:
+        return self.boxes[self.offsets[i]:self.offsets[i + 1]]
+
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+
+def write_label_cache(cache_dir: str, label_paths: Sequence[str], arrays: Sequence[np.ndarray]) -> LabelCache:
+    """Write all annotations as one contiguous .npy plus an offsets index."""
+    os.makedirs(cache_dir, exist_ok=True)
+    counts = np.fromiter((len(a) for a in arrays), dtype=np.int64, count=len(arrays))
+    offsets = np.zeros((len(arrays) + 1,), dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    boxes = np.concatenate(arrays, axis=0) if len(arrays) else np.zeros((0, 5), dtype=np.float32)
+    np.save(os.path.join(cache_dir, LABELS_FILE), boxes.astype(np.float32, copy=False))
+    np.save(os.path.join(cache_dir, OFFSETS_FILE), offsets)
+    with open(os.path.join(cache_dir, FILES_FILE), "w", encoding="utf-8") as f:
+        json.dump(list(label_paths), f)
+    return load_label_cache(cache_dir)
+
+
+def load_label_cache(cache_dir: str) -> LabelCache:
+    with open(os.path.join(cache_dir, FILES_FILE), "r", encoding="utf-8") as f:
+        files = json.load(f)
+    return LabelCache(
+        boxes=np.load(os.path.join(cache_dir, LABELS_FILE), mmap_mode="r"),
+        offsets=np.load(os.path.join(cache_dir, OFFSETS_FILE)),
+        files=files,
+    )
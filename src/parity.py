@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import os
+from typing import Tuple
+
+import numpy as np
+from ultralytics import YOLO
+
+try:
+    from .utils import load_config, list_images
+    from .boxes import box_overlap
+    from .export import backend_weights_path
+    from .inference import resolve_best_model_path
+except Exception:
+    from utils import load_config, list_images
+    from boxes import box_overlap
+    from export import backend_weights_path
+    from inference import resolve_best_model_path
+
+
+def match_boxes(ref: np.ndarray, ref_cls: np.ndarray, other: np.ndarray, other_cls: np.ndarray,
+                iou_thr: float) -> Tuple[int, np.ndarray]:
+    """Greedily match boxes of the same class by IoU.
+
+    Returns the number of matched pairs and the (ref_idx, other_idx) pairs.
+    """
+    if len(ref) == 0 or len(other) == 0:
+        return 0, np.zeros((0, 2), dtype=np.int64)
+    iou = box_overlap(ref, other)
+    iou[ref_cls[:, None] != other_cls[None, :]] = 0.0
+    pairs = []
+    while True:
+        i, j = np.unravel_index(int(np.argmax(iou)), iou.shape)
+        if iou[i, j] < iou_thr:
+            break
+        pairs.append((i, j))
+        iou[i, :] = 0.0
+        iou[:, j] = 0.0
+    return len(pairs), np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+
+
+def main():
+    cfg = load_config("configs/config.yaml")
+    export_cfg = cfg.get("export", {})
+    backend = str(cfg["inference"].get("backend", "torch"))
+    if backend == "torch":
+        raise SystemExit("inference.backend is 'torch'; set it to the exported backend to compare against.")
+    weights = resolve_best_model_path(cfg)
+    exported = backend_weights_path(weights, backend)
+    if not os.path.exists(exported):
+        raise SystemExit(f"{exported} not found. Run src/export.py first.")
+
+    images = sorted(list_images(os.path.join(cfg["paths"]["splits_dir"], "test", "images")))
+    images = images[: int(export_cfg.get("parity_images", 100))]
+    if len(images) == 0:
+        raise SystemExit("No test images found. Run src/preprocess.py first.")
+
+    imgsz = int(cfg["training"]["imgsz"])
+    conf = float(cfg["inference"]["conf"])
+    iou = float(cfg["inference"]["iou"])
+    match_iou = float(export_cfg.get("parity_match_iou", 0.5))
+    tolerance = float(export_cfg.get("parity_tolerance", 0.02))
+
+    ref_model = YOLO(weights, task="detect")
+    exp_model = YOLO(exported, task="detect")
+    n_ref = n_exp = n_match = 0
+    conf_deltas = []
+    for path in images:
+        r = ref_model.predict(path, imgsz=imgsz, conf=conf, iou=iou, verbose=False)[0].boxes.data.cpu().numpy()
+        e = exp_model.predict(path, imgsz=imgsz, conf=conf, iou=iou, verbose=False)[0].boxes.data.cpu().numpy()
+        matched, pairs = match_boxes(r[:, :4], r[:, 5], e[:, :4], e[:, 5], match_iou)
+        n_ref += len(r)
+        n_exp += len(e)
+        n_match += matched
+        if matched:
+            conf_deltas.append(np.abs(r[pairs[:, 0], 4] - e[pairs[:, 1], 4]))
+
+    recall = n_match / n_ref if n_ref else 1.0
+    precision = n_match / n_exp if n_exp else 1.0
+    mean_dconf = float(np.concatenate(conf_deltas).mean()) if conf_deltas else 0.0
+    loss = 1.0 - min(recall, precision)
+    print(f"Backend: {backend} ({exported}) on {len(images)} test images")
+    print(f"Boxes torch: {n_ref}, exported: {n_exp}, matched@{match_iou}: {n_match}")
+    print(f"Recall vs torch: {recall:.4f}, Precision vs torch: {precision:.4f}, Mean |dconf|: {mean_dconf:.4f}")
+    if loss > tolerance:
+        raise SystemExit(f"Parity check FAILED: box mismatch {loss:.4f} exceeds tolerance {tolerance:.4f}")
+    print(f"Parity check passed: box mismatch {loss:.4f} <= tolerance {tolerance:.4f}")
+
+
+if __name__ == "__main__":
+    main()
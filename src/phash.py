@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+HASH_METHODS = ("dhash", "phash")
+
+
+def _gray(img: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel().astype(np.uint8)).tobytes(), "big")
+
+
+def dhash(img: np.ndarray) -> int:
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 thumbnail."""
+    small = cv2.resize(_gray(img), (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def phash(img: np.ndarray) -> int:
+    """64-bit perceptual hash: low-frequency DCT coefficients of a 32x32 thumbnail against their median."""
+    small = cv2.resize(_gray(img), (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+def image_hash(img: np.ndarray, method: str = "dhash") -> int:
+    if method == "phash":
+        return phash(img)
+    if method == "dhash":
+        return dhash(img)
+    raise ValueError(f"hash method must be one of {HASH_METHODS}, got '{method}'")
+
+
+def hash_bytes(data: bytes, method: str = "dhash") -> Optional[int]:
+    # Reduced decoding: JPEGs are decoded straight to 1/8 scale, which is all a 32x32 hash needs
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    return None if img is None else image_hash(img, method)
+
+
+def hash_file(path: str, method: str = "dhash") -> Optional[int]:
+    img = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    return None if img is None else image_hash(img, method)
+
+
+def hash_files(paths: Sequence[str], method: str = "dhash", workers: int = 8) -> List[Optional[int]]:
+    """Hash many images in parallel (decoding releases the GIL). Unreadable files give None."""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(lambda p: hash_file(p, method), paths))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for Hamming-radius queries.
+
+    Each node stores (hash, item ids with that exact hash, {distance: child}).
+    The triangle inequality limits a radius-r query to children whose edge
+    distance lies in [d - r, d + r].
+    """
+
+    def __init__(self) -> None:
+        self._root: Optional[list] = None
+        self.size = 0
+
+    def add(self, h: int, item: int) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = [h, [item], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = child
+
+    def query(self, h: int, max_distance: int) -> List[Tuple[int, int]]:
+        """All (item, distance) within `max_distance` of `h`."""
+        out: List[Tuple[int, int]] = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance:
+                out.extend((item, d) for item in node[1])
+            for edge, child in node[2].items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        return out
+
+
+class PHashIndex:
+    """Perceptual hashes with a BK-tree for neighbour queries, persisted as .npy + .json."""
+
+    def __init__(self, method: str = "dhash") -> None:
+        self.method = method
+        self.hashes: List[int] = []
+        self.keys: List[Any] = []
+        self._tree = BKTree()
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, h: int, key: Any) -> int:
+        idx = len(self.hashes)
+        self.hashes.append(int(h))
+        self.keys.append(key)
+        self._tree.add(int(h), idx)
+        return idx
+
+    def query(self, h: int, max_distance: int) -> List[Tuple[int, int]]:
+        """(index, distance) of every entry within `max_distance`, nearest first."""
+        return sorted(self._tree.query(int(h), max_distance), key=lambda t: (t[1], t[0]))
+
+    def nearest(self, h: int, max_distance: int) -> Optional[Tuple[Any, int]]:
+        hits = self.query(h, max_distance)
+        return (self.keys[hits[0][0]], hits[0][1]) if hits else None
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.save(path + ".npy", np.asarray(self.hashes, dtype=np.uint64))
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"method": self.method, "keys": self.keys}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "PHashIndex":
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["method"])
+        for h, key in zip(np.load(path + ".npy").tolist(), meta["keys"]):
+            index.add(h, key)
+        return index
+
+    @classmethod
+    def build(cls, paths: Sequence[str], method: str = "dhash", workers: int = 8) -> "PHashIndex":
+        index = cls(method)
+        for path, h in zip(paths, hash_files(paths, method, workers)):
+            if h is not None:
+                index.add(h, path)
+        return index
+
+
+def near_duplicate_groups(index: PHashIndex, max_distance: int) -> np.ndarray:
+    """Group id per index entry; entries linked by a chain of near-duplicates share an id."""
+    n = len(index)
+    parent = np.arange(n, dtype=np.int64)
+
+    def _find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = int(parent[i])
+        return i
+
+    for i, h in enumerate(index.hashes):
+        for j, _ in index.query(h, max_distance):
+            ri, rj = _find(i), _find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+    return np.fromiter((_find(i) for i in range(n)), dtype=np.int64, count=n)
+
+
+def merge_group_ids(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Connected components of the union of two groupings over the same items.
+
+    Vectorized label propagation: each round every item takes the minimum
+    label found in either of its groups, until nothing changes.
+    """
+    labels = np.arange(len(a), dtype=np.int64)
+    a = np.unique(a, return_inverse=True)[1]
+    b = np.unique(b, return_inverse=True)[1]
+    while True:
+        min_a = np.full(int(a.max()) + 1 if len(a) else 0, np.iinfo(np.int64).max)
+        np.minimum.at(min_a, a, labels)
+        new = min_a[a]
+        min_b = np.full(int(b.max()) + 1 if len(b) else 0, np.iinfo(np.int64).max)
+        np.minimum.at(min_b, b, new)
+        new = min_b[b]
+        if np.array_equal(new, labels):
+            return np.unique(labels, return_inverse=True)[1]
+        labels = new
+
+
+def drop_near_duplicates(groups: np.ndarray) -> np.ndarray:
+    """Indices to keep: the first item of every group."""
+    _, first = np.unique(groups, return_index=True)
+    return np.sort(first)
+
+
+def summarize(groups: np.ndarray) -> Dict[str, int]:
+    sizes = np.bincount(np.unique(groups, return_inverse=True)[1]) if len(groups) else np.zeros(0, dtype=np.int64)
+    return {"images": int(len(groups)), "groups": int(len(sizes)), "duplicates": int((sizes - 1).clip(0).sum())}
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Dict, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    from .utils import ensure_dirs, list_images, load_config
+    from .labels import parse_label_file
+    from .ingest import decode_image
+except Exception:
+    from utils import ensure_dirs, list_images, load_config
+    from labels import parse_label_file
+    from ingest import decode_image
+
+
+def thumbnail(image: np.ndarray, size: int = 64) -> np.ndarray:
+    """The one thumbnail every path scores: INTER_AREA resize of the fully decoded frame.
+
+    Calibrated thresholds only carry over if calibration, images and video
+    frames all go through this exact function.
+    """
+    return cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA)
+
+
+def frame_stats(thumbs: np.ndarray, color_dist: float = 40.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-thumbnail (edge, outlier) statistics for a (B, S, S, 3) uint8 batch.
+
+    edge: 99th percentile of the luminance gradient magnitude, i.e. the
+    strongest local edges, which open water (even choppy) rarely produces.
+    outlier: fraction of pixels further than `color_dist` from the frame's
+    median colour, i.e. how much of the frame is not water-coloured.
+    """
+    x = thumbs.astype(np.float32)
+    gray = x @ np.array([0.114, 0.587, 0.299], dtype=np.float32)  # BGR luminance
+    gx = np.abs(np.diff(gray, axis=2))[:, :-1, :]
+    gy = np.abs(np.diff(gray, axis=1))[:, :, :-1]
+    grad = np.sqrt(gx * gx + gy * gy).reshape(len(x), -1)
+    edge = np.percentile(grad, 99, axis=1)
+    median = np.median(x.reshape(len(x), -1, 3), axis=1)
+    dist = np.linalg.norm(x - median[:, None, None, :], axis=-1).reshape(len(x), -1)
+    outlier = (dist > color_dist).mean(axis=1)
+    return edge, outlier
+
+
+def is_plausible(edge: np.ndarray, outlier: np.ndarray, prefilter_cfg: dict) -> np.ndarray:
+    """Frames worth a detector pass: strong edges or enough off-colour pixels."""
+    return (edge >= float(prefilter_cfg.get("edge_thr", 25.0))) | \
+        (outlier >= float(prefilter_cfg.get("outlier_thr", 0.002)))
+
+
+def plausible_frames(images: Sequence[np.ndarray], prefilter_cfg: dict) -> np.ndarray:
+    """`is_plausible` for decoded BGR frames, scored as one vectorized batch."""
+    if len(images) == 0:
+        return np.zeros(0, dtype=bool)
+    size = int(prefilter_cfg.get("thumb_size", 64))
+    thumbs = np.stack([thumbnail(img, size) for img in images])
+    edge, outlier = frame_stats(thumbs, float(prefilter_cfg.get("color_dist", 40.0)))
+    return is_plausible(edge, outlier, prefilter_cfg)
+
+
+def _label_counts(images: Sequence[str], labels_dir: str, num_classes: int) -> np.ndarray:
+    counts = []
+    for path in images:
+        label = os.path.join(labels_dir, os.path.splitext(os.path.basename(path))[0] + ".txt")
+        counts.append(len(parse_label_file(label, num_classes)[0]) if os.path.isfile(label) else 0)
+    return np.asarray(counts, dtype=np.int64)
+
+
+def sweep_thresholds(edge: np.ndarray, outlier: np.ndarray, gt_boxes: np.ndarray,
+                     steps: int = 40) -> Dict[str, np.ndarray]:
+    """Box recall and pass rate for every (edge_thr, outlier_thr) pair on a quantile grid."""
+    q = np.linspace(0.0, 1.0, steps)
+    edge_thr = np.unique(np.quantile(edge, q))
+    outlier_thr = np.unique(np.quantile(outlier, q))
+    # (images, edge thresholds, outlier thresholds)
+    passed = (edge[:, None, None] >= edge_thr[None, :, None]) | (outlier[:, None, None] >= outlier_thr[None, None, :])
+    total = max(int(gt_boxes.sum()), 1)
+    return {
+        "edge_thr": edge_thr,
+        "outlier_thr": outlier_thr,
+        "recall": np.tensordot(gt_boxes, passed, axes=(0, 0)) / total,
+        "pass_rate": passed.mean(axis=0),
+    }
+
+
+def _time_per_image(fn, items: Sequence) -> float:
+    start = time.perf_counter()
+    for x in items:
+        fn(x)
+    return (time.perf_counter() - start) / max(len(items), 1)
+
+
+def main():
+    """Calibrate the prefilter on data/splits/val.
+
+    For each recall target in `inference.prefilter.recall_targets`, picks the
+    thresholds that skip the most frames while keeping that fraction of the
+    labelled boxes, and estimates the throughput gain from the measured cost
+    of the prefilter against a model forward pass.
+    """
+    try:
+        from .inference import load_model_entry, predict_device, inference_device
+    except Exception:
+        from inference import load_model_entry, predict_device, inference_device
+
+    cfg = load_config("configs/config.yaml")
+    pf_cfg = cfg["inference"].get("prefilter", {})
+    val_dir = os.path.join(cfg["paths"]["splits_dir"], "val")
+    images = sorted(list_images(os.path.join(val_dir, "images")))
+    if not images:
+        raise SystemExit("No validation images found. Run src/preprocess.py first.")
+    gt_boxes = _label_counts(images, os.path.join(val_dir, "labels"), len(cfg["dataset"].get("classes", ["debris"])))
+
+    size = int(pf_cfg.get("thumb_size", 64))
+    color_dist = float(pf_cfg.get("color_dist", 40.0))
+    thumbs = np.empty((len(images), size, size, 3), dtype=np.uint8)
+    for i, path in enumerate(images):
+        with open(path, "rb") as f:
+            thumbs[i] = thumbnail(decode_image(f.read()), size)
+    edge, outlier = frame_stats(thumbs, color_dist)
+
+    # Per-image costs on a sample. Frames are decoded either way, so the prefilter
+    # (thumbnail + statistics) competes with the forward pass alone
+    sample = []
+    for path in images[: int(pf_cfg.get("calibration_timing_images", 32))]:
+        with open(path, "rb") as f:
+            sample.append(decode_image(f.read()))
+    t_prefilter = _time_per_image(lambda img: plausible_frames([img], pf_cfg), sample)
+    model = load_model_entry(cfg)
+    imgsz = int(cfg["training"]["imgsz"])
+    device = predict_device(inference_device(cfg))
+
+    def _forward(img: np.ndarray) -> None:
+        model.predict(img, imgsz=imgsz, conf=float(cfg["inference"]["conf"]), device=device, verbose=False)
+
+    _forward(sample[0])  # warm-up
+    t_full = _time_per_image(_forward, sample)
+
+    sweep = sweep_thresholds(edge, outlier, gt_boxes)
+    positives = gt_boxes > 0
+    report = {
+        "images": len(images),
+        "images_with_debris": int(positives.sum()),
+        "boxes": int(gt_boxes.sum()),
+        "prefilter_ms": 1000 * t_prefilter,
+        "full_ms": 1000 * t_full,
+        "targets": [],
+    }
+    print(f"{len(images)} val images ({int(positives.sum())} with debris), "
+          f"prefilter {1000 * t_prefilter:.2f} ms vs. detect {1000 * t_full:.1f} ms per image")
+    for target in pf_cfg.get("recall_targets", [0.99, 0.995, 1.0]):
+        ok = sweep["recall"] >= float(target) - 1e-9
+        rate = np.where(ok, sweep["pass_rate"], np.inf)
+        e, o = np.unravel_index(np.argmin(rate), rate.shape)
+        passed = is_plausible(edge, outlier, {"edge_thr": sweep["edge_thr"][e], "outlier_thr": sweep["outlier_thr"][o]})
+        pass_rate = float(passed.mean())
+        speedup = t_full / (t_prefilter + pass_rate * t_full)
+        row = {
+            "recall_target": float(target),
+            "edge_thr": float(sweep["edge_thr"][e]),
+            "outlier_thr": float(sweep["outlier_thr"][o]),
+            "box_recall": float(gt_boxes[passed].sum() / max(gt_boxes.sum(), 1)),
+            "frame_recall": float(passed[positives].mean()) if positives.any() else 1.0,
+            "skipped": 1.0 - pass_rate,
+            "empty_frames_skipped": float((~passed[~positives]).mean()) if (~positives).any() else 0.0,
+            "est_speedup": speedup,
+        }
+        report["targets"].append(row)
+        print(f"recall >= {target}: edge_thr={row['edge_thr']:.2f} outlier_thr={row['outlier_thr']:.4f} "
+              f"box recall {row['box_recall']:.4f}, frame recall {row['frame_recall']:.4f}, "
+              f"skips {100 * row['skipped']:.1f}% of frames ({100 * row['empty_frames_skipped']:.1f}% of empty ones), "
+              f"~{speedup:.2f}x throughput")
+
+    out_dir = os.path.join(cfg["paths"]["runs_dir"], "prefilter")
+    ensure_dirs([out_dir])
+    out_path = os.path.join(out_dir, "calibration.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved: {out_path}. Copy the chosen edge_thr/outlier_thr into inference.prefilter.")
+
+
+if __name__ == "__main__":
+    main()
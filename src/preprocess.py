@@ -3,7 +3,13 @@ from __future__ import annotations
 import os
 from typing import List
 
-from utils import load_config, find_yolo_pairs, split_dataset, materialize_splits, write_yolo_dataset_yaml
+import numpy as np
+
+from utils import load_config, find_yolo_pairs, split_dataset, kfold_splits, materialize_splits, write_yolo_dataset_yaml
+from labels import validate_labels, write_label_cache
+from splits import class_histograms, group_ids, stratum_keys
+from phash import PHashIndex, drop_near_duplicates, hash_files, merge_group_ids, near_duplicate_groups, summarize
+from image_cache import build_image_cache
 
 
 def main():
@@ -17,19 +23,106 @@ def main():
 
     os.makedirs(splits_dir, exist_ok=True)
 
-    pairs = find_yolo_pairs(dataset_root)
+    pairs = find_yolo_pairs(
+        dataset_root,
+        index_path=os.path.join(cfg["paths"]["processed_dir"], "dataset_index.json"),
+        workers=int(cfg["preprocess"].get("workers", 8)),
+    )
     if len(pairs) == 0:
         raise SystemExit(
             "No YOLO-formatted dataset found. Expected 'images/' and 'labels/' sibling folders with .txt labels."
         )
 
-    splits = split_dataset(pairs, val_ratio=val_ratio, test_ratio=test_ratio, seed=seed)
-    materialize_splits(splits, splits_dir)
+    dup_cfg = cfg["preprocess"].get("near_duplicates", {})
+    dup_mode = str(dup_cfg.get("mode", "none"))
+    dup_groups = None
+    if dup_mode != "none":
+        method = str(dup_cfg.get("method", "dhash"))
+        hashes = hash_files([img for img, _ in pairs], method, workers=int(cfg["preprocess"].get("workers", 8)))
+        index = PHashIndex(method)
+        for i, h in enumerate(hashes):
+            if h is not None:
+                index.add(h, i)
+        index.save(os.path.join(cfg["paths"]["processed_dir"], "phash_index"))
+        # Unhashable images keep singleton groups after the hashed ones
+        dup_groups = np.arange(len(pairs), dtype=np.int64) + len(pairs)
+        dup_groups[np.asarray(index.keys, dtype=np.int64)] = near_duplicate_groups(index, int(dup_cfg.get("max_distance", 4)))
+        print(f"Near-duplicates ({method}): {summarize(dup_groups)}")
+        if dup_mode == "drop":
+            keep = drop_near_duplicates(dup_groups)
+            pairs = [pairs[i] for i in keep]
+            dup_groups = None
+            print(f"Kept {len(pairs)} images after dropping near-duplicates")
+
+    label_cache = None
+    if cfg["preprocess"].get("validate_labels", True):
+        arrays, errors = validate_labels(
+            [lbl for _, lbl in pairs],
+            num_classes=len(classes),
+            workers=int(cfg["preprocess"].get("label_workers", os.cpu_count() or 1)),
+        )
+        if errors:
+            report_path = os.path.join(cfg["paths"]["processed_dir"], "label_errors.txt")
+            os.makedirs(os.path.dirname(report_path), exist_ok=True)
+            with open(report_path, "w", encoding="utf-8") as f:
+                for path, errs in errors.items():
+                    for err in errs:
+                        f.write(f"{path}: {err}\n")
+            print(f"Found label problems in {len(errors)} of {len(pairs)} files; see {report_path}")
+            if cfg["preprocess"].get("drop_invalid_labels", True):
+                keep = [i for i, (_, lbl) in enumerate(pairs) if lbl not in errors]
+                pairs = [pairs[i] for i in keep]
+                arrays = [arrays[i] for i in keep]
+                if dup_groups is not None:
+                    dup_groups = dup_groups[keep]
+                print(f"Dropped {len(errors)} pairs with invalid labels")
+        label_cache_dir = os.path.join(cfg["paths"]["processed_dir"], "labels")
+        label_cache = write_label_cache(label_cache_dir, [lbl for _, lbl in pairs], arrays)
+        print(f"Wrote label cache for {len(pairs)} files to {label_cache_dir}")
+
+    strata = None
+    if cfg["preprocess"].get("stratify", True):
+        if label_cache is None:
+            print("Stratified splitting needs validate_labels; falling back to a random split")
+        else:
+            hist = class_histograms(label_cache.boxes[:, 0], label_cache.counts(), len(classes))
+            strata = stratum_keys(hist)
+    group_by = str(cfg["preprocess"].get("group_by", "none"))
+    groups = None
+    if group_by != "none":
+        groups = group_ids([img for img, _ in pairs], group_by, float(cfg["preprocess"].get("group_time_window_s", 10)))
+        print(f"Grouped {len(pairs)} images into {len(set(groups.tolist()))} groups by {group_by}")
+    if dup_groups is not None:
+        # Near-duplicates join whatever group their twins are in
+        groups = dup_groups if groups is None else merge_group_ids(groups, dup_groups)
+
+    link_mode = str(cfg["preprocess"].get("link_mode", "copy"))
+    workers = int(cfg["preprocess"].get("workers", 8))
+    splits = split_dataset(pairs, val_ratio=val_ratio, test_ratio=test_ratio, seed=seed, strata=strata, groups=groups)
+    placed = materialize_splits(splits, splits_dir, link_mode=link_mode, workers=workers)
+    print(f"Placed {placed.placed} files ({link_mode}), removed {placed.removed}, unchanged {placed.unchanged}")
 
     dataset_yaml_path = os.path.join("configs", "dataset.yolov8.yaml")
     write_yolo_dataset_yaml(dataset_yaml_path, splits_dir, classes)
     print(f"Prepared splits at {splits_dir} and dataset yaml at {dataset_yaml_path}")
 
+    if cfg["training"].get("image_cache", False):
+        imgsz = int(cfg["training"]["imgsz"])  # type: ignore
+        for split in splits:
+            images_dir = os.path.join(splits_dir, split, "images")
+            if os.path.isdir(images_dir):
+                cache_dir = build_image_cache(images_dir, imgsz, workers=int(cfg["training"].get("image_cache_workers", 8)))
+                print(f"Image cache for {split} at {cache_dir}")
+
+    k = int(cfg["preprocess"].get("kfold", 0))
+    if k > 1:
+        for i, fold in enumerate(kfold_splits(pairs, k, seed=seed, strata=strata, groups=groups)):
+            fold_dir = os.path.join(splits_dir, f"fold{i}")
+            materialize_splits(fold, fold_dir, link_mode=link_mode, workers=workers)
+            fold_yaml_path = os.path.join("configs", f"dataset.fold{i}.yaml")
+            write_yolo_dataset_yaml(fold_yaml_path, fold_dir, classes)
+        print(f"Prepared {k} folds under {splits_dir}/fold*/ and configs/dataset.fold*.yaml")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from ultralytics import YOLO
+
+
+@dataclass
+class LoadedModel:
+    model: YOLO
+    weights_path: str
+    mtime: float
+    device: str
+    imgsz: int
+    load_s: float
+    warmup_s: float
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def predict(self, source, **kwargs) -> list:
+        """`model.predict` under this entry's lock; one ultralytics predictor is not thread-safe."""
+        with self.lock:
+            return list(self.model.predict(source, **kwargs))
+
+
+def _weights_mtime(weights_path: str) -> float:
+    # Hub names such as "yolov8n.pt" may not exist locally until ultralytics downloads them
+    try:
+        return os.path.getmtime(weights_path)
+    except OSError:
+        return 0.0
+
+
+def predict_device(device: str) -> Optional[str]:
+    """Map a config device string to the value accepted by `model.predict`."""
+    return None if device in ("", "auto", None) else device
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded YOLO models.
+
+    Models are keyed by (weights path, weights mtime, device), so retraining
+    (which rewrites `best_model.path` or the weights file) transparently loads
+    the new weights on the next `get` call. An entry is dropped once weights
+    with a newer mtime at the same path are loaded on the same device; models
+    at other paths stay resident until `clear`. Shared entries must be called
+    through `LoadedModel.predict`, which serializes predictions per entry.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple[str, float, str], LoadedModel] = {}
+
+    def get(self, weights_path: str, device: str = "auto", imgsz: int = 640, warmup: bool = True) -> LoadedModel:
+        key = (os.path.abspath(weights_path) if os.path.isfile(weights_path) else weights_path,
+               _weights_mtime(weights_path), str(device))
+        entry = self._models.get(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                return entry
+            entry = self._load(key, imgsz, warmup)
+            for stale in [k for k in self._models if k[0] == key[0] and k[2] == key[2]]:
+                del self._models[stale]
+            self._models[key] = entry
+            return entry
+
+    def _load(self, key: Tuple[str, float, str], imgsz: int, warmup: bool) -> LoadedModel:
+        weights_path, mtime, device = key
+        t0 = time.perf_counter()
+        model = YOLO(weights_path, task="detect")  # exported backends carry no task hint
+        load_s = time.perf_counter() - t0
+
+        warmup_s = 0.0
+        if warmup:
+            # One dummy pass builds the predictor, fuses layers and moves weights to the device
+            t0 = time.perf_counter()
+            dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+            model.predict(dummy, imgsz=imgsz, device=predict_device(device), verbose=False)
+            warmup_s = time.perf_counter() - t0
+        return LoadedModel(
+            model=model,
+            weights_path=weights_path,
+            mtime=mtime,
+            device=device,
+            imgsz=imgsz,
+            load_s=load_s,
+            warmup_s=warmup_s,
+        )
+
+    def stats(self) -> List[dict]:
+        """Load and warmup timings (seconds) for every resident model."""
+        return [
+            {
+                "weights_path": e.weights_path,
+                "device": e.device,
+                "load_s": round(e.load_s, 4),
+                "warmup_s": round(e.warmup_s, 4),
+            }
+            for e in list(self._models.values())
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+_REGISTRY = ModelRegistry()
+
+
+def get_registry() -> ModelRegistry:
+    return _REGISTRY
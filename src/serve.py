@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+try:
+    from .utils import load_config  # when imported as part of package `src`
+    from .inference import load_best_model, predict_on_images
+    from .registry import get_registry
+except Exception:
+    from utils import load_config  # fallback for direct script execution
+    from inference import load_best_model, predict_on_images
+    from registry import get_registry
+
+
+class QueueFull(Exception):
+    """Raised when the batcher queue is past its configured depth."""
+
+
+@dataclass
+class _Job:
+    image_path: str
+    enqueued: float = field(default_factory=time.perf_counter)
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Optional[dict] = None
+    error: Optional[BaseException] = None
+    # Set when the request gave up on this job; the worker drops it unrun
+    cancelled: bool = False
+
+
+class MicroBatcher:
+    """Merge concurrent single-image requests into batched `predict_on_images` calls.
+
+    A batch is dispatched as soon as `max_batch_size` jobs are waiting or
+    `max_wait_ms` has elapsed since the first job of the batch was dequeued,
+    whichever comes first. `submit` admits a request's images all at once or
+    not at all, raising `QueueFull` instead of blocking when they would take
+    the queue past `max_queue` pending jobs. Jobs of requests that time out
+    or fail are cancelled and skipped by the worker. Results go through the
+    same cache, store, prefilter, tiling and georeferencing as
+    `predict_on_images`; if a batch fails, its jobs are rerun one by one so
+    only the failing image gets the error.
+    """
+
+    def __init__(self, cfg: dict, max_batch_size: int, max_wait_ms: float, max_queue: int) -> None:
+        self.cfg = cfg
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(1, int(max_queue))
+        # Admission is counted here rather than by the queue, so a request is never half-enqueued
+        self._queue: "queue.Queue[_Job]" = queue.Queue()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def depth(self) -> int:
+        with self._pending_lock:
+            return self._pending
+
+    def submit(self, image_paths: List[str], timeout: Optional[float] = None) -> List[dict]:
+        jobs = [_Job(image_path=p) for p in image_paths]
+        with self._pending_lock:
+            if self._pending + len(jobs) > self.max_queue:
+                raise QueueFull(f"queue depth {self.max_queue} reached")
+            self._pending += len(jobs)
+        for job in jobs:
+            self._queue.put_nowait(job)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        try:
+            for job in jobs:
+                remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+                if not job.done.wait(remaining):
+                    raise TimeoutError(f"no result for {job.image_path} within {timeout}s")
+                if job.error is not None:
+                    raise job.error
+        except BaseException:
+            for job in jobs:
+                job.cancelled = True
+            raise
+        return [job.result for job in jobs]  # type: ignore[misc]
+
+    def _take(self, timeout: Optional[float]) -> _Job:
+        """Next job that has not been cancelled; `timeout` <= 0 means do not wait."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            if deadline is None:
+                job = self._queue.get()
+            else:
+                remaining = deadline - time.perf_counter()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            with self._pending_lock:
+                self._pending -= 1
+            if not job.cancelled:
+                return job
+
+    def _collect(self) -> List[_Job]:
+        batch = [self._take(None)]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._take(deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                self._predict(batch, started)
+            except Exception:
+                for job in batch:  # isolate the failure: rerun each job alone
+                    try:
+                        self._predict([job], started)
+                    except Exception as e:
+                        job.error = e
+            for job in batch:
+                job.done.set()
+
+    def _predict(self, batch: List[_Job], started: float) -> None:
+        items = predict_on_images([job.image_path for job in batch], cfg=self.cfg)
+        compute_ms = (time.perf_counter() - started) * 1000.0
+        for job, item in zip(batch, items):
+            item["queue_wait_ms"] = round((started - job.enqueued) * 1000.0, 3)
+            item["compute_ms"] = round(compute_ms, 3)
+            item["batch_size"] = len(batch)
+            job.result = item
+
+
+def _make_handler(batcher: MicroBatcher, request_timeout: float):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path != "/healthz":
+                self._send(404, {"error": "not found"})
+                return
+            self._send(200, {"queue_depth": batcher.depth(), "models": get_registry().stats()})
+
+        def do_POST(self) -> None:
+            if self.path != "/predict":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                data = json.loads(self.rfile.read(length) or b"{}")
+                single = "image_path" in data
+                paths = [data["image_path"]] if single else list(data["image_paths"])
+            except (ValueError, KeyError, TypeError):
+                self._send(400, {"error": "expected JSON body with 'image_path' or 'image_paths'"})
+                return
+            try:
+                results = batcher.submit(paths, timeout=request_timeout)
+            except QueueFull as e:
+                self._send(503, {"error": str(e)}, headers={"Retry-After": "1"})
+                return
+            except TimeoutError as e:
+                self._send(504, {"error": str(e)})
+                return
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+                return
+            self._send(200, results[0] if single else {"results": results})
+
+        def log_message(self, format, *args) -> None:  # keep stdout quiet under load
+            pass
+
+    return Handler
+
+
+def main():
+    cfg = load_config("configs/config.yaml")
+    serve_cfg = cfg.get("serve", {})
+    host = serve_cfg.get("host", "127.0.0.1")
+    port = int(serve_cfg.get("port", 8765))
+
+    # Load and warm up before accepting traffic so the first batch is not penalised
+    load_best_model(cfg)
+    batcher = MicroBatcher(
+        cfg,
+        max_batch_size=int(serve_cfg.get("max_batch_size", 8)),
+        max_wait_ms=float(serve_cfg.get("max_wait_ms", 10)),
+        max_queue=int(serve_cfg.get("max_queue", 64)),
+    )
+    handler = _make_handler(batcher, request_timeout=float(serve_cfg.get("request_timeout_s", 60)))
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving detections on http://{host}:{port}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .georef import EARTH_RADIUS_M
+except Exception:
+    from georef import EARTH_RADIUS_M
+
+
+# Bound on candidate pairs materialized at once
+_PAIR_CHUNK = 4_000_000
+
+# Half of the 3x3x3 (x, y, t) cell neighbourhood; the other half is covered by symmetry
+_OFFSETS = [(dx, dy, dt) for dt in (-1, 0, 1) for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+            if (dt, dy, dx) > (0, 0, 0)]
+
+
+def _ranks(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    uniq, inverse = np.unique(values, return_inverse=True)
+    return uniq, inverse.reshape(-1)
+
+
+def _shifted_rank(uniq: np.ndarray, values: np.ndarray, delta: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Rank of `values + delta` among `uniq`, and whether it is present at all."""
+    target = values + delta
+    pos = np.minimum(np.searchsorted(uniq, target), len(uniq) - 1)
+    return pos, uniq[pos] == target
+
+
+def _expand_pairs(a_start: np.ndarray, a_count: np.ndarray, b_start: np.ndarray,
+                  b_count: np.ndarray) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """All (i, j) point pairs between cell ranges a and b, in chunks of at most ~`_PAIR_CHUNK`."""
+    sizes = a_count * b_count
+    ends = np.cumsum(sizes)
+    lo = 0
+    while lo < len(sizes):
+        base = ends[lo - 1] if lo else 0
+        hi = max(lo + 1, int(np.searchsorted(ends, base + _PAIR_CHUNK, side="right")))
+        sl = slice(lo, hi)
+        rep = np.repeat(np.arange(hi - lo), sizes[sl])
+        k = np.arange(len(rep)) - (ends[sl] - sizes[sl] - base)[rep]
+        nb = b_count[sl][rep]
+        yield a_start[sl][rep] + k // nb, b_start[sl][rep] + k % nb
+        lo = hi
+
+
+def _assign_to_anchors(n: int, later: np.ndarray, earlier: np.ndarray, d2: np.ndarray, rank: np.ndarray,
+                       frames: np.ndarray) -> np.ndarray:
+    """Object anchor per point, visiting points in `rank` order.
+
+    A point joins the nearest earlier anchor it is linked to, unless that
+    object already holds a sighting from the same frame; otherwise it
+    becomes an anchor itself. Every member is within the link distance of
+    its anchor, so objects cannot grow by chaining.
+    """
+    anchor = np.arange(n)
+    # Candidate anchors per point, nearest first
+    order = np.lexsort((d2, later))
+    later, earlier = later[order], earlier[order]
+    bounds = np.searchsorted(later, np.arange(n + 1))
+    start, cand = bounds.tolist(), earlier.tolist()
+    frame = frames.tolist()
+    anchors = anchor.tolist()
+    # (anchor, frame) pairs already in an object. An anchor's own frame never needs
+    # recording: points of that frame are never linked to it
+    taken = set()
+    linked = np.flatnonzero(np.diff(bounds) > 0)  # points without candidates simply stay anchors
+    for p in linked[np.argsort(rank[linked], kind="stable")].tolist():
+        for q in cand[start[p]:start[p + 1]]:
+            if anchors[q] == q and (q, frame[p]) not in taken:
+                anchors[p] = q
+                taken.add((q, frame[p]))
+                break
+    return np.asarray(anchors, dtype=np.int64)
+
+
+def cluster_sightings(lat: np.ndarray, lon: np.ndarray, ts: np.ndarray, radius_m: float,
+                      window_s: float, frames: Optional[np.ndarray] = None) -> np.ndarray:
+    """Group detections that lie within `radius_m` on the ground and `window_s` in time.
+
+    Points are hashed into (radius x radius x window) cells, candidate pairs
+    come only from each cell and its 26 neighbours, and exact distances are
+    checked on those. Detections sharing a `frames` id (boxes of one image)
+    are never linked. In time order, each detection joins the nearest earlier
+    object anchor in range, else starts an object; clusters therefore stay
+    within `radius_m` of their first sighting and a dense debris field is not
+    chained into one object. Returns the anchor index per point; -1 for points
+    without a position.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    ts = np.asarray(ts, dtype=np.float64)
+    n = len(lat)
+    frames = np.arange(n, dtype=np.int64) if frames is None else np.asarray(frames, dtype=np.int64)
+    roots = np.full(n, -1, dtype=np.int64)
+    valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon) & np.isfinite(ts))
+    if len(valid) == 0:
+        return roots
+    # Local equirectangular metres; fine at the scale of a few metres away from the poles
+    y = EARTH_RADIUS_M * np.radians(lat[valid])
+    x = EARTH_RADIUS_M * np.radians(lon[valid]) * np.cos(np.radians(lat[valid]))
+    t = ts[valid]
+    f = frames[valid]
+    radius_m = max(float(radius_m), 1e-3)
+    window_s = float(window_s) if window_s and np.isfinite(window_s) else np.inf
+
+    # Dense ranks per axis keep the packed cell key within int64 for any extent
+    ux, rx = _ranks(np.floor(x / radius_m).astype(np.int64))
+    uy, ry = _ranks(np.floor(y / radius_m).astype(np.int64))
+    ut, rt = _ranks(np.floor(t / window_s).astype(np.int64) if np.isfinite(window_s) else np.zeros(len(t), np.int64))
+    key = (rt * len(uy) + ry) * len(ux) + rx
+    order = np.argsort(key, kind="stable")
+    cells, start, count = np.unique(key[order], return_index=True, return_counts=True)
+    first = order[start]
+    cx, cy, ct = ux[rx[first]], uy[ry[first]], ut[rt[first]]
+
+    edges_a: List[np.ndarray] = []
+    edges_b: List[np.ndarray] = []
+    edges_d2: List[np.ndarray] = []
+    r2 = radius_m * radius_m
+
+    def _keep(i: np.ndarray, j: np.ndarray) -> None:
+        i, j = order[i], order[j]
+        d2 = (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2
+        close = (d2 <= r2) & (np.abs(t[i] - t[j]) <= window_s) & (f[i] != f[j])
+        edges_a.append(i[close])
+        edges_b.append(j[close])
+        edges_d2.append(d2[close])
+
+    # Pairs inside a cell (i < j)
+    multi = count > 1
+    for i, j in _expand_pairs(start[multi], count[multi], start[multi], count[multi]):
+        upper = i < j
+        _keep(i[upper], j[upper])
+    # Pairs with the forward half of the neighbouring cells
+    for dx, dy, dt in _OFFSETS:
+        if dt and not np.isfinite(window_s):
+            continue
+        nx, okx = _shifted_rank(ux, cx, dx)
+        ny, oky = _shifted_rank(uy, cy, dy)
+        nt, okt = _shifted_rank(ut, ct, dt)
+        nkey = (nt * len(uy) + ny) * len(ux) + nx
+        pos = np.minimum(np.searchsorted(cells, nkey), len(cells) - 1)
+        hit = np.flatnonzero(okx & oky & okt & (cells[pos] == nkey))
+        if len(hit) == 0:
+            continue
+        for i, j in _expand_pairs(start[hit], count[hit], start[pos[hit]], count[pos[hit]]):
+            _keep(i, j)
+
+    a = np.concatenate(edges_a) if edges_a else np.zeros(0, np.int64)
+    b = np.concatenate(edges_b) if edges_b else np.zeros(0, np.int64)
+    d2 = np.concatenate(edges_d2) if edges_d2 else np.zeros(0)
+    # Time order, ties by input position; each edge points from the later point to the earlier one
+    rank = np.empty(len(t), dtype=np.int64)
+    rank[np.lexsort((np.arange(len(t)), t))] = np.arange(len(t))
+    swap = rank[a] < rank[b]
+    later, earlier = np.where(swap, b, a), np.where(swap, a, b)
+    roots[valid] = valid[_assign_to_anchors(len(valid), later, earlier, d2, rank, f)]
+    return roots
+
+
+def dedupe_sightings(lat: np.ndarray, lon: np.ndarray, ts: np.ndarray, keys: Sequence[int], radius_m: float,
+                     window_s: float, conf: Optional[np.ndarray] = None,
+                     frames: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Merge repeated sightings of the same object.
+
+    `keys` are stable int64 identifiers of the individual detections. Each
+    object is identified by the key of its earliest sighting (ties broken by
+    key), so its ID does not change as later frames are added. `frames` ids
+    keep boxes of the same image apart (see `cluster_sightings`).
+
+    Returns the object ID per detection (-1 without a ground position) and
+    per-object arrays: object_id, sightings, lat, lon (mean position),
+    first_ts, last_ts and max_conf.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    ts = np.asarray(ts, dtype=np.float64)
+    roots = cluster_sightings(lat, lon, ts, radius_m, window_s, frames)
+    placed = np.flatnonzero(roots >= 0)
+    object_ids = np.full(len(keys), -1, dtype=np.int64)
+    if len(placed) == 0:
+        empty = np.zeros(0)
+        return object_ids, {"object_id": empty.astype(np.int64), "sightings": empty.astype(np.int64),
+                            "lat": empty, "lon": empty, "first_ts": empty, "last_ts": empty, "max_conf": empty}
+    groups, inverse = np.unique(roots[placed], return_inverse=True)
+    inverse = inverse.reshape(-1)
+    # Earliest sighting per group: sort by (group, ts, key) and take the first of each run
+    order = np.lexsort((keys[placed], ts[placed], inverse))
+    run_start = np.flatnonzero(np.r_[True, inverse[order][1:] != inverse[order][:-1]])
+    ids = keys[placed][order[run_start]]
+    object_ids[placed] = ids[inverse]
+
+    n = len(groups)
+    sightings = np.bincount(inverse, minlength=n)
+    by_group = ts[placed][order]
+    conf_placed = np.asarray(conf, dtype=np.float64)[placed] if conf is not None else np.zeros(len(placed))
+    objects = {
+        "object_id": ids,
+        "sightings": sightings,
+        "lat": np.bincount(inverse, weights=np.asarray(lat, dtype=np.float64)[placed], minlength=n) / sightings,
+        "lon": np.bincount(inverse, weights=np.asarray(lon, dtype=np.float64)[placed], minlength=n) / sightings,
+        "first_ts": by_group[run_start],
+        "last_ts": np.maximum.reduceat(by_group, run_start),
+        "max_conf": np.maximum.reduceat(conf_placed[order], run_start),
+    }
+    return object_ids, objects
+
+
+def detection_key(source: str, box_index: int) -> int:
+    """Stable int64 key for box `box_index` of an image path or frame source."""
+    digest = hashlib.blake2b(f"{source}#{box_index}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def dedupe_items(items: List[dict], cfg: dict) -> Dict[str, np.ndarray]:
+    """Deduplicate `predict_on_images` / `stream_predictions` output in place.
+
+    Uses each item's "box_gps" (from georeferencing) and "timestamp"; adds
+    "object_ids" per item (one ID per box, -1 where the box has no ground
+    position) and returns the per-object arrays of `dedupe_sightings`.
+    """
+    sightings_cfg = cfg.get("sightings", {})
+    lat: List[float] = []
+    lon: List[float] = []
+    ts: List[float] = []
+    keys: List[int] = []
+    conf: List[float] = []
+    frames: List[int] = []
+    counts: List[int] = []
+    for frame_id, item in enumerate(items):
+        ground = item.get("box_gps")
+        boxes = item["boxes"]
+        n = len(boxes)
+        counts.append(n)
+        if n == 0:
+            continue
+        if ground is None:
+            ground = np.full((n, 2), np.nan)
+        ground = np.array([(np.nan, np.nan) if g is None else g for g in ground], dtype=np.float64).reshape(-1, 2)
+        lat.extend(ground[:, 0].tolist())
+        lon.extend(ground[:, 1].tolist())
+        t = item.get("timestamp")
+        ts.extend([np.nan if t is None else float(t)] * n)
+        keys.extend(detection_key(item["image_path"], i) for i in range(n))
+        frames.extend([frame_id] * n)
+        conf.extend(boxes.conf.tolist() if hasattr(boxes, "conf") else [float(b["conf"]) for b in boxes])
+    object_ids, objects = dedupe_sightings(
+        np.array(lat), np.array(lon), np.array(ts), keys,
+        radius_m=float(sightings_cfg.get("radius_m", 5.0)),
+        window_s=float(sightings_cfg.get("window_s", 600.0)),
+        conf=np.array(conf),
+        frames=np.array(frames, dtype=np.int64),
+    )
+    offsets = np.cumsum([0] + counts)
+    for item, lo, hi in zip(items, offsets[:-1], offsets[1:]):
+        item["object_ids"] = object_ids[lo:hi]
+    return objects
+
+
+def store_sightings(store, cfg: dict, t0: Optional[float] = None,
+                    t1: Optional[float] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """Deduplicate every georeferenced detection in a `DetectionStore`.
+
+    Returns (detections, objects): the store's `ground_detections` arrays
+    plus "object_id", and the per-object arrays of `dedupe_sightings`.
+    Object IDs derive from the store's row ids, so they persist across runs.
+    """
+    sightings_cfg = cfg.get("sightings", {})
+    dets = store.ground_detections(t0, t1)
+    dets["object_id"], objects = dedupe_sightings(
+        dets["lat"], dets["lon"], dets["ts"], dets["key"],
+        radius_m=float(sightings_cfg.get("radius_m", 5.0)),
+        window_s=float(sightings_cfg.get("window_s", 600.0)),
+        conf=dets["conf"],
+        frames=dets["key"] >> 16,  # the image row id
+    )
+    return dets, objects
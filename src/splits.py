@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import os
+import re
+from typing import Sequence
+
+import numpy as np
+
+try:
+    from .geo import capture_time_from_image
+except Exception:
+    from geo import capture_time_from_image
+
+
+GROUP_MODES = ("none", "directory", "flight", "time")
+TRAIN, VAL, TEST = 0, 1, 2
+
+# "DJI_0042", "flight3-000127", "survey_07_frame_000311" -> prefix before the trailing frame counter
+_FRAME_COUNTER = re.compile(r"[_\-\s.]*(?:frame|img|image)?[_\-\s.]*\d+$", re.IGNORECASE)
+
+
+def class_histograms(cls_ids: np.ndarray, counts: np.ndarray, num_classes: int) -> np.ndarray:
+    """Per-image class histogram (K, C) from flat class ids and per-image box counts.
+
+    `cls_ids` and `counts` are the column 0 and `np.diff(offsets)` of a label cache.
+    """
+    image_idx = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+    flat = image_idx * num_classes + cls_ids.astype(np.int64)
+    return np.bincount(flat, minlength=len(counts) * num_classes).reshape(len(counts), num_classes)
+
+
+def stratum_keys(hist: np.ndarray) -> np.ndarray:
+    """Stratum per row: dominant class crossed with a box-density bucket; empty rows get their own stratum.
+
+    The density bucket keeps single-class datasets balanced between sparse
+    and crowded frames.
+    """
+    total = hist.sum(axis=1)
+    density = np.digitize(total, [1.5, 5.5, 20.5])  # 1, 2-5, 6-20, >20 boxes
+    keys = np.argmax(hist, axis=1) * 4 + density
+    empty_key = hist.shape[1] * 4
+    return np.where(total > 0, keys, empty_key)
+
+
+def group_ids(image_paths: Sequence[str], mode: str = "none", time_window_s: float = 10.0) -> np.ndarray:
+    """Integer group id per image; images sharing an id always land in the same split.
+
+    - none: every image is its own group
+    - directory: images in the same folder
+    - flight: same folder and same file-name prefix before the trailing frame counter
+    - time: same folder and captured within `time_window_s` of the previous frame; capture
+      time is EXIF DateTimeOriginal, or the file mtime for images without one
+    """
+    n = len(image_paths)
+    if mode == "none":
+        return np.arange(n, dtype=np.int64)
+    dirs = np.array([os.path.dirname(p) for p in image_paths])
+    if mode == "directory":
+        return np.unique(dirs, return_inverse=True)[1].astype(np.int64)
+    if mode == "flight":
+        prefixes = np.array([
+            os.path.dirname(p) + os.sep + _FRAME_COUNTER.sub("", os.path.splitext(os.path.basename(p))[0])
+            for p in image_paths
+        ])
+        return np.unique(prefixes, return_inverse=True)[1].astype(np.int64)
+    if mode == "time":
+        dir_ids = np.unique(dirs, return_inverse=True)[1]
+
+        def _capture_time(path: str) -> float:
+            # Copied or extracted datasets often share one mtime, so EXIF comes first
+            t = capture_time_from_image(path)
+            return t if t is not None else os.stat(path).st_mtime
+
+        times = np.fromiter((_capture_time(p) for p in image_paths), dtype=np.float64, count=n)
+        order = np.lexsort((times, dir_ids))
+        new_group = np.ones(n, dtype=bool)
+        new_group[1:] = (np.diff(dir_ids[order]) != 0) | (np.diff(times[order]) > time_window_s)
+        ids = np.empty(n, dtype=np.int64)
+        ids[order] = np.cumsum(new_group) - 1
+        return ids
+    raise ValueError(f"group mode must be one of {GROUP_MODES}, got '{mode}'")
+
+
+def _group_positions(strata: np.ndarray, groups: np.ndarray, seed: int) -> np.ndarray:
+    """Per image, the fractional position in [0, 1) of its group within its stratum.
+
+    Groups are shuffled within each stratum and laid end to end by image
+    count; a group's position is the midpoint of its span. Slicing these
+    positions at the split ratios yields splits that are stratified and never
+    cut through a group.
+    """
+    _, groups = np.unique(groups, return_inverse=True)
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    sizes = np.bincount(groups, minlength=n_groups)
+
+    # A group's stratum is its most frequent image stratum
+    n_strata = int(strata.max()) + 1 if len(strata) else 1
+    pair_counts = np.bincount(groups * n_strata + strata, minlength=n_groups * n_strata)
+    group_strata = np.argmax(pair_counts.reshape(n_groups, n_strata), axis=1)
+
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(n_groups), group_strata))
+    sorted_sizes = sizes[order]
+    end = np.cumsum(sorted_sizes)
+    start = end - sorted_sizes
+    new_block = np.r_[True, np.diff(group_strata[order]) != 0]
+    block = np.cumsum(new_block) - 1
+    first = np.flatnonzero(new_block)
+    last = np.r_[first[1:] - 1, n_groups - 1]
+    block_start = start[first][block]
+    block_total = end[last][block] - block_start
+    mid = (start - block_start + sorted_sizes / 2.0) / np.maximum(block_total, 1)
+    positions = np.empty(n_groups, dtype=np.float64)
+    positions[order] = mid
+    return positions[groups]
+
+
+def assign_splits(strata: np.ndarray, groups: np.ndarray, val_ratio: float, test_ratio: float,
+                  seed: int) -> np.ndarray:
+    """Split id (TRAIN, VAL, TEST) per image; stratified by `strata`, atomic over `groups`."""
+    if len(strata) == 0:
+        return np.zeros((0,), dtype=np.int8)
+    pos = _group_positions(strata, groups, seed)
+    split = np.full(len(pos), TRAIN, dtype=np.int8)
+    split[pos < test_ratio + val_ratio] = VAL
+    split[pos < test_ratio] = TEST
+    return split
+
+
+def assign_folds(strata: np.ndarray, groups: np.ndarray, k: int, seed: int) -> np.ndarray:
+    """Fold id in [0, k) per image; stratified by `strata`, atomic over `groups`."""
+    if len(strata) == 0:
+        return np.zeros((0,), dtype=np.int64)
+    pos = _group_positions(strata, groups, seed)
+    return np.minimum((pos * k).astype(np.int64), k - 1)
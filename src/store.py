@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .boxes import refilter
+except Exception:
+    from boxes import refilter
+
+
+# Hotspot grid resolution in degrees (~11 km of latitude); per-cell totals are kept up to date by triggers
+CELL_DEG = 0.1
+_CELL_COLS = 100000
+
+
+def _cell_sql(prefix: str) -> str:
+    return (f"(CAST(({prefix}.lat + 90.0) / {CELL_DEG} AS INTEGER) * {_CELL_COLS}"
+            f" + CAST(({prefix}.lon + 180.0) / {CELL_DEG} AS INTEGER))")
+
+
+def cell_center(cell: int) -> Tuple[float, float]:
+    row, col = divmod(int(cell), _CELL_COLS)
+    return (row + 0.5) * CELL_DEG - 90.0, (col + 0.5) * CELL_DEG - 180.0
+
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    image_hash TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    image_path TEXT,
+    lat REAL,
+    lon REAL,
+    ts REAL NOT NULL,
+    n_boxes INTEGER NOT NULL,
+    conf_sum REAL NOT NULL DEFAULT 0,
+    max_conf REAL,
+    boxes TEXT NOT NULL,
+    created REAL NOT NULL,
+    UNIQUE (image_hash, model_version)
+);
+-- Covers time-range scans, daily rollups and time-only point queries without touching the rows
+CREATE INDEX IF NOT EXISTS images_ts ON images(ts, n_boxes, lat, lon);
+CREATE VIRTUAL TABLE IF NOT EXISTS images_geo USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE TABLE IF NOT EXISTS cells (
+    cell INTEGER PRIMARY KEY,
+    images INTEGER NOT NULL,
+    detections INTEGER NOT NULL,
+    last_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cells_detections ON cells(detections);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    images INTEGER NOT NULL,
+    detections INTEGER NOT NULL,
+    located INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS images_totals_ai AFTER INSERT ON images BEGIN
+    UPDATE totals SET images = images + 1, detections = detections + new.n_boxes,
+        located = located + (new.lat IS NOT NULL);
+END;
+CREATE TRIGGER IF NOT EXISTS images_totals_au AFTER UPDATE OF lat, n_boxes ON images BEGIN
+    UPDATE totals SET detections = detections + new.n_boxes - old.n_boxes,
+        located = located + (new.lat IS NOT NULL) - (old.lat IS NOT NULL);
+END;
+CREATE TRIGGER IF NOT EXISTS images_totals_ad AFTER DELETE ON images BEGIN
+    UPDATE totals SET images = images - 1, detections = detections - old.n_boxes,
+        located = located - (old.lat IS NOT NULL);
+END;
+CREATE TRIGGER IF NOT EXISTS images_geo_ai AFTER INSERT ON images WHEN new.lat IS NOT NULL BEGIN
+    INSERT INTO images_geo VALUES (new.id, new.lat, new.lat, new.lon, new.lon);
+    INSERT INTO cells (cell, images, detections, last_ts) VALUES ({_cell_sql("new")}, 1, new.n_boxes, new.ts)
+        ON CONFLICT(cell) DO UPDATE SET images = images + 1, detections = detections + excluded.detections,
+        last_ts = max(last_ts, excluded.last_ts);
+END;
+CREATE TRIGGER IF NOT EXISTS images_geo_au AFTER UPDATE OF lat, lon, ts, n_boxes ON images BEGIN
+    UPDATE cells SET images = images - 1, detections = detections - old.n_boxes
+        WHERE old.lat IS NOT NULL AND cell = {_cell_sql("old")};
+    DELETE FROM images_geo WHERE id = old.id;
+    INSERT INTO images_geo SELECT new.id, new.lat, new.lat, new.lon, new.lon WHERE new.lat IS NOT NULL;
+    INSERT INTO cells (cell, images, detections, last_ts)
+        SELECT {_cell_sql("new")}, 1, new.n_boxes, new.ts WHERE new.lat IS NOT NULL
+        ON CONFLICT(cell) DO UPDATE SET images = images + 1, detections = detections + excluded.detections,
+        last_ts = max(last_ts, excluded.last_ts);
+END;
+CREATE TRIGGER IF NOT EXISTS images_geo_ad AFTER DELETE ON images BEGIN
+    UPDATE cells SET images = images - 1, detections = detections - old.n_boxes
+        WHERE old.lat IS NOT NULL AND cell = {_cell_sql("old")};
+    DELETE FROM images_geo WHERE id = old.id;
+END;
+-- Perceptual hashes of recent app uploads with their candidate boxes, for near-duplicate reuse
+CREATE TABLE IF NOT EXISTS upload_hashes (
+    id INTEGER PRIMARY KEY,
+    phash INTEGER NOT NULL,
+    settings TEXT NOT NULL,
+    image_path TEXT,
+    boxes TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+_UPSERT = (
+    "INSERT INTO images (image_hash, model_version, image_path, lat, lon, ts, n_boxes, conf_sum, max_conf, boxes, "
+    "created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(image_hash, model_version) DO UPDATE SET image_path = excluded.image_path, lat = excluded.lat, "
+    "lon = excluded.lon, ts = excluded.ts, n_boxes = excluded.n_boxes, conf_sum = excluded.conf_sum, "
+    "max_conf = excluded.max_conf, boxes = excluded.boxes"
+)
+
+
+class DetectionStore:
+    """Every detection result, in SQLite, indexed for map and timeline queries.
+
+    One row per (image content hash, model version) with GPS, capture time
+    and the boxes in the columnar payload format of `Detections`. Locations
+    are indexed by an R*Tree, times by a B-tree, and per-cell totals on a
+    `CELL_DEG` grid are maintained by triggers so hotspot tables never scan
+    the detections. Writes are buffered and committed in batches.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, min_conf: float = 0.25, iou: float = 0.7) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.min_conf = float(min_conf)
+        self.iou = float(iou)
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(images)")}
+        if columns and "conf_sum" not in columns:
+            self._db.execute("ALTER TABLE images ADD COLUMN conf_sum REAL NOT NULL DEFAULT 0")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def add(self, image_hash: str, model_version: str, boxes_payload: dict, image_path: Optional[str] = None,
+            gps: Optional[Tuple[float, float]] = None, ts: Optional[float] = None) -> None:
+        """Queue one result; it is written with the next batch (see `flush`).
+
+        All boxes are kept, but only those that survive `refilter` at `min_conf`
+        and `iou` count towards `n_boxes` and the aggregates. Their indices are
+        stored as `counted`, so a low-threshold candidate run (the app predicts
+        at `ui.candidate_conf` / `ui.candidate_iou`) is counted like a run at the
+        default thresholds.
+        """
+        conf = boxes_payload.get("conf", [])
+        keep = refilter(np.asarray(boxes_payload.get("xyxy", []), dtype=np.float32).reshape(-1, 4),
+                        np.asarray(conf, dtype=np.float32), np.asarray(boxes_payload.get("cls", []), dtype=np.int64),
+                        self.min_conf, self.iou)
+        boxes_payload = dict(boxes_payload, counted=sorted(keep.tolist()))
+        counted = [conf[k] for k in boxes_payload["counted"]]
+        row = (
+            image_hash, model_version, image_path,
+            float(gps[0]) if gps else None, float(gps[1]) if gps else None,
+            float(ts if ts is not None else time.time()),
+            len(counted), float(sum(counted)), max(conf) if conf else None,
+            json.dumps(boxes_payload, separators=(",", ":")), time.time(),
+        )
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self) -> int:
+        with self._lock:
+            return self._flush_locked()
+
+    def _flush_locked(self) -> int:
+        rows, self._pending = self._pending, []
+        if rows:
+            with self._db:
+                self._db.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def _where(self, bbox: Optional[Sequence[float]], t0: Optional[float], t1: Optional[float]) -> Tuple[str, list]:
+        clauses: List[str] = []
+        params: list = []
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            clauses.append("i.id IN (SELECT id FROM images_geo WHERE min_lat >= ? AND max_lat <= ? "
+                           "AND min_lon >= ? AND max_lon <= ?)")
+            params += [min_lat, max_lat, min_lon, max_lon]
+        if t0 is not None:
+            clauses.append("i.ts >= ?")
+            params.append(t0)
+        if t1 is not None:
+            clauses.append("i.ts < ?")
+            params.append(t1)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def points(self, bbox: Optional[Sequence[float]] = None, t0: Optional[float] = None,
+               t1: Optional[float] = None, min_boxes: int = 1) -> Dict[str, np.ndarray]:
+        """Located results as arrays (id, lat, lon, ts, n_boxes, conf_sum) for a
+        (min_lat, min_lon, max_lat, max_lon) box and/or a [t0, t1) time range."""
+        where, params = self._where(bbox, t0, t1)
+        where += (" AND" if where else " WHERE") + " i.lat IS NOT NULL AND i.n_boxes >= ?"
+        params.append(min_boxes)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT i.id, i.lat, i.lon, i.ts, i.n_boxes, i.conf_sum FROM images i{where}", params
+            ).fetchall()
+        arr = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+        return {"id": arr[:, 0].astype(np.int64), "lat": arr[:, 1], "lon": arr[:, 2], "ts": arr[:, 3],
+                "n_boxes": arr[:, 4].astype(np.int64), "conf_sum": arr[:, 5]}
+
+    def ground_detections(self, t0: Optional[float] = None, t1: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Counted boxes (see `add`) with a georeferenced ground position, as arrays.
+
+        key is `image id << 16 | box index`, stable for as long as the image row exists.
+        """
+        where, params = self._where(None, t0, t1)
+        where += (" AND" if where else " WHERE") + " i.n_boxes > 0 AND instr(i.boxes, '\"ground\"') > 0"
+        with self._lock:
+            rows = self._db.execute(f"SELECT i.id, i.ts, i.boxes FROM images i{where}", params).fetchall()
+        keys: List[int] = []
+        ts: List[float] = []
+        lat: List[float] = []
+        lon: List[float] = []
+        conf: List[float] = []
+        for image_id, image_ts, boxes in rows:
+            payload = json.loads(boxes)
+            counted = payload.get("counted")
+            if counted is None:  # rows written before `counted` was stored
+                counted = [k for k, c in enumerate(payload["conf"]) if c >= self.min_conf]
+            for k in counted:
+                c, g = payload["conf"][k], payload["ground"][k]
+                if g is not None:
+                    keys.append((image_id << 16) | k)
+                    ts.append(image_ts)
+                    lat.append(g[0])
+                    lon.append(g[1])
+                    conf.append(c)
+        return {"key": np.array(keys, dtype=np.int64), "ts": np.array(ts, dtype=np.float64),
+                "lat": np.array(lat, dtype=np.float64), "lon": np.array(lon, dtype=np.float64),
+                "conf": np.array(conf, dtype=np.float64)}
+
+    def records(self, bbox: Optional[Sequence[float]] = None, t0: Optional[float] = None,
+                t1: Optional[float] = None, limit: int = 100, with_boxes: bool = False) -> List[dict]:
+        """Most recent results first, optionally filtered like `points`."""
+        where, params = self._where(bbox, t0, t1)
+        cols = "i.id, i.image_hash, i.model_version, i.image_path, i.lat, i.lon, i.ts, i.n_boxes, i.max_conf"
+        if with_boxes:
+            cols += ", i.boxes"
+        with self._lock:
+            cur = self._db.execute(f"SELECT {cols} FROM images i{where} ORDER BY i.ts DESC LIMIT ?", params + [limit])
+            names = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+        out = []
+        for row in rows:
+            rec = dict(zip(names, row))
+            if with_boxes:
+                rec["boxes"] = json.loads(rec["boxes"])
+            out.append(rec)
+        return out
+
+    def daily(self, t0: Optional[float] = None, t1: Optional[float] = None) -> List[dict]:
+        """Images and detections per UTC day in [t0, t1), newest first."""
+        where, params = self._where(None, t0, t1)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT CAST(i.ts / 86400 AS INTEGER) AS day, COUNT(*), SUM(i.n_boxes), SUM(i.lat IS NOT NULL) "
+                f"FROM images i{where} GROUP BY day ORDER BY day DESC", params
+            ).fetchall()
+        return [{"day": time.strftime("%Y-%m-%d", time.gmtime(d * 86400)), "images": n, "detections": int(k or 0),
+                 "located": int(g or 0)} for d, n, k, g in rows]
+
+    def hotspots(self, limit: int = 1000, min_detections: int = 1) -> List[dict]:
+        """Grid cells ranked by detections, from the trigger-maintained totals."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT cell, images, detections, last_ts FROM cells WHERE detections >= ? "
+                "ORDER BY detections DESC LIMIT ?", (min_detections, limit)
+            ).fetchall()
+        out = []
+        for cell, images, detections, last_ts in rows:
+            lat, lon = cell_center(cell)
+            out.append({"lat": lat, "lon": lon, "images": images, "detections": detections, "last_ts": last_ts})
+        return out
+
+    def summary(self) -> dict:
+        """Totals from the trigger-maintained counters."""
+        with self._lock:
+            images, detections, located = self._db.execute(
+                "SELECT images, detections, located FROM totals WHERE id = 0"
+            ).fetchone()
+            first_ts, last_ts = self._db.execute("SELECT MIN(ts), MAX(ts) FROM images").fetchone()
+            cells = self._db.execute("SELECT COUNT(*) FROM cells WHERE detections > 0").fetchone()[0]
+        return {"images": images, "detections": detections, "located": located, "locations": cells,
+                "first_ts": first_ts, "last_ts": last_ts}
+
+    def add_upload_hash(self, phash: int, settings: str, boxes_payload: dict, image_path: Optional[str] = None,
+                        max_entries: int = 5000) -> None:
+        """Record an upload's 64-bit perceptual hash; only the newest `max_entries` are kept."""
+        # SQLite integers are signed 64-bit
+        signed = phash - (1 << 64) if phash >= (1 << 63) else phash
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO upload_hashes (phash, settings, image_path, boxes, created) VALUES (?, ?, ?, ?, ?)",
+                (signed, settings, image_path, json.dumps(boxes_payload, separators=(",", ":")), time.time()),
+            )
+            self._db.execute("DELETE FROM upload_hashes WHERE id <= (SELECT MAX(id) FROM upload_hashes) - ?",
+                             (max(1, int(max_entries)),))
+
+    def upload_hashes(self, limit: int = 5000) -> List[dict]:
+        """The newest `limit` upload hashes, oldest first: phash, settings, image_path, boxes."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT phash, settings, image_path, boxes FROM upload_hashes ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"phash": h + (1 << 64) if h < 0 else h, "settings": settings, "image_path": path,
+                 "boxes": json.loads(boxes)} for h, settings, path, boxes in reversed(rows)]
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+
+_STORES: Dict[str, DetectionStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_detection_store(cfg: dict) -> Optional[DetectionStore]:
+    """Process-wide store configured by the `store` section, or None when disabled."""
+    store_cfg = cfg.get("store", {})
+    if not store_cfg.get("enabled", False):
+        return None
+    path = str(store_cfg.get("path", os.path.join(cfg["paths"]["runs_dir"], "store", "detections.sqlite")))
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = DetectionStore(
+                path,
+                batch_size=int(store_cfg.get("batch_size", 500)),
+                min_conf=float(store_cfg.get("min_conf", cfg["inference"]["conf"])),
+                iou=float(store_cfg.get("iou", cfg["inference"]["iou"])),
+            )
+            _STORES[path] = store
+        return store
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from typing import Dict, Tuple, Union
+
+import cv2
+import numpy as np
+
+try:
+    from .boxes import nms, weighted_box_fusion
+    from .registry import predict_device
+except Exception:
+    from boxes import nms, weighted_box_fusion
+    from registry import predict_device
+
+
+def _tile_starts(length: int, tile_size: int, stride: int) -> np.ndarray:
+    if length <= tile_size:
+        return np.zeros((1,), dtype=np.int64)
+    starts = np.arange(0, length - tile_size, stride, dtype=np.int64)
+    # Last tile sits flush with the image edge instead of running past it
+    return np.append(starts, length - tile_size)
+
+
+def tile_windows(height: int, width: int, tile_size: int, overlap: float) -> np.ndarray:
+    """Tile windows as an (N, 4) array of [x0, y0, x1, y1] covering the image."""
+    stride = max(1, int(round(tile_size * (1.0 - overlap))))
+    ys = _tile_starts(height, tile_size, stride)
+    xs = _tile_starts(width, tile_size, stride)
+    yy, xx = np.meshgrid(ys, xs, indexing="ij")
+    x0 = xx.ravel()
+    y0 = yy.ravel()
+    return np.stack([x0, y0, np.minimum(x0 + tile_size, width), np.minimum(y0 + tile_size, height)], axis=1)
+
+
+def _result_arrays(res) -> np.ndarray:
+    # One device->host transfer per tile: columns are x1, y1, x2, y2, conf, cls
+    return res.boxes.data.cpu().numpy().astype(np.float32)  # type: ignore[attr-defined]
+
+
+def predict_tiled(
+    model,
+    image: Union[str, np.ndarray],
+    tile_size: int = 640,
+    overlap: float = 0.2,
+    conf: float = 0.25,
+    iou: float = 0.45,
+    device: str = "auto",
+    batch_size: int = 16,
+    merge: str = "nms",
+    merge_iou: float = 0.5,
+    match_metric: str = "ios",
+    include_full_frame: bool = True,
+    full_frame_imgsz: int = 640,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[int, str]]:
+    """Run the detector over overlapping tiles of a large image.
+
+    The image is decoded once; tiles are NumPy views into that buffer, so
+    only one batch of letterboxed tiles is copied at a time. Boxes are shifted
+    back to full-image coordinates and merged across seams with NMS or
+    weighted box fusion. With `include_full_frame`, one downscaled pass over
+    the whole frame is added so objects larger than a tile are still found.
+
+    Returns (xyxy, conf, cls, names) in original pixel coordinates.
+    """
+    img = cv2.imread(image, cv2.IMREAD_COLOR) if isinstance(image, str) else image
+    if img is None:
+        raise FileNotFoundError(f"Could not decode image: {image}")
+    height, width = img.shape[:2]
+    windows = tile_windows(height, width, tile_size, overlap)
+    dev = predict_device(device)
+
+    chunks = []
+    names: Dict[int, str] = {}
+    for start in range(0, len(windows), max(1, batch_size)):
+        batch = windows[start:start + batch_size]
+        tiles = [img[y0:y1, x0:x1] for x0, y0, x1, y1 in batch]
+        results = model.predict(tiles, imgsz=tile_size, conf=conf, iou=iou, device=dev, verbose=False)
+        for (x0, y0, _, _), res in zip(batch, results):
+            names = res.names if hasattr(res, "names") else names
+            data = _result_arrays(res)
+            data[:, [0, 2]] += x0
+            data[:, [1, 3]] += y0
+            chunks.append(data)
+
+    if include_full_frame and len(windows) > 1:
+        res = model.predict(img, imgsz=full_frame_imgsz, conf=conf, iou=iou, device=dev, verbose=False)[0]
+        chunks.append(_result_arrays(res))
+
+    data = np.concatenate(chunks, axis=0) if chunks else np.zeros((0, 6), dtype=np.float32)
+    xyxy, scores, classes = data[:, :4], data[:, 4], data[:, 5].astype(np.int64)
+    if len(windows) > 1:
+        if merge == "wbf":
+            xyxy, scores, classes = weighted_box_fusion(xyxy, scores, merge_iou, classes, match_metric)
+        else:
+            keep = nms(xyxy, scores, merge_iou, classes, match_metric)
+            xyxy, scores, classes = xyxy[keep], scores[keep], classes[keep]
+    return xyxy, scores, classes, names
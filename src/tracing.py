@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, TypeVar
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Histogram bucket upper bounds in ms: 0.05 ms .. ~105 s, doubling
+BUCKETS_MS = [0.05 * 2 ** i for i in range(22)]
+
+_enabled = False
+_events: Deque[dict] = deque(maxlen=100_000)
+_hist_lock = threading.Lock()
+_histograms: Dict[str, "Histogram"] = {}
+
+
+class Histogram:
+    """Log-bucketed duration histogram with exact count, sum, min and max."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = float("inf")
+        self.max_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.min_ms = min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (clamped to the observed max)."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms, self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "min_ms": round(self.min_ms, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.50), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def set(self, **attrs) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start_ns")
+
+    def __init__(self, name: str, attrs: dict) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = 0
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        dur_ns = time.perf_counter_ns() - self.start_ns
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        record(self.name, self.start_ns, dur_ns, self.attrs)
+
+    def set(self, **attrs) -> None:
+        """Attach attributes known only once the span is running (e.g. result counts)."""
+        self.attrs.update(attrs)
+
+
+def record(name: str, start_ns: int, dur_ns: int, attrs: Optional[dict] = None) -> None:
+    _events.append({
+        "name": name,
+        "ts_us": start_ns // 1000,
+        "dur_us": dur_ns // 1000,
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "thread": threading.current_thread().name,
+        "args": attrs or {},
+    })
+    with _hist_lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.add(dur_ns / 1e6)
+
+
+def span(name: str, **attrs):
+    """Time a block: `with span("inference.predict", batch=8): ...`. A shared no-op when tracing is off."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator form of `span`; the disabled path is one global check before the call."""
+
+    def decorate(fn: F) -> F:
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def enable(max_events: int = 100_000) -> None:
+    global _enabled, _events
+    if _events.maxlen != max_events:
+        _events = deque(_events, maxlen=max_events)
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def configure(cfg: dict) -> None:
+    """Apply the `tracing` config section; cheap enough to call on every Streamlit rerun."""
+    tracing_cfg = cfg.get("tracing", {})
+    if tracing_cfg.get("enabled", False) or os.environ.get("TRACING") == "1":
+        enable(int(tracing_cfg.get("max_events", 100_000)))
+    else:
+        disable()
+    prof_cfg = tracing_cfg.get("profiler", {})
+    if prof_cfg.get("enabled", False):
+        start_profiler_window(
+            duration_s=float(prof_cfg.get("duration_s", 60)),
+            interval_ms=float(prof_cfg.get("interval_ms", 10)),
+            out_dir=str(tracing_cfg.get("out_dir", "runs/traces")),
+        )
+
+
+def drain() -> List[dict]:
+    """Remove and return all buffered span events."""
+    out = []
+    while True:
+        try:
+            out.append(_events.popleft())
+        except IndexError:
+            return out
+
+
+def histograms() -> Dict[str, dict]:
+    with _hist_lock:
+        return {name: h.summary() for name, h in sorted(_histograms.items())}
+
+
+def reset() -> None:
+    _events.clear()
+    with _hist_lock:
+        _histograms.clear()
+
+
+def flush_jsonl(path: str) -> int:
+    """Append buffered events to a JSON-lines file; returns how many were written."""
+    events = drain()
+    if events:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for e in events:
+                f.write(json.dumps(e) + "\n")
+    return len(events)
+
+
+def read_jsonl(path: str) -> List[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_chrome_trace(path: str, events: Iterable[dict]) -> None:
+    """Write events in the Chrome trace format (open in chrome://tracing or Perfetto)."""
+    trace = []
+    thread_names = {}
+    for e in events:
+        trace.append({"name": e["name"], "ph": "X", "ts": e["ts_us"], "dur": e["dur_us"],
+                      "pid": e["pid"], "tid": e["tid"], "args": e.get("args", {})})
+        thread_names[(e["pid"], e["tid"])] = e.get("thread", "")
+    for (pid, tid), thread in thread_names.items():
+        trace.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}})
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+def summarize_events(events: Iterable[dict]) -> Dict[str, dict]:
+    hists: Dict[str, Histogram] = {}
+    for e in events:
+        hists.setdefault(e["name"], Histogram()).add(e["dur_us"] / 1000.0)
+    return {name: h.summary() for name, h in sorted(hists.items())}
+
+
+class SamplingProfiler:
+    """Statistical profiler: samples every thread's stack via `sys._current_frames()`.
+
+    Runs on a daemon thread for at most `duration_s`, so it can be switched on
+    in production without instrumenting code. Stacks are aggregated as
+    "file:function;file:function" strings (root first), the folded format that
+    flamegraph tools read.
+    """
+
+    def __init__(self, interval_ms: float = 10.0, duration_s: float = 60.0, max_depth: int = 64) -> None:
+        self.interval_s = interval_ms / 1000.0
+        self.duration_s = duration_s
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.duration_s
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                parts = []
+                while frame is not None and len(parts) < self.max_depth:
+                    code = frame.f_code
+                    parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+            self._stop.wait(self.interval_s)
+        self._on_finish()
+
+    def _on_finish(self) -> None:
+        return None
+
+    def folded(self) -> List[str]:
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+    def top(self, n: int = 20) -> List[tuple]:
+        """Functions by self time: (frame, samples) for the innermost frame of each stack."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+
+class _WindowProfiler(SamplingProfiler):
+    def __init__(self, out_path: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.out_path = out_path
+
+    def _on_finish(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.out_path)), exist_ok=True)
+        with open(self.out_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.folded()) + "\n")
+
+
+_profiler_lock = threading.Lock()
+_profiler: Optional[SamplingProfiler] = None
+
+
+def start_profiler_window(duration_s: float = 60.0, interval_ms: float = 10.0,
+                          out_dir: str = "runs/traces") -> Optional[SamplingProfiler]:
+    """Start one sampling window per process; its folded stacks are written to `out_dir` when it ends.
+
+    Returns the running profiler, or None if a window was already started.
+    """
+    global _profiler
+    with _profiler_lock:
+        if _profiler is not None:
+            return None
+        out_path = os.path.join(out_dir, f"profile_{os.getpid()}_{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        _profiler = _WindowProfiler(out_path, interval_ms=interval_ms, duration_s=duration_s).start()
+        return _profiler
+
+
+def main():
+    # Imported here: geo and the other modules import tracing, and utils imports splits -> geo
+    try:
+        from .utils import load_config
+    except Exception:
+        from utils import load_config
+
+    cfg = load_config("configs/config.yaml")
+    tracing_cfg = cfg.get("tracing", {})
+    out_dir = str(tracing_cfg.get("out_dir", "runs/traces"))
+    jsonl_path = os.path.join(out_dir, "spans.jsonl")
+    if not os.path.isfile(jsonl_path):
+        raise SystemExit(f"{jsonl_path} not found. Set tracing.enabled: true and use the app first.")
+    events = read_jsonl(jsonl_path)
+    chrome_path = os.path.join(out_dir, "trace.json")
+    write_chrome_trace(chrome_path, events)
+    print(f"Wrote Chrome trace for {len(events)} spans to {chrome_path}")
+    for name, s in summarize_events(events).items():
+        print(f"{name}: n={s['count']} mean={s['mean_ms']:.2f} p50={s['p50_ms']:.2f} "
+              f"p95={s['p95_ms']:.2f} p99={s['p99_ms']:.2f} max={s['max_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+try:
+    from .utils import VIDEO_EXTS, ensure_dirs, load_config
+    from .boxes import box_overlap
+    from .detections import Detections
+    from .inference import stream_predictions
+    from .frames import count_frames
+except Exception:
+    from utils import VIDEO_EXTS, ensure_dirs, load_config
+    from boxes import box_overlap
+    from detections import Detections
+    from inference import stream_predictions
+    from frames import count_frames
+
+
+def _greedy_match(overlap: np.ndarray, min_overlap: float) -> List[tuple]:
+    """(row, col) pairs by descending overlap, each row and column used at most once."""
+    rows, cols = np.nonzero(overlap >= min_overlap)
+    order = np.argsort(-overlap[rows, cols], kind="stable")
+    used_r, used_c = set(), set()
+    pairs = []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r not in used_r and c not in used_c:
+            used_r.add(r)
+            used_c.add(c)
+            pairs.append((r, c))
+    return pairs
+
+
+class ByteTracker:
+    """ByteTrack-style IoU tracker with a constant-velocity box model.
+
+    Detections above `high_conf` are matched to the predicted track boxes
+    first; the remaining tracks then get a second chance against the
+    low-confidence detections (down to `low_conf`), which keeps objects
+    alive through partial occlusion or glare. Only unmatched high-confidence
+    detections start tracks. Velocities are in pixels per frame, so frames
+    the detector skipped are bridged by extrapolation.
+    """
+
+    def __init__(self, high_conf: float = 0.5, low_conf: float = 0.1, match_iou: float = 0.3,
+                 max_age: int = 30, min_hits: int = 2, velocity_smoothing: float = 0.5) -> None:
+        self.high_conf = high_conf
+        self.low_conf = low_conf
+        self.match_iou = match_iou
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.beta = velocity_smoothing
+        self.next_id = 1
+        # Active tracks, one row each
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.xyxy = np.zeros((0, 4), dtype=np.float64)
+        self.vel = np.zeros((0, 4), dtype=np.float64)
+        self.conf = np.zeros(0, dtype=np.float64)
+        self.cls = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.first_frame = np.zeros(0, dtype=np.int64)
+        self.last_frame = np.zeros(0, dtype=np.int64)
+        self.finished: List[dict] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def predict(self, frame_index: int) -> np.ndarray:
+        """Extrapolated boxes of the active tracks at `frame_index`."""
+        gap = (frame_index - self.last_frame).astype(np.float64)[:, None]
+        return self.xyxy + self.vel * gap
+
+    def confirmed(self) -> np.ndarray:
+        return self.hits >= self.min_hits
+
+    def update(self, frame_index: int, dets: Detections) -> np.ndarray:
+        """Associate one frame's detections; returns the track ID per detection (-1 if untracked)."""
+        track_ids = np.full(len(dets), -1, dtype=np.int64)
+        predicted = self.predict(frame_index)
+        unmatched_tracks = np.arange(len(self.ids))
+        matched: List[tuple] = []
+        for stage in (dets.conf >= self.high_conf, (dets.conf >= self.low_conf) & (dets.conf < self.high_conf)):
+            det_idx = np.flatnonzero(stage)
+            if len(det_idx) == 0 or len(unmatched_tracks) == 0:
+                continue
+            overlap = box_overlap(predicted[unmatched_tracks], dets.xyxy[det_idx].astype(np.float64))
+            overlap[self.cls[unmatched_tracks][:, None] != dets.cls[det_idx][None, :]] = 0.0
+            pairs = [(unmatched_tracks[r], det_idx[c]) for r, c in _greedy_match(overlap, self.match_iou)]
+            matched += pairs
+            taken = {t for t, _ in pairs}
+            unmatched_tracks = np.array([t for t in unmatched_tracks if t not in taken], dtype=np.int64)
+
+        if matched:
+            t_idx = np.array([t for t, _ in matched], dtype=np.int64)
+            d_idx = np.array([d for _, d in matched], dtype=np.int64)
+            box = dets.xyxy[d_idx].astype(np.float64)
+            gap = np.maximum(frame_index - self.last_frame[t_idx], 1).astype(np.float64)[:, None]
+            self.vel[t_idx] = (1 - self.beta) * self.vel[t_idx] + self.beta * (box - self.xyxy[t_idx]) / gap
+            self.xyxy[t_idx] = box
+            self.conf[t_idx] = dets.conf[d_idx]
+            self.hits[t_idx] += 1
+            self.last_frame[t_idx] = frame_index
+            track_ids[d_idx] = self.ids[t_idx]
+
+        new = np.flatnonzero((track_ids < 0) & (dets.conf >= self.high_conf))
+        if len(new):
+            ids = np.arange(self.next_id, self.next_id + len(new), dtype=np.int64)
+            self.next_id += len(new)
+            self.ids = np.concatenate([self.ids, ids])
+            self.xyxy = np.concatenate([self.xyxy, dets.xyxy[new].astype(np.float64)])
+            self.vel = np.concatenate([self.vel, np.zeros((len(new), 4))])
+            self.conf = np.concatenate([self.conf, dets.conf[new].astype(np.float64)])
+            self.cls = np.concatenate([self.cls, dets.cls[new]])
+            self.hits = np.concatenate([self.hits, np.ones(len(new), dtype=np.int64)])
+            self.first_frame = np.concatenate([self.first_frame, np.full(len(new), frame_index)])
+            self.last_frame = np.concatenate([self.last_frame, np.full(len(new), frame_index)])
+            track_ids[new] = ids
+
+        self._retire(frame_index - self.last_frame > self.max_age)
+        return track_ids
+
+    def _retire(self, mask: np.ndarray) -> None:
+        for i in np.flatnonzero(mask):
+            self.finished.append({
+                "track_id": int(self.ids[i]),
+                "cls": int(self.cls[i]),
+                "hits": int(self.hits[i]),
+                "first_frame": int(self.first_frame[i]),
+                "last_frame": int(self.last_frame[i]),
+                "confirmed": bool(self.hits[i] >= self.min_hits),
+            })
+        keep = ~mask
+        for name in ("ids", "xyxy", "vel", "conf", "cls", "hits", "first_frame", "last_frame"):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def close(self) -> List[dict]:
+        """Retire every active track; returns all tracks seen, oldest first."""
+        self._retire(np.ones(len(self.ids), dtype=bool))
+        return sorted(self.finished, key=lambda t: t["track_id"])
+
+
+def _crop(frame: np.ndarray, xyxy: np.ndarray, pad: float) -> np.ndarray:
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = xyxy
+    px, py = (x2 - x1) * pad, (y2 - y1) * pad
+    x1, y1 = int(max(0, x1 - px)), int(max(0, y1 - py))
+    x2, y2 = int(min(w, x2 + px)), int(min(h, y2 + py))
+    return frame[y1:y2, x1:x2].copy()
+
+
+def _lerp(a: Optional[float], b: Optional[float], frac: float) -> Optional[float]:
+    return a + frac * (b - a) if a is not None and b is not None else None
+
+
+def _propagated(tracker: ByteTracker, j: int, names: Dict[int, str], a: dict, b: dict, frac: float,
+                last_index: int) -> dict:
+    """Frame `j` between (or, with frac > 1, after) detected items a and b.
+
+    Boxes come from the confirmed tracks that matched a detection on frame
+    `last_index`; tracks already lost there are not drawn.
+    """
+    live = tracker.confirmed() & (tracker.last_frame == last_index)
+    video, sep, _ = b["image_path"].rpartition("#")
+    return {
+        "image_path": f"{video}#{j}" if sep else None,
+        "frame_index": j,
+        "timestamp": _lerp(a.get("timestamp"), b.get("timestamp"), frac),
+        "offset_s": _lerp(a.get("offset_s"), b.get("offset_s"), frac),
+        "gps": b.get("gps"),
+        "boxes": Detections(tracker.predict(j)[live], tracker.conf[live], tracker.cls[live], names),
+        "track_ids": tracker.ids[live].copy(),
+        "propagated": True,
+    }
+
+
+def track_stream(items: Iterable[dict], tracker: ByteTracker, best: Optional[Dict[int, dict]] = None,
+                 crop_pad: float = 0.1, total_frames: Optional[int] = None) -> Iterator[dict]:
+    """Link `stream_predictions(columnar=True)` items into tracks, frame by frame.
+
+    Adds "track_ids" (one per box, -1 if untracked) and "propagated" to each
+    item. When the detector ran on every n-th frame only, the frames in
+    between are yielded too, with the extrapolated boxes of the confirmed
+    tracks matched on the preceding detected frame and "propagated": True; so are the frames after the last detected one,
+    up to `total_frames` but at most one detection interval. If `best` is
+    given it is filled with the highest-confidence sighting per track: conf,
+    frame_index, box, gps and, when items carry a "frame", the image crop.
+    """
+    prev_index: Optional[int] = None
+    prev: dict = {}
+    before: dict = {}
+    span = 1
+    names: Dict[int, str] = {}
+    for item in items:
+        dets: Detections = item["boxes"]
+        names = dets.names or names
+        index = int(item["frame_index"])
+        if prev_index is not None:
+            span = max(index - prev_index, 1)
+            for j in range(prev_index + 1, index):
+                yield _propagated(tracker, j, names, prev, item, (j - prev_index) / span, prev_index)
+        item["track_ids"] = tracker.update(index, dets)
+        item["propagated"] = False
+        if best is not None:
+            for k in np.flatnonzero(item["track_ids"] >= 0):
+                tid, conf = int(item["track_ids"][k]), float(dets.conf[k])
+                if tid not in best or conf > best[tid]["conf"]:
+                    entry = {"conf": conf, "frame_index": index, "box": dets.xyxy[k].tolist(), "gps": item.get("gps")}
+                    if item.get("frame") is not None:
+                        entry["crop"] = _crop(item["frame"], dets.xyxy[k], crop_pad)
+                    best[tid] = entry
+        prev_index, before, prev = index, prev, item
+        yield item
+    if prev_index is not None and total_frames is not None:
+        # Extrapolate times from the last two detected frames
+        a, b = (before, prev) if before else (prev, prev)
+        a_index = int(a["frame_index"])
+        for j in range(prev_index + 1, min(int(total_frames), prev_index + span)):
+            yield _propagated(tracker, j, names, a, b, (j - a_index) / max(prev_index - a_index, 1), prev_index)
+
+
+def track_video(source: str, cfg: Optional[dict] = None, out_dir: Optional[str] = None) -> dict:
+    """Track debris through a video (or frame directory) and count unique objects.
+
+    Runs the detector on every `tracking.detect_every`-th frame, bridges the
+    others by propagating tracks, and saves one best-frame crop per confirmed
+    track plus a `tracks.json` summary under `out_dir`.
+    """
+    if cfg is None:
+        cfg = load_config("configs/config.yaml")
+    track_cfg = cfg.get("tracking", {})
+    tracker = ByteTracker(
+        high_conf=float(track_cfg.get("high_conf", 0.5)),
+        low_conf=float(track_cfg.get("low_conf", 0.1)),
+        match_iou=float(track_cfg.get("match_iou", 0.3)),
+        max_age=int(track_cfg.get("max_age", 30)),
+        min_hits=int(track_cfg.get("min_hits", 2)),
+    )
+    save_crops = bool(track_cfg.get("save_crops", True))
+    best: Dict[int, dict] = {}
+    frames = inference_frames = detections = 0
+    names: Dict[int, str] = {}
+    items = stream_predictions(
+        source,
+        conf=tracker.low_conf,
+        frame_stride=max(1, int(track_cfg.get("detect_every", 2))),
+        with_frames=save_crops,
+        columnar=True,
+        cfg=cfg,
+    )
+    for item in track_stream(items, tracker, best, crop_pad=float(track_cfg.get("crop_pad", 0.1)),
+                             total_frames=count_frames(source)):
+        frames += 1
+        if not item["propagated"]:
+            inference_frames += 1
+            detections += int((item["boxes"].conf >= tracker.high_conf).sum())
+            names = item["boxes"].names or names
+        item.pop("frame", None)
+
+    out_dir = out_dir or os.path.join(str(track_cfg.get("out_dir", "runs/tracks")),
+                                      os.path.splitext(os.path.basename(source.rstrip("/\\")))[0])
+    objects = []
+    for track in tracker.close():
+        if not track["confirmed"]:
+            continue
+        entry = best.get(track["track_id"], {})
+        obj = {**track, "label": names.get(track["cls"], str(track["cls"])),
+               "best_conf": entry.get("conf"), "best_frame": entry.get("frame_index"),
+               "best_box": entry.get("box"), "gps": entry.get("gps"), "crop_path": None}
+        if entry.get("crop") is not None and entry["crop"].size:
+            ensure_dirs([out_dir])
+            obj["crop_path"] = os.path.join(out_dir, f"track_{track['track_id']:05d}.jpg")
+            cv2.imwrite(obj["crop_path"], entry["crop"])
+        del obj["confirmed"]
+        objects.append(obj)
+
+    summary = {
+        "source": source,
+        "frames": frames,
+        "inference_frames": inference_frames,
+        "detections": detections,
+        "unique_objects": len(objects),
+        "objects": objects,
+    }
+    ensure_dirs([out_dir])
+    with open(os.path.join(out_dir, "tracks.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    cfg = load_config("configs/config.yaml")
+    videos_dir = str(cfg.get("tracking", {}).get("videos_dir", "data/videos"))
+    if not os.path.isdir(videos_dir):
+        raise SystemExit(f"{videos_dir} not found. Put videos there or set tracking.videos_dir.")
+    videos = sorted(os.path.join(videos_dir, fn) for fn in os.listdir(videos_dir)
+                    if os.path.splitext(fn)[1].lower() in VIDEO_EXTS)
+    for path in videos:
+        summary = track_video(path, cfg)
+        print(f"{path}: {summary['unique_objects']} unique objects "
+              f"({summary['detections']} boxes on {summary['inference_frames']}/{summary['frames']} inferred frames)")
+
+
+if __name__ == "__main__":
+    main()
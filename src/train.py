@@ -4,6 +4,8 @@ import os
 from ultralytics import YOLO
 
 from utils import load_config
+from export import export_best
+from cached_dataset import CachedDetectionTrainer
 
 
 def main():
@@ -28,6 +30,7 @@ def main():
         device=device,
         project=runs_dir,
         name="yolov8",
+        trainer=CachedDetectionTrainer if cfg["training"].get("image_cache", False) else None,
     )
     # Save best weights path to a file for later inference
     best_path = model.ckpt_path if hasattr(model, "ckpt_path") else None
@@ -41,6 +44,8 @@ def main():
         with open(os.path.join(cfg["paths"]["models_dir"], "best_model.path"), "w", encoding="utf-8") as f:
             f.write(best_path)
         print(f"Saved best model path: {best_path}")
+        for path in export_best(cfg, best_path):
+            print(f"Exported: {path}")
 
 
 if __name__ == "__main__":
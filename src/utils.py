@@ -1,15 +1,24 @@
 from __future__ import annotations
 
 import os
+import json
 import shutil
 import random
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Tuple, Dict
+from typing import List, Optional, Tuple, Dict
 
+import numpy as np
 import yaml
 
+try:
+    from .splits import TEST, TRAIN, VAL, assign_folds, assign_splits
+except Exception:
+    from splits import TEST, TRAIN, VAL, assign_folds, assign_splits
+
 
 SUPPORTED_IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+VIDEO_EXTS = {".mp4", ".mov", ".avi", ".mkv", ".m4v"}
 
 
 @dataclass
@@ -20,6 +29,10 @@ class SplitPaths:
     val_labels: str
     test_images: str
     test_labels: str
+    # Files placed, removed and left unchanged by `materialize_splits`
+    placed: int = 0
+    removed: int = 0
+    unchanged: int = 0
 
 
 def load_config(path: str) -> dict:
@@ -42,38 +55,189 @@ def list_images(root: str) -> List[str]:
     return imgs
 
 
-def find_yolo_pairs(dataset_root: str) -> List[Tuple[str, str]]:
+def _scan_dir(path: str) -> Tuple[List[str], List[str]]:
+    """(subdirectory names, file names) of one directory in a single scandir pass."""
+    subdirs: List[str] = []
+    files: List[str] = []
+    with os.scandir(path) as it:
+        for entry in it:
+            # DirEntry.is_dir uses the d_type from readdir, so no extra stat per entry
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            else:
+                files.append(entry.name)
+    return subdirs, files
+
+
+def _pair_dir(images_dir: str, labels_dir: str) -> List[Tuple[str, str]]:
+    """Pair images with labels by stem using one listing of each directory."""
+    _, label_files = _scan_dir(labels_dir)
+    label_stems = {os.path.splitext(fn)[0] for fn in label_files if fn.endswith(".txt")}
+    _, image_files = _scan_dir(images_dir)
+    pairs = []
+    for fn in image_files:
+        stem, ext = os.path.splitext(fn)
+        if ext.lower() in SUPPORTED_IMG_EXTS and stem in label_stems:
+            pairs.append((os.path.join(images_dir, fn), os.path.join(labels_dir, stem + ".txt")))
+    return pairs
+
+
+def find_yolo_pairs(dataset_root: str, index_path: Optional[str] = None, workers: int = 8) -> List[Tuple[str, str]]:
     """Find YOLO image/label pairs under a dataset root.
     Looks for sibling folders named images/ and labels/.
+
+    The tree is walked breadth-first with one `os.scandir` per directory,
+    spread over `workers` threads. Labels are listed once per labels/ folder
+    and matched to images by stem in memory. With `index_path`, directory
+    mtimes, subdirectory lists and pairs are persisted: a directory whose
+    mtime is unchanged is not listed again, and an images/labels pair whose
+    two mtimes are unchanged reuses its stored pairs.
     """
+    root = os.path.abspath(dataset_root)
+    index = _load_manifest(index_path) if index_path else {}
+    if index.get("root") != root:
+        index = {}
+    old_dirs: Dict[str, dict] = index.get("dirs", {})
+    old_pairs: Dict[str, dict] = index.get("pairs", {})
+    dirs: Dict[str, dict] = {}
+    pairs_by_dir: Dict[str, dict] = {}
+
+    def _visit(path: str) -> Tuple[str, dict]:
+        mtime_ns = os.stat(path).st_mtime_ns
+        prev = old_dirs.get(path)
+        if prev is not None and prev["mtime_ns"] == mtime_ns:
+            return path, prev
+        subdirs, _ = _scan_dir(path)
+        return path, {"mtime_ns": mtime_ns, "subdirs": sorted(subdirs)}
+
+    def _pairs(images_dir: str) -> Tuple[str, dict]:
+        labels_dir = os.path.join(os.path.dirname(images_dir), "labels")
+        key = [dirs[images_dir]["mtime_ns"], os.stat(labels_dir).st_mtime_ns]
+        prev = old_pairs.get(images_dir)
+        if prev is not None and prev["mtimes"] == key:
+            return images_dir, prev
+        return images_dir, {"mtimes": key, "pairs": _pair_dir(images_dir, labels_dir)}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        frontier = [root]
+        while frontier:
+            level = dict(pool.map(_visit, frontier))
+            dirs.update(level)
+            frontier = [os.path.join(path, name) for path, info in level.items() for name in info["subdirs"]]
+
+        image_dirs = []
+        for path in dirs:
+            if os.path.basename(path).lower() != "images":
+                continue
+            parent = os.path.dirname(path)
+            has_labels = "labels" in dirs[parent]["subdirs"] if parent in dirs else os.path.isdir(
+                os.path.join(parent, "labels"))
+            if has_labels:
+                image_dirs.append(path)
+        pairs_by_dir = dict(pool.map(_pairs, image_dirs))
+
+    if index_path:
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"root": root, "dirs": dirs, "pairs": pairs_by_dir}, f)
+        os.replace(tmp_path, index_path)
+
     candidates: List[Tuple[str, str]] = []
-    for dirpath, dirnames, _ in os.walk(dataset_root):
-        if os.path.basename(dirpath).lower() == "images":
-            labels_dir = os.path.join(os.path.dirname(dirpath), "labels")
-            if os.path.isdir(labels_dir):
-                # pair files by stem
-                for fn in os.listdir(dirpath):
-                    stem, ext = os.path.splitext(fn)
-                    if ext.lower() in SUPPORTED_IMG_EXTS:
-                        img_path = os.path.join(dirpath, fn)
-                        lbl_path = os.path.join(labels_dir, stem + ".txt")
-                        if os.path.isfile(lbl_path):
-                            candidates.append((img_path, lbl_path))
+    for images_dir in sorted(pairs_by_dir):
+        candidates.extend((img, lbl) for img, lbl in pairs_by_dir[images_dir]["pairs"])
+    candidates.sort()
     return candidates
 
 
-def split_dataset(pairs: List[Tuple[str, str]], val_ratio: float, test_ratio: float, seed: int) -> Dict[str, List[Tuple[str, str]]]:
-    random.Random(seed).shuffle(pairs)
+def split_dataset(pairs: List[Tuple[str, str]], val_ratio: float, test_ratio: float, seed: int,
+                  strata: Optional[np.ndarray] = None,
+                  groups: Optional[np.ndarray] = None) -> Dict[str, List[Tuple[str, str]]]:
+    """Split pairs into train/val/test.
+
+    Without `strata` or `groups` this is a seeded shuffle-and-slice. With
+    them, each stratum (see `splits.stratum_keys`) is split at the requested
+    ratios and all pairs sharing a group id stay in the same split.
+    """
+    if strata is None and groups is None:
+        random.Random(seed).shuffle(pairs)
+        n = len(pairs)
+        n_test = int(n * test_ratio)
+        n_val = int(n * val_ratio)
+        test_set = pairs[:n_test]
+        val_set = pairs[n_test:n_test + n_val]
+        train_set = pairs[n_test + n_val:]
+        return {"train": train_set, "val": val_set, "test": test_set}
+
+    n = len(pairs)
+    strata = np.zeros(n, dtype=np.int64) if strata is None else strata
+    groups = np.arange(n, dtype=np.int64) if groups is None else groups
+    split = assign_splits(strata, groups, val_ratio, test_ratio, seed)
+    return {
+        name: [pairs[i] for i in np.flatnonzero(split == split_id)]
+        for name, split_id in (("train", TRAIN), ("val", VAL), ("test", TEST))
+    }
+
+
+def kfold_splits(pairs: List[Tuple[str, str]], k: int, seed: int,
+                 strata: Optional[np.ndarray] = None,
+                 groups: Optional[np.ndarray] = None) -> List[Dict[str, List[Tuple[str, str]]]]:
+    """K train/val splits where each fold is the val set once; stratified and group-aware like `split_dataset`."""
     n = len(pairs)
-    n_test = int(n * test_ratio)
-    n_val = int(n * val_ratio)
-    test_set = pairs[:n_test]
-    val_set = pairs[n_test:n_test + n_val]
-    train_set = pairs[n_test + n_val:]
-    return {"train": train_set, "val": val_set, "test": test_set}
+    strata = np.zeros(n, dtype=np.int64) if strata is None else strata
+    groups = np.arange(n, dtype=np.int64) if groups is None else groups
+    folds = assign_folds(strata, groups, k, seed)
+    return [
+        {
+            "train": [pairs[i] for i in np.flatnonzero(folds != f)],
+            "val": [pairs[i] for i in np.flatnonzero(folds == f)],
+        }
+        for f in range(k)
+    ]
+
+
+LINK_MODES = ("copy", "hardlink", "symlink")
+SPLITS_MANIFEST = "manifest.json"
+
+
+def _place_file(src: str, dst: str, link_mode: str) -> None:
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if link_mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            # Cross-device or unsupported filesystem: fall back to a real copy
+            pass
+    elif link_mode == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+        return
+    shutil.copy2(src, dst)
+
 
+def _load_manifest(path: str) -> Dict[str, dict]:
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def materialize_splits(splits: Dict[str, List[Tuple[str, str]]], target_dir: str) -> SplitPaths:
+
+def materialize_splits(splits: Dict[str, List[Tuple[str, str]]], target_dir: str,
+                       link_mode: str = "copy", workers: int = 8) -> SplitPaths:
+    """Lay out train/val/test images and labels under `target_dir`.
+
+    `link_mode` is "copy", "hardlink" (falls back to copy across devices) or
+    "symlink". A manifest of source path, size and mtime per destination file
+    is kept in `target_dir`, so re-runs only place files that were added or
+    changed and delete those no longer in any split; the returned paths carry
+    those counts.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"link_mode must be one of {LINK_MODES}, got '{link_mode}'")
     train_images = os.path.join(target_dir, "train", "images")
     train_labels = os.path.join(target_dir, "train", "labels")
     val_images = os.path.join(target_dir, "val", "images")
@@ -81,13 +245,40 @@ def materialize_splits(splits: Dict[str, List[Tuple[str, str]]], target_dir: str
     test_images = os.path.join(target_dir, "test", "images")
     test_labels = os.path.join(target_dir, "test", "labels")
     ensure_dirs([train_images, train_labels, val_images, val_labels, test_images, test_labels])
+    dst_dirs = {
+        "train": (train_images, train_labels),
+        "val": (val_images, val_labels),
+        "test": (test_images, test_labels),
+    }
 
+    placements: List[Tuple[str, str]] = []  # (src, dst relative to target_dir)
     for split_name, items in splits.items():
+        img_dir, lbl_dir = dst_dirs[split_name]
         for img_path, lbl_path in items:
-            dst_img_dir = locals()[f"{split_name}_images"]
-            dst_lbl_dir = locals()[f"{split_name}_labels"]
-            shutil.copy2(img_path, os.path.join(dst_img_dir, os.path.basename(img_path)))
-            shutil.copy2(lbl_path, os.path.join(dst_lbl_dir, os.path.basename(lbl_path)))
+            placements.append((img_path, os.path.relpath(os.path.join(img_dir, os.path.basename(img_path)), target_dir)))
+            placements.append((lbl_path, os.path.relpath(os.path.join(lbl_dir, os.path.basename(lbl_path)), target_dir)))
+
+    manifest_path = os.path.join(target_dir, SPLITS_MANIFEST)
+    old = _load_manifest(manifest_path)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        stats = list(pool.map(os.stat, [src for src, _ in placements]))
+        wanted: Dict[str, dict] = {}
+        for (src, rel), st in zip(placements, stats):
+            wanted[rel] = {"src": os.path.abspath(src), "size": st.st_size, "mtime_ns": st.st_mtime_ns, "mode": link_mode}
+
+        for rel in old.keys() - wanted.keys():
+            dst = os.path.join(target_dir, rel)
+            if os.path.lexists(dst):
+                os.remove(dst)
+
+        todo = [rel for rel, entry in wanted.items()
+                if old.get(rel) != entry or not os.path.lexists(os.path.join(target_dir, rel))]
+        list(pool.map(lambda rel: _place_file(wanted[rel]["src"], os.path.join(target_dir, rel), link_mode), todo))
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(wanted, f)
+    os.replace(tmp_path, manifest_path)
 
     return SplitPaths(
         train_images=train_images,
@@ -96,6 +287,9 @@ def materialize_splits(splits: Dict[str, List[Tuple[str, str]]], target_dir: str
         val_labels=val_labels,
         test_images=test_images,
         test_labels=test_labels,
+        placed=len(todo),
+        removed=len(old.keys() - wanted.keys()),
+        unchanged=len(wanted) - len(todo),
     )
 
 